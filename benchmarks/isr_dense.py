@@ -0,0 +1,68 @@
+"""Timings of the ISR engine with the dense stand-in for the ADC matrix.
+
+Dense excited-state data with the requested numbers of states are generated in a temporary
+directory; the time spent in the response solver is measured separately from the total time
+of evaluate_property_isr, and the results are checked against evaluate_property_sos_fast.
+
+Usage: python benchmarks/isr_dense.py --n-states 100 200 400
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from sos_scaling import properties
+
+from responsefun.evaluate_property import (
+    evaluate_property_isr,
+    evaluate_property_sos_fast,
+)
+from responsefun.testdata.dense import solve_dense_response, write_dense_states
+
+
+class TimedSolver:
+    def __init__(self):
+        self.elapsed = 0.0
+        self.n_calls = 0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        ret = solve_dense_response(*args, **kwargs)
+        self.elapsed += time.perf_counter() - start
+        self.n_calls += 1
+        return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-states", type=int, nargs="+", default=[50, 100, 200, 400])
+    args = parser.parse_args()
+
+    print(f"{'property':<10}{'states':>8}{'solves':>8}{'solve':>10}{'isr':>10}{'max. dev.':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_states in args.n_states:
+            path = os.path.join(tmpdir, f"dense_{n_states}.zarr")
+            state = write_dense_states(path, n_states)
+            for name, (expr, indices, kwargs) in properties.items():
+                solver = TimedSolver()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    isr = evaluate_property_isr(
+                        state, expr, indices, isr_backend=state, response_solver=solver,
+                        **kwargs
+                    )
+                    t_isr = time.perf_counter() - start
+                    sos = evaluate_property_sos_fast(state, expr, indices, **kwargs)
+                dev = np.max(np.abs(isr - sos))
+                print(
+                    f"{name:<10}{n_states:>8}{solver.n_calls:>8}{solver.elapsed:>10.3f}"
+                    f"{t_isr:>10.3f}{dev:>12.2e}"
+                )
+
+
+if __name__ == "__main__":
+    main()
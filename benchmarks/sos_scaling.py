@@ -0,0 +1,92 @@
+"""Scaling of the SOS engines with the number of excited states.
+
+Synthetic excited-state data with the requested numbers of states are generated in a
+temporary directory, and the polarizability (one index of summation) and the first
+hyperpolarizability (two indices of summation) are evaluated with all SOS engines.
+
+Usage: python benchmarks/sos_scaling.py --n-states 100 200 400 800 --max-slow 20
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from responsefun.evaluate_property import (
+    evaluate_property_sos,
+    evaluate_property_sos_fast,
+)
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    k,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    w,
+    w_1,
+    w_2,
+    w_k,
+    w_n,
+    w_o,
+)
+from responsefun.testdata.synthetic import write_synthetic_states
+
+properties = {
+    "alpha": (
+        TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w)
+        + TransitionMoment(O, op_b, n) * TransitionMoment(n, op_a, O) / (w_n + w),
+        [n],
+        {"freqs_in": (w, 0.1), "freqs_out": (w, 0.1)},
+    ),
+    "beta": (
+        TransitionMoment(O, op_a, n)
+        * TransitionMoment(n, op_b, k)
+        * TransitionMoment(k, op_c, O)
+        / ((w_n - w_o) * (w_k - w_2)),
+        [n, k],
+        {
+            "perm_pairs": [(op_a, -w_o), (op_b, w_1), (op_c, w_2)],
+            "freqs_in": [(w_1, 0.05), (w_2, 0.05)],
+            "freqs_out": (w_o, w_1 + w_2),
+        },
+    ),
+}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-states", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument(
+        "--max-slow", type=int, default=20,
+        help="largest number of states for which evaluate_property_sos is run",
+    )
+    args = parser.parse_args()
+
+    print(f"{'property':<10}{'states':>8}{'sos':>12}{'sos_fast':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_states in args.n_states:
+            path = os.path.join(tmpdir, f"synthetic_{n_states}.zarr")
+            state = write_synthetic_states(path, n_states)
+            for name, (expr, indices, kwargs) in properties.items():
+                kwargs = dict(kwargs, extra_terms=False)
+                t_slow = float("nan")
+                if n_states <= args.max_slow:
+                    t_slow = timed(evaluate_property_sos, state, expr, indices, **kwargs)
+                # the einsum engine reads the state-to-state tables blockwise from the store
+                t_fast = timed(evaluate_property_sos_fast, state, expr, indices, **kwargs)
+                print(f"{name:<10}{n_states:>8}{t_slow:>12.3f}{t_fast:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
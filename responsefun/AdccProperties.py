@@ -16,8 +16,13 @@
 #  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
 #
 
+import os
+import shutil
+import tempfile
 import warnings
+import weakref
 from abc import ABC, abstractmethod, abstractproperty
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from enum import Enum
 from itertools import product
@@ -38,7 +43,7 @@ from respondo.solve_response import (
 )
 from tqdm import tqdm
 
-from responsefun.testdata.mock import MockExcitedStates
+from responsefun.zarr_states import ZarrExcitedStates
 
 
 class Symmetry(Enum):
@@ -54,6 +59,8 @@ class Operator:
     symmetry: Symmetry  # 0: no symmetry, 1: hermitian, 2: anti-hermitian
     dim: int  # dimensionality
     is_imag: bool
+    # the components are symmetric with respect to an exchange of the indices, e.g., xi_ab = xi_ba
+    symmetric_components: bool = False
 
 
 available_operators = [
@@ -77,6 +84,7 @@ available_operators = [
         symmetry=Symmetry.HERMITIAN,
         dim=2,
         is_imag=False,
+        symmetric_components=True,
     ),
 ]
 
@@ -88,43 +96,68 @@ def get_operator_by_name(name: str) -> Operator:
     raise NotImplementedError("The requested operator is not implemented.")
 
 
-def compute_transition_moments(state, integrals):
+def operator_components(op_shape: tuple, symmetric: bool = False) -> list[tuple]:
+    """Return the components of an operator with the given shape; if the components are
+    symmetric, only the unique ones (with non-decreasing indices) are returned."""
+    components = list(product(*[range(shape) for shape in op_shape]))
+    if symmetric:
+        components = [c for c in components if list(c) == sorted(c)]
+    return components
+
+
+def component_integrals(integrals: Any, component: tuple) -> adcc.OneParticleOperator:
+    """Return the integrals of a single component from a (nested) list of operators."""
+    for index in component:
+        integrals = integrals[index]
+    return integrals
+
+
+def fill_symmetric_components(moments: np.ndarray, n_dim: int) -> np.ndarray:
+    """Copy the unique components in the last n_dim axes of the array to the
+    remaining ones (in place)."""
+    for c in np.ndindex((3,) * n_dim):
+        unique = tuple(sorted(c))
+        if c != unique:
+            moments[(..., *c)] = moments[(..., *unique)]
+    return moments
+
+
+def compute_expectation_values(density, integrals, symmetric=False):
+    """Trace a one-particle density matrix against all components of the integrals."""
+    op_shape = np.shape(integrals)
+    moments = np.zeros(op_shape)
+    for c in operator_components(op_shape, symmetric):
+        moments[c] = product_trace(component_integrals(integrals, c), density)
+    if symmetric:
+        fill_symmetric_components(moments, len(op_shape))
+    return moments
+
+
+def compute_transition_moments(state, integrals, symmetric=False):
     if state.property_method.level == 0:
         warnings.warn("ADC(0) transition moments are known to be faulty in some cases.")
 
     op_shape = np.shape(integrals)
-    iterables = [list(range(shape)) for shape in op_shape]
-    components = list(product(*iterables))
     moments = np.zeros((state.size, *op_shape))
     for i, ee in enumerate(state.excitations):
         tdm = transition_dm(state.property_method, state.ground_state, ee.excitation_vector)
-        tms = np.zeros(op_shape)
-        for c in components:
-            # list indices must be integers (1-D operators)
-            c = c[0] if len(c) == 1 else c
-            tms[c] = product_trace(integrals[c], tdm)
-        moments[i] = tms
+        moments[i] = compute_expectation_values(tdm, integrals, symmetric)
     return np.squeeze(moments)
 
 
 def compute_state_to_state_transition_moments(state, integrals, initial_state=None,
-                                              final_state=None):
-    istates = state.size
-    excitations1 = state.excitations
-    if initial_state is not None:
-        istates = 1
-        excitations1 = [state.excitations[initial_state]]
-    fstates = state.size
-    excitations2 = state.excitations
-    if final_state is not None:
-        fstates = 1
-        excitations2 = [state.excitations[final_state]]
-
-    op_shape = np.shape(integrals)
-    iterables = [list(range(shape)) for shape in op_shape]
-    components = list(product(*iterables))
-    s2s_tm = np.zeros((istates, fstates, *op_shape))
-    for i, ee1 in enumerate(tqdm(excitations1)):
+                                              final_state=None, n_workers=None, symmetric=False):
+    return compute_state_to_state_transition_moments_multi(
+        state, {None: integrals}, initial_state, final_state, n_workers,
+        symmetric=[None] if symmetric else (),
+    )[None]
+
+
+def _s2s_tm_block(state, integrals, excitations1, excitations2, symmetric=()):
+    s2s_tm = {}
+    for key, ints in integrals.items():
+        s2s_tm[key] = np.zeros((len(excitations1), len(excitations2), *np.shape(ints)))
+    for i, ee1 in enumerate(excitations1):
         for j, ee2 in enumerate(excitations2):
             tdm = state2state_transition_dm(
                 state.property_method,
@@ -133,31 +166,253 @@ def compute_state_to_state_transition_moments(state, integrals, initial_state=No
                 ee2.excitation_vector,
                 state.matrix.intermediates,
             )
-            tms = np.zeros(op_shape)
-            for c in components:
-                # list indices must be integers (1-D operators)
-                c = c[0] if len(c) == 1 else c
-                tms[c] = product_trace(tdm, integrals[c])
-            s2s_tm[i, j] = tms
-    return np.squeeze(s2s_tm)
+            for key, ints in integrals.items():
+                s2s_tm[key][i, j] = compute_expectation_values(tdm, ints, key in symmetric)
+    return s2s_tm
+
+
+def compute_state_to_state_transition_moments_multi(state, integrals, initial_state=None,
+                                                    final_state=None, n_workers=None, out=None,
+                                                    symmetric=()):
+    """Compute the state-to-state transition moments for several operators at once,
+    such that each transition density matrix is built only once.
+
+    Parameters
+    ----------
+    state: <class 'adcc.ExcitedStates.ExcitedStates'>
+        ExcitedStates object returned by an ADC calculation.
+
+    integrals: dict
+        Operator integrals (list or array of <class 'adcc.OneParticleOperator'>) for each key.
+
+    initial_state: int, optional
+        Only compute the transition moments from this state.
+
+    final_state: int, optional
+        Only compute the transition moments to this state.
+
+    n_workers: int, optional
+        Number of worker threads; the rows of initial states are distributed in blocks
+        among threads, which share the ground state and the intermediates.
+        By default, the moments are computed in the calling thread.
+
+    out: dict, optional
+        Arrays of shape (initial states, final states, operator shape) for each key of the
+        integrals dictionary, e.g., memory-mapped files, which are filled row by row;
+        by default, new arrays are allocated.
+
+    symmetric: collection, optional
+        Keys of the operators whose components are symmetric with respect to an exchange of
+        the indices; only the unique components are computed.
+
+    Returns
+    ----------
+    dict
+        Array of transition moments for each key of the integrals dictionary.
+    """
+    excitations1 = state.excitations
+    if initial_state is not None:
+        excitations1 = [state.excitations[initial_state]]
+    excitations2 = state.excitations
+    if final_state is not None:
+        excitations2 = [state.excitations[final_state]]
+
+    if out is None:
+        s2s_tm = {}
+        for key, ints in integrals.items():
+            s2s_tm[key] = np.zeros((len(excitations1), len(excitations2), *np.shape(ints)))
+    else:
+        s2s_tm = out
+        for key, ints in integrals.items():
+            assert s2s_tm[key].shape == (len(excitations1), len(excitations2), *np.shape(ints))
+
+    progress = tqdm(total=len(excitations1))
+    if n_workers is None or n_workers <= 1 or len(excitations1) == 1:
+        for i, ee1 in enumerate(excitations1):
+            block = _s2s_tm_block(state, integrals, [ee1], excitations2, symmetric)
+            for key, tm in block.items():
+                s2s_tm[key][i] = tm[0]
+            progress.update(1)
+        progress.close()
+        return {key: np.squeeze(tm) for key, tm in s2s_tm.items()}
+
+    # several blocks per worker, so that the load is balanced
+    blocks = np.array_split(
+        np.arange(len(excitations1)), min(len(excitations1), 4 * n_workers)
+    )
+    # threads instead of processes, because forking a process that already runs the threads
+    # of the tensor backend is not safe
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            futures = {
+                pool.submit(
+                    _s2s_tm_block, state, integrals, [excitations1[i] for i in rows],
+                    excitations2, symmetric,
+                ): rows
+                for rows in blocks
+            }
+            for n_done, future in enumerate(as_completed(futures), start=1):
+                rows = futures[future]
+                for key, tm in future.result().items():
+                    s2s_tm[key][rows[0]:rows[-1] + 1] = tm
+                progress.set_postfix(blocks=f"{n_done}/{len(blocks)}", workers=n_workers)
+                progress.update(len(rows))
+    finally:
+        progress.close()
+    return {key: np.squeeze(tm) for key, tm in s2s_tm.items()}
+
+
+class MomentEngine:
+    """Compute state-to-state transition moments for all operators of a property at once.
+
+    Each transition density matrix is traced against the integrals of every registered operator,
+    so that it is built only once even if the property contains several operators,
+    e.g., electric and magnetic dipole operators. The results are cached and split into
+    per-operator arrays.
+    """
+
+    def __init__(self, state: adcc.ExcitedStates, n_workers: Union[int, None] = None,
+                 memmap_dir: Union[str, None] = None, keep_memmaps: bool = False):
+        self._state = state
+        # number of threads used to compute the state-to-state transition moments
+        self._n_workers = n_workers
+        # directory in which each engine creates its own subdirectory for the full tables,
+        # which are stored as memory-mapped .npy files; the subdirectory is removed when the
+        # engine is released, unless the files are kept
+        self._memmap_dir = memmap_dir
+        self._keep_memmaps = keep_memmaps
+        self._memmap_path = None
+        self._integrals = {}
+        self._symmetric = set()
+        # full tables of the operators, which are computed at most once
+        self._full_s2s_tm = {}
+        # tables from or to a specific state, which contain all registered operators
+        self._s2s_tm = {}
+
+    @property
+    def memmap_path(self) -> Union[str, None]:
+        """Directory of the memory-mapped files of this engine, if any were created."""
+        return self._memmap_path
+
+    def register(self, op_type: str, integrals: list[adcc.OneParticleOperator],
+                 symmetric: bool = False):
+        if op_type not in self._integrals:
+            self._integrals[op_type] = integrals
+            if symmetric:
+                self._symmetric.add(op_type)
+            # moments from or to a specific state computed before do not contain the new
+            # operator; full tables are kept, and only the missing ones are computed later
+            self._s2s_tm.clear()
+
+    def state_to_state_transition_moments(self, op_type: str, initial_state=None,
+                                          final_state=None) -> np.ndarray:
+        assert op_type in self._integrals
+        key = (initial_state, final_state)
+        if op_type in self._full_s2s_tm:
+            # take the requested moments from the full array
+            return self._full_s2s_tm[op_type][
+                slice(None) if initial_state is None else initial_state,
+                slice(None) if final_state is None else final_state,
+            ]
+        if key == (None, None):
+            missing = {
+                op: ints for op, ints in self._integrals.items() if op not in self._full_s2s_tm
+            }
+            out = None
+            if self._memmap_dir is not None:
+                out = self._open_memmaps(missing)
+            self._full_s2s_tm.update(compute_state_to_state_transition_moments_multi(
+                self._state, missing, initial_state, final_state, self._n_workers, out,
+                self._symmetric,
+            ))
+            if out is not None:
+                for tm in out.values():
+                    tm.flush()
+            return self._full_s2s_tm[op_type]
+        if key not in self._s2s_tm:
+            self._s2s_tm[key] = compute_state_to_state_transition_moments_multi(
+                self._state, self._integrals, initial_state, final_state, self._n_workers,
+                symmetric=self._symmetric,
+            )
+        return self._s2s_tm[key][op_type]
+
+    def _open_memmaps(self, integrals: dict) -> dict:
+        if self._memmap_path is None:
+            os.makedirs(self._memmap_dir, exist_ok=True)
+            # a directory of its own, such that other engines never overwrite tables
+            # that are still mapped
+            self._memmap_path = tempfile.mkdtemp(prefix="s2s_tm_", dir=self._memmap_dir)
+            if not self._keep_memmaps:
+                weakref.finalize(self, shutil.rmtree, self._memmap_path, ignore_errors=True)
+        n_states = len(self._state.excitations)
+        out = {}
+        for op_type, ints in integrals.items():
+            # each file is created once, since the full table of an operator is computed once
+            out[op_type] = np.lib.format.open_memmap(
+                os.path.join(self._memmap_path, f"s2s_tm_{op_type}.npy"),
+                mode="w+",
+                dtype=float,
+                shape=(n_states, n_states, *np.shape(ints)),
+            )
+        return out
+
+
+class IsrBackend(ABC):
+    """Abstract base class for a replacement of adcc in the ADC/ISR approach, which provides
+    the ADC matrix, the modified transition moments and the B matrices of the operators
+    (e.g., dense matrices of a model system) together with a solver of the response equations.
+    """
+
+    @abstractproperty
+    def matrix(self) -> Any:
+        """ADC matrix, which is passed to solve_response."""
+
+    @abstractmethod
+    def solve_response(self, matrix: Any, rhs: Any, omega: float, gamma: float = 0.0,
+                       projection: Any = None, **solver_args) -> Any:
+        """Solve the response equation with the conventions of respondo's solve_response."""
+
+    @abstractmethod
+    def modified_transition_moments(self, op_type: str) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def isr_matrix(self, op_type: str, comp: Union[int, None] = None) -> Any:
+        pass
+
+    @abstractmethod
+    def transition_polarizability(self, op_type: str, to_vec: Any, from_vec: Any,
+                                  comp: Union[int, None] = None) -> np.ndarray:
+        pass
 
 
 class AdccProperties(ABC):
     """Abstract base class encompassing all properties that can be obtained
     from adcc for a given operator."""
 
-    def __init__(self, state: Union[adcc.ExcitedStates, MockExcitedStates],
-                 gauge_origin: Union[str, tuple[float, float, float], None] = None):
+    def __init__(self, state: Union[adcc.ExcitedStates, ZarrExcitedStates],
+                 gauge_origin: Union[str, tuple[float, float, float], None] = None,
+                 moment_engine: Union[MomentEngine, None] = None,
+                 isr_backend: Union[IsrBackend, None] = None):
         self._state = state
+        # the quantities of the ADC/ISR approach are obtained from adcc unless a backend is given
+        self._isr_backend = isr_backend
         self._state_size = len(state.excitation_energy_uncorrected)
         self._property_method = self._state.property_method
-        if isinstance(self._state, MockExcitedStates):
+        if isinstance(self._state, ZarrExcitedStates):
             self._pm_level = self._state.property_method.replace("adc", "")
         else:
             self._pm_level = self._state.property_method.level
 
         self._gauge_origin = gauge_origin
 
+        # state-to-state transition moments may be computed together with other operators
+        self._moment_engine = moment_engine
+        if moment_engine is not None and not isinstance(self._state, ZarrExcitedStates):
+            moment_engine.register(
+                self._operator.name, self.integrals, self._operator.symmetric_components
+            )
+
         # to make things faster if not all state-to-state transition moments are needed
         # but only from or to a specific state
         self._s2s_tm_i = np.empty((self._state_size), dtype=object)
@@ -209,29 +464,33 @@ class AdccProperties(ABC):
         if initial_state is None and final_state is None:
             return self.state_to_state_transition_moment[:]
         elif initial_state is None:
-            if isinstance(self._state, MockExcitedStates):
+            if isinstance(self._state, ZarrExcitedStates):
                 return self.state_to_state_transition_moment[:, final_state]
             if self._s2s_tm_f[final_state] is None:
-                self._s2s_tm_f[final_state] = compute_state_to_state_transition_moments(
-                    self._state, self.integrals, final_state=final_state
-                )
+                self._s2s_tm_f[final_state] = self._compute_s2s_tm(final_state=final_state)
             return self._s2s_tm_f[final_state]
         elif final_state is None:
-            if isinstance(self._state, MockExcitedStates):
+            if isinstance(self._state, ZarrExcitedStates):
                 return self.state_to_state_transition_moment[initial_state, :]
             if self._s2s_tm_i[initial_state] is None:
-                self._s2s_tm_i[initial_state] = compute_state_to_state_transition_moments(
-                    self._state, self.integrals, initial_state=initial_state
-                )
+                self._s2s_tm_i[initial_state] = self._compute_s2s_tm(initial_state=initial_state)
             return self._s2s_tm_i[initial_state]
         else:
-            if isinstance(self._state, MockExcitedStates):
+            if isinstance(self._state, ZarrExcitedStates):
                 return self.state_to_state_transition_moment[initial_state, final_state]
-            s2s_tm = compute_state_to_state_transition_moments(
-                self._state, self.integrals, initial_state, final_state
-            )
+            s2s_tm = self._compute_s2s_tm(initial_state, final_state)
             return s2s_tm
 
+    def _compute_s2s_tm(self, initial_state=None, final_state=None) -> np.ndarray:
+        if self._moment_engine is not None:
+            return self._moment_engine.state_to_state_transition_moments(
+                self._operator.name, initial_state, final_state
+            )
+        return compute_state_to_state_transition_moments(
+            self._state, self.integrals, initial_state, final_state,
+            symmetric=self._operator.symmetric_components,
+        )
+
     @abstractmethod
     def _transition_moment(self) -> np.ndarray:
         pass
@@ -240,17 +499,29 @@ class AdccProperties(ABC):
     def _state_to_state_transition_moment(self) -> np.ndarray:
         pass
 
-    def modified_transition_moments(
-        self, comp: Union[int, None] = None
-    ) -> Union[adcc.AmplitudeVector, list[adcc.AmplitudeVector]]:
-        if comp is None:
-            op = self.integrals
-        else:
-            op = self.integrals[comp]
+    @cached_property
+    def _modified_transition_moments(self) -> np.ndarray:
+        if self._isr_backend is not None:
+            return self._isr_backend.modified_transition_moments(self._operator.name)
+        # the modified transition moments of all (unique) components are built in one batch
+        op_shape = np.shape(self.integrals)
+        symmetric = self._operator.symmetric_components
+        components = operator_components(op_shape, symmetric)
         mtms = modified_transition_moments(
-            self._property_method, self._state.ground_state, op
+            self._property_method, self._state.ground_state,
+            [component_integrals(self.integrals, c) for c in components],
         )
-        return mtms
+        ret = np.empty(op_shape, dtype=object)
+        for c in np.ndindex(op_shape):
+            ret[c] = mtms[components.index(tuple(sorted(c)) if symmetric else c)]
+        return ret
+
+    def modified_transition_moments(
+        self, comp: Union[int, tuple[int, ...], None] = None
+    ) -> Union[adcc.AmplitudeVector, np.ndarray]:
+        if comp is None:
+            return self._modified_transition_moments
+        return self._modified_transition_moments[comp]
 
     def modified_transition_moments_reverse(
         self, comp: Union[int, None] = None
@@ -258,6 +529,8 @@ class AdccProperties(ABC):
         return self.revert_transition_moment(self.modified_transition_moments(comp))
 
     def isr_matrix(self, comp: Union[int, None] = None) -> adcc.IsrMatrix:
+        if self._isr_backend is not None:
+            return self._isr_backend.isr_matrix(self._operator.name, comp)
         if comp is None:
             op = self.integrals
         else:
@@ -270,6 +543,10 @@ class AdccProperties(ABC):
         from_vec: Union[adcc.AmplitudeVector, RV],
         comp: Union[int, None] = None
         ) -> np.ndarray:
+        if self._isr_backend is not None:
+            return self._isr_backend.transition_polarizability(
+                self._operator.name, to_vec, from_vec, comp
+            )
         if comp is None:
             op = self.integrals
         else:
@@ -295,18 +572,44 @@ class AdccProperties(ABC):
 
 
 def build_adcc_properties(
-    state: Union[adcc.ExcitedStates, MockExcitedStates],
+    state: Union[adcc.ExcitedStates, ZarrExcitedStates],
     op_type: str,
-    gauge_origin: Union[str, tuple[float, float, float], None] = None
+    gauge_origin: Union[str, tuple[float, float, float], None] = None,
+    moment_engine: Union[MomentEngine, None] = None,
+    isr_backend: Union[IsrBackend, None] = None,
 ) -> AdccProperties:
     if op_type == "electric_dipole":
-        return ElectricDipole(state, gauge_origin)
+        return ElectricDipole(state, gauge_origin, moment_engine, isr_backend)
     elif op_type == "magnetic_dipole":
-        return MagneticDipole(state, gauge_origin)
+        return MagneticDipole(state, gauge_origin, moment_engine, isr_backend)
+    elif op_type == "diamagnetic_magnetizability":
+        return DiamagneticMagnetizability(state, gauge_origin, moment_engine, isr_backend)
     else:
         raise NotImplementedError
 
 
+def build_adcc_properties_dict(
+    state: Union[adcc.ExcitedStates, ZarrExcitedStates],
+    op_types: list[str],
+    gauge_origin: Union[str, tuple[float, float, float], None] = None,
+    n_workers: Union[int, None] = None,
+    memmap_dir: Union[str, None] = None,
+    isr_backend: Union[IsrBackend, None] = None,
+    keep_memmaps: bool = False,
+) -> dict[str, AdccProperties]:
+    """Build the adcc properties for the given operators, which share a moment engine
+    such that the state-to-state transition moments of all operators are computed together
+    (using n_workers threads, if specified); if memmap_dir is given, the full tables are
+    stored as memory-mapped files in a new subdirectory of it instead of being held in memory,
+    which is removed when the moment engine is released unless keep_memmaps is set.
+    The quantities of the ADC/ISR approach are taken from isr_backend, if specified."""
+    moment_engine = MomentEngine(state, n_workers, memmap_dir, keep_memmaps)
+    return {
+        op_type: build_adcc_properties(state, op_type, gauge_origin, moment_engine, isr_backend)
+        for op_type in op_types
+    }
+
+
 class ElectricDipole(AdccProperties):
     @property
     def _operator(self) -> Operator:
@@ -318,7 +621,7 @@ class ElectricDipole(AdccProperties):
 
     @property
     def gs_moment(self) -> np.ndarray:
-        if isinstance(self._state, MockExcitedStates):
+        if isinstance(self._state, ZarrExcitedStates):
             return self._state.ground_state.dipole_moment[self._pm_level]
         else:
             return self._state.ground_state.dipole_moment(self._pm_level)
@@ -327,10 +630,10 @@ class ElectricDipole(AdccProperties):
         return self._state.transition_dipole_moment
 
     def _state_to_state_transition_moment(self) -> np.ndarray:
-        if isinstance(self._state, MockExcitedStates):
+        if isinstance(self._state, ZarrExcitedStates):
             return self._state.transition_dipole_moment_s2s
         else:
-            return compute_state_to_state_transition_moments(self._state, self.integrals)
+            return self._compute_s2s_tm()
 
 
 class MagneticDipole(AdccProperties):
@@ -344,6 +647,8 @@ class MagneticDipole(AdccProperties):
 
     @property
     def gs_moment(self) -> np.ndarray:
+        if isinstance(self._state, ZarrExcitedStates):
+            return self._state.ground_state.magnetic_dipole_moment[self._pm_level]
         # the minus sign is needed, because the negative charge is not yet included
         # in the operator definitions
         # TODO: remove minus after adc-connect/adcc#190 is merged
@@ -366,7 +671,58 @@ class MagneticDipole(AdccProperties):
         return self._state.transition_magnetic_dipole_moment
 
     def _state_to_state_transition_moment(self) -> np.ndarray:
-        if isinstance(self._state, MockExcitedStates):
+        if isinstance(self._state, ZarrExcitedStates):
             return self._state.transition_magnetic_moment_s2s
         else:
-            return compute_state_to_state_transition_moments(self._state, self.integrals)
\ No newline at end of file
+            return self._compute_s2s_tm()
+
+
+class DiamagneticMagnetizability(AdccProperties):
+    """Diamagnetic magnetizability operator, whose nine components are symmetric,
+    such that only the six unique ones are computed from each density."""
+
+    @property
+    def _operator(self) -> Operator:
+        return get_operator_by_name("diamagnetic_magnetizability")
+
+    @property
+    def integrals(self) -> list[list[adcc.OneParticleOperator]]:
+        return self._state.reference_state.operators.diamagnetic_magnetizability
+
+    @property
+    def gs_moment(self) -> np.ndarray:
+        if isinstance(self._state, ZarrExcitedStates):
+            raise NotImplementedError(
+                "Diamagnetic magnetizabilities are not available for mock states."
+            )
+        # in contrast to the dipole operators, no minus sign is needed, because the operator
+        # is quadratic in the charge of the electron; the transition and state-to-state
+        # transition moments are computed without a sign as well
+        ref_moment = compute_expectation_values(
+            self._state.ground_state.reference_state.density, self.integrals, symmetric=True
+        )
+        if self._pm_level in [0, 1]:
+            return ref_moment
+        elif self._pm_level == 2:
+            mp2corr = compute_expectation_values(
+                self._state.ground_state.mp2_diffdm, self.integrals, symmetric=True
+            )
+            return ref_moment + mp2corr
+        else:
+            raise NotImplementedError(
+                "Only diamagnetic magnetizabilities for level 1 and 2 are implemented."
+            )
+
+    def _transition_moment(self) -> np.ndarray:
+        if isinstance(self._state, ZarrExcitedStates):
+            raise NotImplementedError(
+                "Diamagnetic magnetizabilities are not available for mock states."
+            )
+        return compute_transition_moments(self._state, self.integrals, symmetric=True)
+
+    def _state_to_state_transition_moment(self) -> np.ndarray:
+        if isinstance(self._state, ZarrExcitedStates):
+            raise NotImplementedError(
+                "Diamagnetic magnetizabilities are not available for mock states."
+            )
+        return self._compute_s2s_tm()
@@ -16,6 +16,12 @@
 #  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
 #
 
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 from sympy import (
     Abs,
     Add,
@@ -23,15 +29,19 @@ from sympy import (
     Integer,
     Mul,
     Pow,
+    Rational,
     Symbol,
-    adjoint,
+    cancel,
     fraction,
     latex,
     simplify,
+    together,
     zoo,
 )
 from sympy.physics.quantum.operator import Operator
 from sympy.physics.quantum.state import Bra, Ket
+from sympy.polys.domains import QQ_I
+from sympy.polys.rings import ring
 
 from responsefun.operators import (
     M,
@@ -43,6 +53,9 @@ from responsefun.operators import (
 )
 from responsefun.SumOverStates import SumOverStates, extract_bra_op_ket
 from responsefun.symbols_and_labels import O
+from responsefun.terms import Factor, FactorKind, Term, factors_of
+
+logger = logging.getLogger(__name__)
 
 
 def insert_single_moments(expr, summation_indices):
@@ -69,25 +82,31 @@ def insert_single_moments(expr, summation_indices):
 def insert_matrix(expr, matrix=Operator("M")):
     """Insert inverse shifted ADC matrix expression."""
     assert isinstance(expr, Mul)
-    kb = [Ket, Bra]
-    expr_types = [type(term) for term in expr.args]
+    return _insert_matrix(Term.from_expr(expr), matrix).to_expr()
+
+
+def _insert_matrix(term, matrix):
+    """Insert inverse shifted ADC matrix expression into a term."""
+    factors = term.factors
     ketbra_match = {
-        expr.args[i].label[0]: expr.args[i : i + 2]
-        for i, k in enumerate(expr_types)
-        if expr_types[i : i + 2] == kb  # find Ket-Bra sequence
-        and expr.args[i].label[0] == expr.args[i + 1].label[0]  # make sure they have the same state
+        factors[i].obj.label[0]: i
+        for i in range(len(factors) - 1)
+        if factors[i].kind == FactorKind.KET  # find Ket-Bra sequence
+        and factors[i + 1].kind == FactorKind.BRA
+        # make sure they have the same state
+        and factors[i].obj.label[0] == factors[i + 1].obj.label[0]
     }
     denominators = []
-    for term in expr.args:
-        if isinstance(term, Pow) and term.args[1] < 0:
-            assert isinstance(term.args[1], Integer)
-            list_to_append = [term.args[0]] * Abs(term.args[1])
+    for term_arg in Mul.make_args(term.scalar):
+        if isinstance(term_arg, Pow) and term_arg.args[1] < 0:
+            assert isinstance(term_arg.args[1], Integer)
+            list_to_append = [term_arg.args[0]] * Abs(term_arg.args[1])
             denominators += list_to_append
     denominator_matches = {}
     for state_label in ketbra_match:
         denominator_match = {}
         if state_label == O:
-            print("Ground state RI.")
+            logger.debug("Ground state RI.")
             continue
         for d in denominators:
             if isinstance(d, Add):
@@ -114,9 +133,11 @@ def insert_matrix(expr, matrix=Operator("M")):
     assert len(denominator_matches) == len(ketbra_match)
     assert denominator_matches.keys() == ketbra_match.keys()
 
-    sub = expr.copy()
-    for k in ketbra_match:
-        ket, bra = ketbra_match[k]
+    # the Ket-Bra sequence is replaced by the inverse shifted matrices and the
+    # corresponding denominators are removed
+    inserted = {}
+    subs_dict = {}
+    for k, i in ketbra_match.items():
         bra_subs = 1
         denom_dict = {}
         for tup in denominator_matches[k]:
@@ -125,30 +146,61 @@ def insert_matrix(expr, matrix=Operator("M")):
             denom_dict[denom_remove] = 1
         assert bra_subs != 1
         assert len(denom_dict) > 0
-        subs_dict = {}
-        subs_dict[ket] = 1
-        subs_dict[bra] = bra_subs
+        inserted[i] = factors_of(bra_subs)
         subs_dict.update(denom_dict)
-        sub = sub.subs(subs_dict)
-    return sub
+    new_factors = []
+    i = 0
+    while i < len(factors):
+        if i in inserted:
+            new_factors.extend(inserted[i])
+            i += 2
+        else:
+            new_factors.append(factors[i])
+            i += 1
+    return Term(term.scalar.xreplace(subs_dict), new_factors)
 
 
 def insert_isr_transition_moments(expr, operators):
     """Insert vector F of modified transition moments and matrix B of modified excited-states
     transition moments."""
     assert isinstance(expr, Mul)
-    ret = expr.copy()
+    return _insert_isr_transition_moments(Term.from_expr(expr), operators).to_expr()
+
+
+def _insert_isr_transition_moments(term, operators):
+    """Insert vector F of modified transition moments and matrix B of modified excited-states
+    transition moments into a term."""
+    factors = term.factors
+    gs_bra, gs_ket = Factor(Bra(O)), Factor(Ket(O))
     for op in operators:
-        F = MTM(op.comp, op.op_type)
-        Fd = adjoint(F)
-        ret = ret.subs(Bra(O) * op, Fd)
-        ret = ret.subs(op * Ket(O), F)
+        op_factor = Factor(op)
+        F = Factor(MTM(op.comp, op.op_type))
+        term = term.replace((gs_bra, op_factor), (F.adjoint(),))
+        term = term.replace((op_factor, gs_ket), (F,))
         # replace the remaining operators with the ISR matrix
-        B = S2S_MTM(op.comp, op.op_type)
-        ret = ret.subs(op, B)
-    if ret == expr:
-        print("Term contains no transition moment.")
-    return ret
+        B = Factor(S2S_MTM(op.comp, op.op_type))
+        term = term.replace((op_factor,), (B,))
+    if term.factors == factors:
+        logger.debug("Term contains no transition moment.")
+    return term
+
+
+def map_terms(function, terms, n_workers=None):
+    """Apply a function to each term of an SOS expression, in a pool of n_workers processes
+    if n_workers is larger than one; the results are returned in the order of the terms,
+    so that they are merged in the same way as in the serial case."""
+    if n_workers is None or n_workers <= 1 or len(terms) <= 1:
+        return [function(term) for term in terms]
+    # the workers are spawned rather than forked, because the calling process may already run
+    # the threads of the tensor backend; the function and the terms are pickled
+    with ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return list(pool.map(function, terms, chunksize=max(1, len(terms) // (4 * n_workers))))
+
+
+def _to_isr_main_term(expr, summation_indices, operators):
+    return to_isr_single_term(insert_single_moments(expr, summation_indices), operators)
 
 
 def to_isr_single_term(expr, operators=None):
@@ -157,8 +209,9 @@ def to_isr_single_term(expr, operators=None):
     assert isinstance(expr, Mul)
     if not operators:
         operators = [op for op in expr.args if isinstance(op, OneParticleOperator)]
-    i1 = insert_isr_transition_moments(expr, operators)
-    return insert_matrix(i1, M)
+    # the term is converted only once and the ISR quantities are inserted into its factors
+    term = _insert_isr_transition_moments(Term.from_expr(expr), operators)
+    return _insert_matrix(term, M).to_expr()
 
 
 def extra_terms_single_sos(expr, summation_indices, excluded_states=None):
@@ -188,62 +241,177 @@ def extra_terms_single_sos(expr, summation_indices, excluded_states=None):
     assert isinstance(expr, Mul)
     if excluded_states is None:
         excluded_states = []
+    # the extra terms of the same term with the same remaining indices of summation are
+    # only determined once
+    memo = {}
+    return _extra_terms_single_sos(expr, tuple(summation_indices), tuple(excluded_states), memo)
+
+
+def _special_cases(expr, summation_indices, excluded_states):
     boks = extract_bra_op_ket(expr)
     special_cases = []
+    found = set()
+
+    def add_case(case):
+        if case not in found and case[::-1] not in found:
+            special_cases.append(case)
+            found.add(case)
+
     # find special cases
     for index in summation_indices:
-        special_cases.append((index, O))
+        add_case((index, O))
         for bok in boks:
             bra, ket = bok[0].label[0], bok[2].label[0]
-            if bra == index and (bra, ket) not in special_cases and (ket, bra) not in special_cases:
-                special_cases.append((bra, ket))
-            elif (
-                ket == index and (ket, bra) not in special_cases and (bra, ket) not in special_cases
-            ):
-                special_cases.append((ket, bra))
+            if bra == index:
+                add_case((bra, ket))
+            elif ket == index:
+                add_case((ket, bra))
+    removed = set()
     # remove excluded cases
-    for state in excluded_states:
-        special_cases[:] = [case for case in special_cases if case[1] != state]
+    for case in special_cases:
+        if case[1] in excluded_states:
+            removed.add(case)
     # remove cases where operators are shifted
     for bok in boks:
-        bra, ket = bok[0].label[0], bok[2].label[0]
-        op = bok[1]
-        if op.shifted:
-            case = (bra, ket)
-            case_rev = (ket, bra)
-            if case in special_cases:
-                special_cases.remove(case)
-            elif case_rev in special_cases:
-                special_cases.remove(case_rev)
-
+        if bok[1].shifted:
+            case = (bok[0].label[0], bok[2].label[0])
+            if case in found and case not in removed:
+                removed.add(case)
+            elif case[::-1] in found:
+                removed.add(case[::-1])
+    return [case for case in special_cases if case not in removed]
+
+
+def _special_case_term(expr, index, case):
+    """Return the SOS term in which the index of summation is replaced by the state case."""
+    if case == O:
+        return expr.xreplace({index: O, TransitionFrequency(index, real=True): 0})
+    term = expr.xreplace({
+        index: case, TransitionFrequency(index, real=True): TransitionFrequency(case, real=True)
+    })
+    # <case|op|case> is replaced by <O|op|O>
+    args = list(term.args)
+    for i, arg in enumerate(args[:-2]):
+        if (
+            isinstance(arg, Bra) and isinstance(args[i + 1], OneParticleOperator)
+            and isinstance(args[i + 2], Ket)
+            and arg.label[0] == case and args[i + 2].label[0] == case
+        ):
+            args[i], args[i + 2] = Bra(O), Ket(O)
+    return Mul(*args)
+
+
+def _extra_terms_single_sos(expr, summation_indices, excluded_states, memo):
+    key = (expr, summation_indices)
+    if key in memo:
+        return memo[key]
     extra_terms = {}
-    for tup in special_cases:
-        index, case = tup[0], tup[1]
-        if case == O:
-            term = expr.subs([tup, (TransitionFrequency(index, real=True), 0)])
-        else:
-            term = expr.subs(
-                [tup, (TransitionFrequency(index, real=True), TransitionFrequency(case, real=True))]
-            )
-            boks = extract_bra_op_ket(term)
-            for bok in boks:
-                if bok[0].label[0] == case and bok[2].label[0] == case:
-                    term = term.subs(bok[0] * bok[1] * bok[2], Bra(O) * bok[1] * Ket(O))
+    # extra terms are compared by their hashes instead of a search through the values
+    found_terms = set()
+    for tup in _special_cases(expr, summation_indices, excluded_states):
+        index, case = tup
+        term = _special_case_term(expr, index, case)
         if term == zoo:
             raise ZeroDivisionError("Extra terms cannot be determined for static SOS expressions.")
         extra_terms[(tup,)] = term
+        found_terms.add(term)
         # find extra terms of extra term
-        new_indices = summation_indices.copy()
-        new_indices.remove(index)
+        new_indices = tuple(i for i in summation_indices if i != index)
         if new_indices:
-            new_et = extra_terms_single_sos(term, new_indices, excluded_states)
+            new_et = _extra_terms_single_sos(term, new_indices, excluded_states, memo)
             for c, t in new_et.items():
-                if t not in extra_terms.values():
+                if t not in found_terms:
                     extra_terms[(tup,) + c] = t
+                    found_terms.add(t)
+    memo[key] = extra_terms
     return extra_terms
 
 
-def compute_remaining_terms(extra_terms, correlation_btw_freq=None):
+def _vanishes(expr, n_points=3, seed=0):
+    """Check whether a sum of terms, which share their non-commutative part (transition moments),
+    is identically zero.
+
+    The commutative parts are first evaluated at random points, so that sums that do not vanish
+    are rejected quickly; otherwise, their sum is brought to a canonical rational-function form
+    (with Floats converted to Rationals), whose numerator is zero if and only if the sum vanishes.
+    """
+    terms = Add.make_args(expr)
+    nc_parts = set()
+    commutative_terms = []
+    for term in terms:
+        c_part, nc_part = term.args_cnc()
+        nc_parts.add(tuple(nc_part))
+        commutative_terms.append(Mul(*c_part))
+    if len(nc_parts) > 1:
+        return simplify(expr) == 0
+
+    symbols = sorted(Add(*commutative_terms).free_symbols, key=str)
+    rng = np.random.default_rng(seed)
+    for _ in range(n_points):
+        point = {s: Float(v) for s, v in zip(symbols, rng.uniform(0.5, 1.5, len(symbols)))}
+        values = [complex(term.xreplace(point)) for term in commutative_terms]
+        if not all(np.isfinite(values)):
+            continue
+        if abs(sum(values)) > 1e-8 * sum(abs(v) for v in values):
+            return False
+
+    # the terms are brought to a common denominator, such that the sum vanishes if and only if
+    # the numerator does
+    commutative_sum = Add(*commutative_terms)
+    commutative_sum = commutative_sum.xreplace(
+        {f: Rational(f) for f in commutative_sum.atoms(Float)}
+    )
+    coeffs = []
+    powers = []
+    for term in Add.make_args(commutative_sum):
+        coeff, rest = term.as_coeff_Mul()
+        coeffs.append(coeff)
+        term_powers = {}
+        for factor in Mul.make_args(rest):
+            base, exp = factor.as_base_exp()
+            term_powers[base] = term_powers.get(base, Integer(0)) + exp
+        powers.append(term_powers)
+    # the smallest power of each factor over all terms is divided out,
+    # i.e., the terms are multiplied by the least common denominator
+    common = {
+        base: min(p.get(base, Integer(0)) for p in powers) for base in set().union(*powers)
+    }
+    reduced = [
+        (coeff, {base: p.get(base, Integer(0)) - exp for base, exp in common.items()})
+        for coeff, p in zip(coeffs, powers)
+    ]
+    try:
+        return _polynomial_sum_vanishes(reduced)
+    except (ValueError, TypeError):
+        # factors that are not polynomials in the frequencies
+        return cancel(together(commutative_sum)) == 0
+
+
+def _polynomial_sum_vanishes(terms):
+    """Check whether a sum of terms coeff * prod(base**exp), given as (coeff, {base: exp}),
+    with polynomial bases and non-negative integer exponents is zero; the terms are multiplied
+    out in a polynomial ring, which is much faster than expanding them."""
+    bases = {base for _, powers in terms for base, exp in powers.items() if exp}
+    if any(not exp.is_Integer for _, powers in terms for exp in powers.values()):
+        raise ValueError("Only integer powers of the factors can be multiplied out.")
+    gens = sorted(set().union(*[base.free_symbols for base in bases]), key=str)
+    if not gens:
+        return Add(*[
+            coeff * Mul(*[base**exp for base, exp in powers.items()]) for coeff, powers in terms
+        ]) == 0
+    poly_ring = ring(gens, QQ_I)[0]
+    factors = {base: poly_ring.from_expr(base) for base in bases}
+    numerator = poly_ring.zero
+    for coeff, powers in terms:
+        term = poly_ring.from_expr(coeff)
+        for base, exp in powers.items():
+            if exp:
+                term *= factors[base] ** int(exp)
+        numerator += term
+    return not numerator
+
+
+def compute_remaining_terms(extra_terms, correlation_btw_freq=None, n_workers=None):
     """Sort the extra terms by numerators before simplifying them.
 
     Parameters
@@ -258,6 +426,10 @@ def compute_remaining_terms(extra_terms, correlation_btw_freq=None):
         the first entry is the frequency that can be replaced by the second entry,
         e.g., (w_o, w_1+w_2).
 
+    n_workers: int, optional
+        Number of processes among which the sums of extra terms with the same numerator
+        are distributed; by default, they are processed in the calling process.
+
     Returns
     ----------
     <class 'sympy.core.add.Add'> or <class 'sympy.core.mul.Mul'> or 0
@@ -279,19 +451,29 @@ def compute_remaining_terms(extra_terms, correlation_btw_freq=None):
             num_dict[mod_num] = term
         else:
             num_dict[mod_num] += term
+    terms = list(num_dict.values())
+    vanishes = map_terms(
+        partial(_vanishes_with_correlation, correlation_btw_freq=correlation_btw_freq), terms,
+        n_workers,
+    )
     remaining_terms = 0
-    for term in num_dict.values():
-        if simplify(term.subs(correlation_btw_freq)) != 0:
+    for term, term_vanishes in zip(terms, vanishes):
+        if not term_vanishes:
             remaining_terms += term
     return remaining_terms
 
 
+def _vanishes_with_correlation(expr, correlation_btw_freq):
+    return _vanishes(expr.subs(correlation_btw_freq))
+
+
 def compute_extra_terms(
     expr,
     summation_indices,
     excluded_states=None,
     correlation_btw_freq=None,
     print_extra_term_dict=False,
+    n_workers=None,
 ):
     """Determine the additional terms that arise when converting an SOS expression to its ADC/ISR
     formulation.
@@ -318,8 +500,12 @@ def compute_extra_terms(
             (w_o, w_1+w_2).
 
     print_extra_term_dict: bool, optional
-        Print dictionary that explains where which additional term comes from,
-        by default 'False'.
+        Log dictionary that explains where which additional term comes from
+        (at the DEBUG level), by default 'False'.
+
+    n_workers: int, optional
+        Number of processes among which the terms of the SOS expression are distributed;
+        by default, they are processed in the calling process.
 
     Returns
     -----------
@@ -329,47 +515,59 @@ def compute_extra_terms(
     # TODO: insert shifted operators?
     assert isinstance(print_extra_term_dict, bool)
 
-    extra_terms_list = []
     if isinstance(expr, Add):
         terms_list = [arg for arg in expr.args]
     elif isinstance(expr, Mul):
         terms_list = [expr]
     else:
         raise TypeError("SOS expression must be either of type Mul or Add.")
-    for single_term in terms_list:
-        term_dict = extra_terms_single_sos(single_term, summation_indices, excluded_states)
-        extra_terms_list.append(term_dict)
-
-    mod_extra_terms = []
+    extra_terms_list = map_terms(
+        partial(
+            extra_terms_single_sos, summation_indices=summation_indices,
+            excluded_states=excluded_states,
+        ),
+        terms_list,
+        n_workers,
+    )
+
+    case_term_list = []
     for itd, term_dict in enumerate(extra_terms_list):
         if print_extra_term_dict:
-            print(f"Additional terms for term {itd+1}:")
-        # change remaining indices of summation in extra terms
+            logger.debug("Additional terms for term %d:", itd + 1)
         for case, term in term_dict.items():
             if print_extra_term_dict:
-                print(case, ": ", term)
-            new_term_1 = term
-            if len(case) != len(summation_indices):
-                new_indices = summation_indices.copy()
-                for tup in case:
-                    new_indices.remove(tup[0])
-                subs_list_1 = list(zip(new_indices, summation_indices[: len(new_indices)]))
-                freq_list = [
-                    (TransitionFrequency(ni, real=True), TransitionFrequency(nsi, real=True))
-                    for ni, nsi in subs_list_1
-                ]
-                subs_list_1 += freq_list
-                new_term_1 = term.subs(subs_list_1)
-            # convert single (transition) moments to instances of Moment
-            new_term_2 = insert_single_moments(new_term_1, summation_indices)
-            mod_extra_terms.append(new_term_2)
-    return compute_remaining_terms(mod_extra_terms, correlation_btw_freq)
+                logger.debug("%s: %s", case, term)
+            case_term_list.append((case, term))
+    mod_extra_terms = map_terms(
+        partial(_rename_extra_term, summation_indices=summation_indices), case_term_list,
+        n_workers,
+    )
+    return compute_remaining_terms(mod_extra_terms, correlation_btw_freq, n_workers)
+
+
+def _rename_extra_term(case_term, summation_indices):
+    case, term = case_term
+    # change remaining indices of summation in extra terms
+    new_term_1 = term
+    if len(case) != len(summation_indices):
+        new_indices = summation_indices.copy()
+        for tup in case:
+            new_indices.remove(tup[0])
+        subs_list_1 = list(zip(new_indices, summation_indices[: len(new_indices)]))
+        freq_list = [
+            (TransitionFrequency(ni, real=True), TransitionFrequency(nsi, real=True))
+            for ni, nsi in subs_list_1
+        ]
+        subs_list_1 += freq_list
+        new_term_1 = term.subs(subs_list_1)
+    # convert single (transition) moments to instances of Moment
+    return insert_single_moments(new_term_1, summation_indices)
 
 
 class IsrFormulation:
     """Class representing an ADC/ISR formulation of a response function."""
 
-    def __init__(self, sos, extra_terms=True, print_extra_term_dict=False):
+    def __init__(self, sos, extra_terms=True, print_extra_term_dict=False, n_workers=None):
         """
         Parameters
         ----------
@@ -381,7 +579,12 @@ class IsrFormulation:
             to its ADC/ISR formulation; by default 'True'.
 
         print_extra_term_dict: bool, optional
-            Print dictionary explaining the origin of the additional terms, by default 'False'.
+            Log dictionary explaining the origin of the additional terms (at the DEBUG level),
+            by default 'False'.
+
+        n_workers: int, optional
+            Number of processes among which the terms are distributed (see map_terms);
+            by default, they are processed in the calling process.
         """
         assert isinstance(sos, SumOverStates)
         assert isinstance(extra_terms, bool)
@@ -393,28 +596,35 @@ class IsrFormulation:
             sos_term_list = [sos.expr]
 
         self._main_terms = 0
-        for term in sos_term_list:
-            mod_term = insert_single_moments(term, sos.summation_indices)
-            self._main_terms += to_isr_single_term(mod_term, sos.operators)
+        for term in map_terms(
+            partial(
+                _to_isr_main_term, summation_indices=sos.summation_indices,
+                operators=sos.operators,
+            ),
+            sos_term_list,
+            n_workers,
+        ):
+            self._main_terms += term
 
         if extra_terms:
             if print_extra_term_dict:
-                print("Determining extra terms ...")
+                logger.info("Determining extra terms ...")
             computed_terms = compute_extra_terms(
                 sos.expr,
                 sos.summation_indices,
                 sos.excluded_states,
                 sos.correlation_btw_freq,
                 print_extra_term_dict,
+                n_workers,
             )
             self._extra_terms = 0
-            if computed_terms == 0:
-                pass
-            elif isinstance(computed_terms, Add):
-                for term in computed_terms.args:
-                    self._extra_terms += to_isr_single_term(term, sos.operators)
-            else:
-                self._extra_terms += to_isr_single_term(computed_terms, sos.operators)
+            if computed_terms != 0:
+                for term in map_terms(
+                    partial(to_isr_single_term, operators=sos.operators),
+                    list(Add.make_args(computed_terms)),
+                    n_workers,
+                ):
+                    self._extra_terms += term
         else:
             self._extra_terms = 0
 
@@ -0,0 +1,130 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+import string
+from collections import namedtuple
+
+import numpy as np
+
+from responsefun.symbols_and_labels import O
+
+ABC = list(string.ascii_uppercase)
+
+# states: symbols of the states that run along the leading axes of the array;
+# positions: positions of the Cartesian components of the moment in the property tensor
+MomentOperand = namedtuple("MomentOperand", ["states", "comp", "array", "positions"])
+
+
+class MomentTable:
+    """Dense arrays of the ground-state, transition and state-to-state moments of all operators
+    of a property.
+
+    The arrays are taken from the adcc properties once per evaluation (and only if they are needed),
+    so that the SOS and ISR engines do not access the property objects inside their loops.
+    """
+
+    def __init__(self, adcc_prop: dict, excited_state: tuple = (None, None),
+                 blockwise: bool = False):
+        """
+        Parameters
+        ----------
+        adcc_prop: dict
+            Dictionary of <class 'responsefun.AdccProperties.AdccProperties'>
+            with the operator types as keys.
+
+        excited_state: tuple, optional
+            (<class 'sympy.core.symbol.Symbol'>, int), e.g., (f, 0);
+            excited state that appears in the SOS expression.
+
+        blockwise: bool, optional
+            The full state-to-state tables are read blockwise by the caller, so that
+            arrays that are not held in memory (e.g., zarr arrays) are passed on as they are;
+            by default, they are read into memory.
+        """
+        self._adcc_prop = adcc_prop
+        self._excited_state = excited_state
+        self._blockwise = blockwise
+        self._gs_moment = {}
+        self._transition_moment = {}
+        self._transition_moment_reverse = {}
+        self._s2s_tm = {}
+
+    def gs_moment(self, op_type: str) -> np.ndarray:
+        if op_type not in self._gs_moment:
+            self._gs_moment[op_type] = np.asarray(self._adcc_prop[op_type].gs_moment)
+        return self._gs_moment[op_type]
+
+    def transition_moment(self, op_type: str) -> np.ndarray:
+        if op_type not in self._transition_moment:
+            self._transition_moment[op_type] = np.asarray(
+                self._adcc_prop[op_type].transition_moment
+            )
+        return self._transition_moment[op_type]
+
+    def transition_moment_reverse(self, op_type: str) -> np.ndarray:
+        if op_type not in self._transition_moment_reverse:
+            self._transition_moment_reverse[op_type] = self._adcc_prop[
+                op_type
+            ].revert_transition_moment(self.transition_moment(op_type))
+        return self._transition_moment_reverse[op_type]
+
+    def s2s_tm(self, op_type: str, initial_state=None, final_state=None) -> np.ndarray:
+        key = (op_type, initial_state, final_state)
+        if key not in self._s2s_tm:
+            adcop = self._adcc_prop[op_type]
+            if initial_state is None and final_state is None:
+                s2s_tm = adcop.state_to_state_transition_moment
+                # memory-mapped tables are not loaded by np.asarray either
+                self._s2s_tm[key] = s2s_tm if self._blockwise else np.asarray(s2s_tm)
+            else:
+                self._s2s_tm[key] = np.asarray(adcop.s2s_tm_view(initial_state, final_state))
+        return self._s2s_tm[key]
+
+    def operand(self, moment, summation_indices) -> MomentOperand:
+        """Return the array of a moment of the SOS expression, whose leading axes run over
+        the indices of summation it depends on, followed by its Cartesian components."""
+        op_type = moment.op_type
+        positions = tuple(ABC.index(char) for char in moment.comp)
+        excited_symbol, excited_index = self._excited_state
+        from_state, to_state = moment.from_state, moment.to_state
+
+        if from_state == O and to_state == O:  # <0|op|0>
+            return MomentOperand((), moment.comp, self.gs_moment(op_type), positions)
+        elif from_state == O:
+            tdms = self.transition_moment(op_type)
+            if to_state in summation_indices:  # e.g., <n|op|0>
+                return MomentOperand((to_state,), moment.comp, tdms, positions)
+            elif to_state == excited_symbol:  # e.g., <f|op|0>
+                return MomentOperand((), moment.comp, tdms[excited_index], positions)
+        elif to_state == O:
+            tdms = self.transition_moment_reverse(op_type)
+            if from_state in summation_indices:  # e.g., <0|op|n>
+                return MomentOperand((from_state,), moment.comp, tdms, positions)
+            elif from_state == excited_symbol:  # e.g., <0|op|f>
+                return MomentOperand((), moment.comp, tdms[excited_index], positions)
+        elif from_state in summation_indices and to_state in summation_indices:  # e.g., <n|op|m>
+            return MomentOperand(
+                (from_state, to_state), moment.comp, self.s2s_tm(op_type), positions
+            )
+        elif from_state in summation_indices and to_state == excited_symbol:  # e.g., <f|op|n>
+            s2s_tdms_f = self.s2s_tm(op_type, final_state=excited_index)
+            return MomentOperand((from_state,), moment.comp, s2s_tdms_f, positions)
+        elif to_state in summation_indices and from_state == excited_symbol:  # e.g., <n|op|f>
+            s2s_tdms_f = self.s2s_tm(op_type, initial_state=excited_index)
+            return MomentOperand((to_state,), moment.comp, s2s_tdms_f, positions)
+        raise ValueError(f"Unknown transition moment: {moment}.")
@@ -16,14 +16,16 @@
 #  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
 #
 
+import logging
 import string
+from collections import Counter
 from itertools import permutations
 
-from sympy import Add, Mul, Symbol, latex, solve
+from sympy import Add, Mul, Symbol, latex, solve, sympify
 from sympy.physics.quantum.state import Bra, Ket
 import warnings
 
-from responsefun.AdccProperties import Symmetry
+from responsefun.AdccProperties import Symmetry, get_operator_by_name
 from responsefun.operators import (
     Moment,
     OneParticleOperator,
@@ -31,6 +33,8 @@ from responsefun.operators import (
 )
 from responsefun.symbols_and_labels import O
 
+logger = logging.getLogger(__name__)
+
 ABC = list(string.ascii_uppercase)
 
 
@@ -147,12 +151,12 @@ def extract_initial_final_excited_from_sos(term, summation_indices):
     final = bras.difference(summation_indices)
     excited = set()
     if len(initial) != 1:
-        print("Initial state cannot be determined with certainty.")
+        warnings.warn("Initial state cannot be determined with certainty.")
         assert O in initial
         excited.update(initial.difference({O}))
         initial = {O}
     if len(final) != 1:
-        print("Final state cannot be determined with certainty.")
+        warnings.warn("Final state cannot be determined with certainty.")
         assert O in final
         excited.update(final.difference({O}))
         final = {O}
@@ -168,6 +172,26 @@ def extract_initial_final_excited_from_sos(term, summation_indices):
     return initial.pop(), final.pop(), excited.pop()
 
 
+def _frequency_slot_map(freqs):
+    """Return, for each frequency of the (op, freq) pairs, a symbol that only occurs in this
+    frequency, together with its coefficient and the remainder of the frequency, such that
+    freq = coeff * symbol + rest; None if the frequencies cannot be written in this form."""
+    slots = []
+    for i, freq in enumerate(freqs):
+        other_symbols = set().union(
+            *[other.free_symbols for j, other in enumerate(freqs) if j != i]
+        )
+        for symbol in sorted(freq.free_symbols - other_symbols, key=str):
+            coeff = freq.diff(symbol)
+            rest = (freq - coeff * symbol).expand()
+            if coeff.is_Number and coeff != 0 and not rest.has(symbol):
+                slots.append((symbol, coeff, rest))
+                break
+        else:
+            return None
+    return slots
+
+
 def _build_sos_via_permutation(term, perm_pairs):
     """Generate a SOS expression via permutation.
 
@@ -190,75 +214,53 @@ def _build_sos_via_permutation(term, perm_pairs):
         and therefore of type <class 'sympy.core.mul.Mul'>.
     """
     if isinstance(term, Add):
-        sos_expr = 0
-        for arg in term.args:
-            sos_expr += _build_sos_via_permutation(arg, perm_pairs)
-        return sos_expr
-    
+        return Add(*[_build_sos_via_permutation(arg, perm_pairs) for arg in term.args])
+
     assert isinstance(term, Mul)
     assert isinstance(perm_pairs, list)
 
     # extract operators from the entered SOS term
-    operators = tuple([op for op in term.args if isinstance(op, OneParticleOperator)])
-    are_operators_shifted = tuple([op.shifted for op in operators])
+    operators = [op for op in term.args if isinstance(op, OneParticleOperator)]
 
-    # generate SOS term where all operators are unshifted
-    unshift_operators = []
-    for op in operators:
-        if op.shifted:
-            op_unshifted = op.copy_with_new_shifted(False)
-            unshift_operators.append((op, op_unshifted))
-    term_unshifted = term.subs(unshift_operators, simultaneous=True)
-    operators_unshifted = tuple([op for op
-                                 in term_unshifted.args
-                                 if isinstance(op, OneParticleOperator)])
-
-    # make sure that the (op, freq) pairs are specified in the correct order
+    # make sure that the (op, freq) pairs are specified in the correct order,
+    # i.e., the i-th pair belongs to the i-th permuted operator (slot) of the term
     ordered_perm_pairs = []
-    for op in operators_unshifted:
+    slot_operators = []
+    for op in operators:
         for pair in perm_pairs:
             assert not pair[0].shifted
-            if pair[0] == op:
+            if pair[0] == op.copy_with_new_shifted(False):
                 ordered_perm_pairs.append(pair)
+                slot_operators.append(op)
     assert len(ordered_perm_pairs) == len(perm_pairs)
-
-    # generate permutations
-    perms = list(permutations(ordered_perm_pairs))
-    # successively build up the SOS expression
-    sos_expr = term
-    for i, p in enumerate(perms):
-        if i > 0:
-            subs_list = []
-            for j, _ in enumerate(p):
-                subs_list.append((perms[0][j][0], p[j][0]))
-                subs_list.append((perms[0][j][1], p[j][1]))
-
-            new_term_unshifted = term_unshifted.subs(subs_list, simultaneous=True)
-            new_operators_unshifted = tuple([op for op
-                                             in new_term_unshifted.args
-                                             if isinstance(op, OneParticleOperator)])
-            shift_operators = []
-            for op, shifted in zip(new_operators_unshifted, are_operators_shifted):
-                if shifted:
-                    op_shifted = op.copy_with_new_shifted(True)
-                    shift_operators.append((op, op_shifted))
-            new_term = new_term_unshifted.subs(shift_operators, simultaneous=True)
-
-            sos_expr += new_term
-            new_operators = tuple([op for op
-                                   in new_term.args
-                                   if isinstance(op, OneParticleOperator)])
-            are_new_operators_shifted = tuple([op.shifted for op in new_operators])
-            assert are_new_operators_shifted == are_operators_shifted
-    return sos_expr
+    freqs = [sympify(pair[1]) for pair in ordered_perm_pairs]
+    freq_slots = _frequency_slot_map(freqs)
+
+    # each permutation of the pairs is a structural replacement of the operators of the slots
+    # (keeping their shifts) and of the symbols that define the frequencies of the slots
+    targets = [
+        {shifted: pair[0].copy_with_new_shifted(shifted) for shifted in (False, True)}
+        for pair in ordered_perm_pairs
+    ]
+    terms = Counter()
+    for perm in permutations(range(len(ordered_perm_pairs))):
+        slot_map = {op: targets[i][op.shifted] for op, i in zip(slot_operators, perm)}
+        if freq_slots is not None:
+            for (symbol, coeff, rest), i in zip(freq_slots, perm):
+                slot_map[symbol] = (freqs[i] - rest) / coeff
+            new_term = term.xreplace(slot_map)
+        else:
+            new_term = term.subs(
+                [(freq, freqs[i]) for freq, i in zip(freqs, perm)], simultaneous=True
+            ).xreplace(slot_map)
+        # permutations that yield the same term are merged
+        terms[new_term] += 1
+    return Add(*[multiplicity * t for t, multiplicity in terms.items()])
 
 
 def _sort_boks_in_expr(term, initial_state, final_state):
     if isinstance(term, Add):
-        sos_expr = 0
-        for arg in term.args:
-            sos_expr += _sort_boks_in_expr(arg, initial_state, final_state)
-        return sos_expr
+        return Add(*[_sort_boks_in_expr(arg, initial_state, final_state) for arg in term.args])
     assert isinstance(term, Mul)
     boks = extract_bra_op_ket(term)
     
@@ -268,7 +270,7 @@ def _sort_boks_in_expr(term, initial_state, final_state):
                 return bok
         return None
 
-    sorted_boks_term = 1
+    sorted_boks = []
     bra_label = final_state
     boks_available = boks.copy()
     for _ in range(len(boks)):
@@ -278,14 +280,17 @@ def _sort_boks_in_expr(term, initial_state, final_state):
                 "Invalid SOS expression. Check that all transition "
                 "moments are defined in the correct direction."
             )
-        sorted_boks_term *= bok[0] * bok[1] * bok[2]
+        sorted_boks.append(bok)
         bra_label = bok[2].label[0]
         boks_available.remove(bok)
     assert bra_label == initial_state
-    subs_list = [(bok[0] * bok[1] * bok[2], 1) for bok in boks]
-    first_subs = subs_list.pop(0)
-    subs_list.append((first_subs[0], sorted_boks_term))
-    sorted_term = term.subs(subs_list, simultaneous=True)
+    if sorted_boks == boks:
+        return term
+    # the commutative factors are kept, the transition moments are put in the sorted order
+    sorted_term = Mul(
+        *[arg for arg in term.args if arg.is_commutative],
+        *[factor for bok in sorted_boks for factor in bok],
+    )
     assert len(sorted_term.args) == len(term.args)
     return sorted_term
 
@@ -334,8 +339,9 @@ class SumOverStates:
             represents the first excited state.
 
         symmetric: bool, optional
-            Resulting tensor is symmetric;
-            by default 'False'.
+            Resulting tensor is symmetric with respect to all permutations of its components;
+            by default 'False', in which case the symmetry of the tensor is determined from the
+            SOS expression (see component_symmetries).
         """
         _validate_expr(expr)
 
@@ -375,7 +381,6 @@ class SumOverStates:
             isinstance(state, Symbol) or isinstance(state, int) for state in self.excluded_states
         )
 
-        # TODO: automatically check for symmetry
         assert isinstance(symmetric, bool)
         self._symmetric = symmetric
 
@@ -395,7 +400,8 @@ class SumOverStates:
         validate_summation_indices(self.expr, self.summation_indices)
 
         self._operators, self._operators_unshifted = extract_operators_from_sos(self.expr)
-        self._components = {op.comp for op in self._operators}
+        # operators of higher dimensionality carry several components, e.g., xi_AB
+        self._components = {c for op in self._operators for c in op.comp}
         self._order = len(self._components)
         if self._components.difference(ABC[: self._order]):
             raise ValueError(
@@ -410,7 +416,7 @@ class SumOverStates:
 
         sorted_expr = _sort_boks_in_expr(self.expr, self.initial_state, self.final_state)
         if sorted_expr != self.expr:
-            print("The transition moments in the SOS expression were sorted.")
+            logger.info("The transition moments in the SOS expression were sorted.")
             self.expr = sorted_expr
         self.expr = self.expr.doit()
         self._is_reversed = False
@@ -531,37 +537,76 @@ class SumOverStates:
         n_imag_ops = [op.is_imag for op in self._operators_unshifted].count(True)
         return 1j**n_imag_ops
 
+    def component_symmetries(self, subs=None):
+        """Determine the permutations of the Cartesian components under which the tensor is
+        invariant: relabelling the components of the operators must yield the same SOS
+        expression once the values in subs (e.g., of the frequencies) have been inserted.
+
+        Parameters
+        ----------
+        subs: dict or list of tuples, optional
+            Values inserted into the SOS expression before relabelling.
+
+        Returns
+        ----------
+        list of tuples
+            Permutations p of range(order) (including the identity) such that the elements
+            c and tuple(c[i] for i in p) of the tensor are equal.
+        """
+        all_permutations = list(permutations(range(self.order)))
+        if self.symmetric:
+            return all_permutations
+        expr = self.expr if subs is None else self.expr.subs(subs)
+        operators = expr.atoms(OneParticleOperator)
+
+        def relabel(perm):
+            labels = {ABC[i]: ABC[j] for i, j in enumerate(perm)}
+            subs_dict = {}
+            for op in operators:
+                comp = "".join(labels[c] for c in op.comp)
+                if get_operator_by_name(op.op_type).symmetric_components:
+                    comp = "".join(sorted(comp))
+                subs_dict[op] = OneParticleOperator(comp, op.op_type, op.shifted)
+            return expr.xreplace(subs_dict)
+
+        reference = relabel(all_permutations[0])
+        return [perm for perm in all_permutations if relabel(perm) == reference]
+
     def check_energy_conservation(self, all_freqs):
         def passed_statement():
-            print("Passed energy conservation check.")
+            logger.info("Passed energy conservation check.")
             if self.correlation_btw_freq:
-                print(f"Found correlation between frequencies: {self.correlation_btw_freq}")
-            print()
+                logger.info("Found correlation between frequencies: %s", self.correlation_btw_freq)
 
-        print("This SOS expression describes a transition "
-              f"from state {self.initial_state} to state {self.final_state}.")
+        logger.info(
+            "This SOS expression describes a transition from state %s to state %s.",
+            self.initial_state, self.final_state,
+        )
         energy_balance = self.energy_balance
-        print(f"The energy balance of the process is {energy_balance}.")
+        logger.info("The energy balance of the process is %s.", energy_balance)
         energy_balance = energy_balance.subs(all_freqs)
         if abs(energy_balance) < 1e-12:
             passed_statement()
             return True
 
         if self.is_hermitian:
-            print("Inserting all frequencies does not give zero.\n"
-                  "However, since all operators are Hermitian, the process can also be considered "
-                  f"in the opposite direction: from state {self.final_state} "
-                  f"to state {self.initial_state}.")
+            logger.info(
+                "Inserting all frequencies does not give zero. However, since all operators are "
+                "Hermitian, the process can also be considered in the opposite direction: "
+                "from state %s to state %s.", self.final_state, self.initial_state,
+            )
             self._is_reversed = True
             energy_balance = self.energy_balance
-            print(f"For this process, the energy balance is {energy_balance}.")
+            logger.info("For this process, the energy balance is %s.", energy_balance)
             energy_balance = energy_balance.subs(all_freqs)
             if abs(energy_balance) < 1e-12:
                 passed_statement()
                 return True
 
-        print("Failed energy conservation check. "
-              "Please note that transition moments from n to m are defined as <m|op|n>.")
+        warnings.warn(
+            "Failed energy conservation check. "
+            "Please note that transition moments from n to m are defined as <m|op|n>."
+        )
         return False
 
     @property
@@ -1,4 +1,6 @@
 """ResponseFun Fun with Response Functions."""
+import logging
+
 from .evaluate_property import (
     evaluate_property_isr,
     evaluate_property_sos,
@@ -9,3 +11,8 @@ __version__ = "0.2.0"
 
 __all__ = ["__version__", "evaluate_property_isr", "evaluate_property_sos",
            "evaluate_property_sos_fast", "TransitionMoment"]
+
+# the progress messages and expressions of responsefun are only shown if logging is configured
+# by the application, e.g., with logging.basicConfig(level=logging.INFO); problems with the input
+# are reported with warnings.warn instead
+logging.getLogger(__name__).addHandler(logging.NullHandler())
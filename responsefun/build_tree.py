@@ -16,13 +16,39 @@
 #  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
 #
 
-from anytree import NodeMixin, RenderTree
-from sympy import Add, Mul, Pow, adjoint
+import logging
+import warnings
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from anytree import NodeMixin, PreOrderIter, RenderTree
+from sympy import Add, Expr, Mul, Pow, Symbol, adjoint
 from sympy.physics.quantum.state import Bra, Ket
 
 from responsefun.AdccProperties import get_operator_by_name
 from responsefun.operators import M, MTM, S2S_MTM, ResponseVector
 from responsefun.symbols_and_labels import gamma
+from responsefun.terms import Term, factors_of
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ResponseEquation:
+    """Response equation (M - w - i*gamma) X = rhs that defines a response vector X.
+
+    The rhs is the vector F of modified transition moments of an operator (mtm_type "MTM"),
+    the matrix B of modified excited-states transition moments of an operator applied to an
+    excited state or to a previously defined response vector (mtm_type "S2S_MTM"), or a
+    previously defined response vector (mtm_type "ResponseVector").
+    """
+
+    mtm_type: str
+    op_type: Optional[str]
+    w: Union[Expr, float]
+    gamma: Union[Expr, float]
+    state: Optional[Symbol] = None
+    no: Optional[int] = None
 
 
 class IsrTreeNode(NodeMixin):
@@ -69,8 +95,9 @@ class ResponseNode(NodeMixin):
         self.expr = expr
         self.tinv = tinv
         self.rhs = rhs  # rhs of response equation
-        self.w = tinv.subs([(M, 0), (gamma, 0)])
-        self.gamma = tinv.subs([(M, 0), (self.w, 0)])
+        shift = tinv - M
+        self.w = shift.xreplace({gamma: 0})
+        self.gamma = shift - self.w
         self.parent = parent
 
 
@@ -97,92 +124,203 @@ def acceptable_two_rhss_lhss(term1, term2):
         return False
 
 
+def invertible_candidates(args, i, tinv, side):
+    """Return the response equations that can be set up by inverting the shifted ADC matrix
+    at position i of the product args from the given side ("rhs" or "lhs")."""
+    if side == "rhs":
+        rhs = args[i + 1]
+        if acceptable_rhs_lhs(rhs):
+            return [ResponseNode(tinv**-1 * rhs, tinv, rhs)]
+        elif i + 2 < len(args) and acceptable_two_rhss_lhss(rhs, args[i + 2]):
+            return [ResponseNode(tinv**-1 * rhs * args[i + 2], tinv, rhs * args[i + 2])]
+    else:
+        lhs = args[i - 1]
+        if acceptable_rhs_lhs(lhs):
+            return [ResponseNode(lhs * tinv**-1, tinv, lhs)]
+        elif i >= 2 and acceptable_two_rhss_lhss(lhs, args[i - 2]):
+            return [ResponseNode(args[i - 2] * lhs * tinv**-1, tinv, args[i - 2] * lhs)]
+    return []
+
+
 def build_branches(node, matrix):
-    """Find response equations to be solved by building up a tree structure."""
+    """Find response equations to be solved by building up a tree structure.
+
+    For each occurrence of the inverse (shifted) ADC matrix, all valid response equations are
+    collected in a slot of the node it belongs to; which of them is actually solved is decided
+    by select_response_nodes. An inverse matrix squared requires a response vector on both sides,
+    i.e., one slot each.
+    """
     if isinstance(node.expr, Add):
         node.children = [IsrTreeNode(term) for term in node.expr.args]
         for child in node.children:
             build_branches(child, matrix)
     elif isinstance(node.expr, Mul):
-        children = []
-        for i, term in enumerate(node.expr.args):
+        slots = []
+        args = node.expr.args
+        for i, term in enumerate(args):
             if isinstance(term, Pow) and (matrix in term.args[0].args or term.args[0] == matrix):
                 tinv = term.args[0]
-                lhs = node.expr.args[i - 1]
-                rhs = node.expr.args[i + 1]
                 if term.args[1] != -1:
-                    if acceptable_rhs_lhs(rhs):
-                        children.append(ResponseNode(tinv**-1 * rhs, tinv, rhs))
-                    elif acceptable_two_rhss_lhss(rhs, node.expr.args[i + 2]):
-                        children.append(
-                            ResponseNode(
-                                tinv**-1 * rhs * node.expr.args[i + 2],
-                                tinv,
-                                rhs * node.expr.args[i + 2],
-                            )
-                        )
-                    else:
-                        print("No invertable term found.")
-                    if acceptable_rhs_lhs(lhs):
-                        children.append(ResponseNode(lhs * tinv**-1, tinv, lhs))
-                    elif acceptable_two_rhss_lhss(lhs, node.expr.args[i - 2]):
-                        children.append(
-                            ResponseNode(
-                                node.expr.args[i - 2] * lhs * tinv**-1,
-                                tinv,
-                                node.expr.args[i - 2] * lhs,
-                            )
-                        )
-                    else:
-                        print("No invertable term found.")
+                    new_slots = [
+                        invertible_candidates(args, i, tinv, "rhs"),
+                        invertible_candidates(args, i, tinv, "lhs"),
+                    ]
                 else:
-                    if acceptable_rhs_lhs(rhs):
-                        children.append(ResponseNode(tinv**-1 * rhs, tinv, rhs))
-                    elif acceptable_rhs_lhs(lhs):
-                        children.append(ResponseNode(lhs * tinv**-1, tinv, lhs))
-                    elif acceptable_two_rhss_lhss(rhs, node.expr.args[i + 2]):
-                        children.append(
-                            ResponseNode(
-                                tinv**-1 * rhs * node.expr.args[i + 2],
-                                tinv,
-                                rhs * node.expr.args[i + 2],
-                            )
-                        )
-                    elif acceptable_two_rhss_lhss(lhs, node.expr.args[i - 2]):
-                        children.append(
-                            ResponseNode(
-                                node.expr.args[i - 2] * lhs * tinv**-1,
-                                tinv,
-                                node.expr.args[i - 2] * lhs,
-                            )
-                        )
+                    # the order of the candidates defines the preference in case of a tie
+                    rhs_cands = invertible_candidates(args, i, tinv, "rhs")
+                    lhs_cands = invertible_candidates(args, i, tinv, "lhs")
+                    single = [c for c in rhs_cands + lhs_cands if acceptable_rhs_lhs(c.rhs)]
+                    new_slots = [single + [c for c in rhs_cands + lhs_cands if c not in single]]
+                for slot in new_slots:
+                    if slot:
+                        slots.append(slot)
                     else:
-                        print("No invertable term found.")
-        node.children = children
+                        # the inverse matrix may still be resolved on a later level
+                        logger.debug("No invertable term found.")
+        node.slots = slots
+        node.children = [candidate for slot in slots for candidate in slot]
     else:
         raise TypeError("ADC/ISR expression must be either of type Mul or Add.")
 
 
-def traverse_branches(node, old_expr, new_expr):
-    """Traverse the branch and replace the leaf expression in each node."""
-    oe = node.expr  # new "old expression"
-    ne = node.expr.subs(old_expr, new_expr)  # new "new expression"
-    node.expr = ne
-    # keep traversing the branch if the root has not yet been reached
-    if not node.is_root:
-        traverse_branches(node.parent, oe, ne)
+def insert_response_vectors(root, replacements):
+    """Replace the leaf expressions of the chosen response nodes by the response vectors in the
+    terms they belong to and rebuild the root expression.
+
+    Parameters
+    ----------
+    root: <class 'responsefun.build_tree.IsrTreeNode'>
+        Root of the tree.
+
+    replacements: dict
+        For each term node, a list of tuples with the leaf expression and the response vector
+        replacing it.
+    """
+    for node, subs_list in replacements.items():
+        term = Term.from_expr(node.expr)
+        for old_expr, new_expr in subs_list:
+            term = term.replace(factors_of(old_expr), factors_of(new_expr))
+        node.expr = term.to_expr()
+    if isinstance(root.expr, Add):
+        root.expr = Add(*[node.expr for node in root.children])
 
 
 def show_tree(root):
+    """Log the tree at the DEBUG level."""
     for pre, _, node in RenderTree(root):
-        treestr = "%s%s" % (pre, node.expr)
-        print(treestr.ljust(8))
+        logger.debug("%s%s", pre, node.expr)
+
+
+def response_key(leaf, equations=None):
+    """Return the response equation solved by the response node, the components of the
+    response vector and whether it enters the expression as adjoint; if a dictionary of
+    equations is passed, equal response equations are represented by the same object."""
+    oper_rhs = leaf.rhs
+    with_dagger = None
+    if isinstance(leaf.rhs, adjoint):
+        oper_rhs = leaf.rhs.args[0]
+
+    if isinstance(oper_rhs, Mul):
+        if isinstance(oper_rhs.args[0], S2S_MTM):
+            with_dagger = False
+            bmatrix, vector = oper_rhs.args
+        elif isinstance(oper_rhs.args[1], S2S_MTM):
+            with_dagger = True
+            vector, bmatrix = oper_rhs.args
+            if isinstance(vector, adjoint):
+                vector = vector.args[0]
+        else:
+            raise ValueError()
+        if isinstance(vector, ResponseVector):
+            key = ResponseEquation(
+                "S2S_MTM", bmatrix.op_type, leaf.w, leaf.gamma, no=vector.no
+            )
+            comp = bmatrix.comp + vector.comp
+        else:
+            key = ResponseEquation(
+                "S2S_MTM", bmatrix.op_type, leaf.w, leaf.gamma, state=vector.label[0]
+            )
+            comp = bmatrix.comp
 
+    elif isinstance(oper_rhs, ResponseVector):
+        key = ResponseEquation("ResponseVector", None, leaf.w, leaf.gamma, no=oper_rhs.no)
+        comp = oper_rhs.comp
 
-def build_tree(isr_expression, matrix=M, rvecs_list=None, no=1):
+    else:
+        key = ResponseEquation(oper_rhs.__class__.__name__, oper_rhs.op_type, leaf.w, leaf.gamma)
+        comp = oper_rhs.comp
+
+    if with_dagger is None:
+        if oper_rhs == leaf.rhs:
+            with_dagger = False
+        else:
+            with_dagger = True
+    if equations is not None:
+        key = equations.setdefault(key, key)
+    return key, comp, with_dagger
+
+
+def select_response_nodes(root, equations=None):
+    """Choose one response equation for each slot of the tree such that the response vectors
+    to be determined have as few components as possible in total.
+
+    Whether the inverse (shifted) ADC matrix is applied to the left or to the right (interchange
+    rule) is decided greedily: response vectors that are needed anyway or that can be reused in
+    many slots are preferred; in case of a tie, the candidate found first is taken.
+    Candidates that have not been chosen are removed from the tree. The dictionary of
+    equations is passed on to response_key.
+
+    Returns
+    ----------
+    list of tuples
+        For each tuple: The first entry is the chosen instance of
+        <class 'responsefun.build_tree.ResponseNode'>, the second one is the output of
+        response_key for it.
+    """
+    slots = [slot for node in PreOrderIter(root) for slot in getattr(node, "slots", [])]
+    keys = {
+        candidate: response_key(candidate, equations) for slot in slots for candidate in slot
+    }
+    n_components = {key: 3 ** len(comp) for key, comp, _ in keys.values()}
+    chosen_keys = set()
+    selection = {}
+    while len(selection) < len(slots):
+        # number of slots that are still open and could be covered by each response vector
+        coverage = {}
+        for s, slot in enumerate(slots):
+            if s in selection:
+                continue
+            for key in dict.fromkeys(keys[candidate][0] for candidate in slot):
+                coverage[key] = coverage.get(key, 0) + 1
+        best_key, best_score = None, -1.0
+        for key, count in coverage.items():
+            score = float("inf") if key in chosen_keys else count / n_components[key]
+            if score > best_score:
+                best_key, best_score = key, score
+        chosen_keys.add(best_key)
+        for s, slot in enumerate(slots):
+            if s in selection:
+                continue
+            for candidate in slot:
+                if keys[candidate][0] == best_key:
+                    selection[s] = candidate
+                    break
+
+    chosen = set(selection.values())
+    for candidate in keys:
+        if candidate not in chosen:
+            candidate.parent = None
+    return [(selection[s], keys[selection[s]]) for s in range(len(slots))]
+
+
+def build_tree(isr_expression, matrix=M, print_tree=False):
     """Build a tree structure to define response vectors for evaluating the ADC/ISR formulation of a
     molecular property.
 
+    The tree is built level by level: the response vectors found on one level are inserted
+    into the expression, which is then used as root expression of the next level, until no
+    inverse matrix is left.
+
     Parameters
     ----------
     isr_expression: <class 'sympy.core.add.Add'> or <class 'sympy.core.mul.Mul'>
@@ -191,120 +329,58 @@ def build_tree(isr_expression, matrix=M, rvecs_list=None, no=1):
     matrix: <class 'sympy.physics.quantum.operator.Operator'>, optional
         The matrix contained in the SymPy expression.
 
-    rvecs_list: list, optional
-        only for recursive function call
-
-    no: int, optional
-        only for recursive function call
+    print_tree: bool, optional
+        Log the tree of each level (at the DEBUG level), by default 'False'.
 
     Returns
     ----------
     list of tuples
         For each tuple: The first entry is the root expression, i.e., a SymPy expression
         that contains instances of <class 'responsefun.operators.ResponseVector'>;
-        the second entry is a dictionary with tuples as keys specifying the response vectors.
+        the second entry is a dictionary with instances of
+        <class 'responsefun.build_tree.ResponseEquation'> as keys specifying the response
+        vectors.
     """
-    if rvecs_list is None:
-        rvecs_list = []
-    root = IsrTreeNode(isr_expression)
-    build_branches(root, matrix)
-    show_tree(root)
-    rvecs = {}
-
-    for leaf in root.leaves:
-        if not isinstance(leaf, ResponseNode):
-            continue
-        # if the leaf node is an instance of the ResponseNode class, a tuple will be defined
-        # that uniquely describes the resulting response vector
-        # TODO: rewrite code, maybe ResponseEquation frozen dataclass instead of tuples?
-        old_expr = leaf.expr
-        oper_rhs = leaf.rhs
-        with_dagger = None
-        if isinstance(leaf.rhs, adjoint):
-            oper_rhs = leaf.rhs.args[0]
-
-        if isinstance(oper_rhs, Mul):
-            if isinstance(oper_rhs.args[0], S2S_MTM):
-                with_dagger = False
-                if isinstance(oper_rhs.args[1], ResponseVector):
-                    key = (
-                        oper_rhs.args[0].__class__.__name__,
-                        oper_rhs.args[0].op_type,
-                        leaf.w,
-                        leaf.gamma,
-                        oper_rhs.args[1].__class__.__name__,
-                        oper_rhs.args[1].no,
-                    )
-                    comp = oper_rhs.args[0].comp + oper_rhs.args[1].comp
-                else:
-                    key = (
-                        oper_rhs.args[0].__class__.__name__,
-                        oper_rhs.args[0].op_type,
-                        leaf.w,
-                        leaf.gamma,
-                        oper_rhs.args[1].label[0],
-                        None,
-                    )
-                    comp = oper_rhs.args[0].comp
-
-            elif isinstance(oper_rhs.args[1], S2S_MTM):
-                with_dagger = True
-                oper_rhs2 = oper_rhs.args[0]
-                if isinstance(oper_rhs2, adjoint):
-                    oper_rhs2 = oper_rhs.args[0].args[0]
-                if isinstance(oper_rhs2, ResponseVector):
-                    key = (
-                        oper_rhs.args[1].__class__.__name__,
-                        oper_rhs.args[1].op_type,
-                        leaf.w,
-                        leaf.gamma,
-                        oper_rhs2.__class__.__name__,
-                        oper_rhs2.no,
-                    )
-                    comp = oper_rhs.args[1].comp + oper_rhs2.comp
-                else:
-                    key = (
-                        oper_rhs.args[1].__class__.__name__,
-                        oper_rhs.args[1].op_type,
-                        leaf.w,
-                        leaf.gamma,
-                        oper_rhs2.label[0],
-                        None,
-                    )
-                    comp = oper_rhs.args[1].comp
-
-            else:
-                raise ValueError()
-
-        elif isinstance(oper_rhs, ResponseVector):
-            key = (oper_rhs.__class__.__name__, None, leaf.w, leaf.gamma, None, oper_rhs.no)
-            comp = oper_rhs.comp
-
-        else:
-            key = (oper_rhs.__class__.__name__, oper_rhs.op_type, leaf.w, leaf.gamma, None, None)
-            comp = oper_rhs.comp
-
-        # if the created tuple is not already among the keys of the rvecs dictionary,
-        # a new entry will be made
-        if key not in rvecs:
-            rvecs[key] = no
-            no += 1
-
-        if with_dagger is None:
-            if oper_rhs == leaf.rhs:
-                with_dagger = False
+    rvecs_list = []
+    no = 1
+    expr = isr_expression
+    # response equations of all levels, which only live as long as the tree is built
+    equations = {}
+    while True:
+        root = IsrTreeNode(expr)
+        build_branches(root, matrix)
+        selected = select_response_nodes(root, equations)
+        if print_tree and logger.isEnabledFor(logging.DEBUG):
+            show_tree(root)
+        rvecs = {}
+        replacements = {}
+
+        for leaf, (key, comp, with_dagger) in selected:
+            old_expr = leaf.expr
+            # if the response equation is not already among the keys of the rvecs dictionary,
+            # a new entry will be made
+            if key not in rvecs:
+                rvecs[key] = no
+                no += 1
+
+            symmetry = get_operator_by_name(key.op_type).symmetry.value
+            if not with_dagger:
+                leaf.expr = ResponseVector(comp, rvecs[key], key.mtm_type, symmetry)
             else:
-                with_dagger = True
-        mtm_type = key[0]
-        op_type = key[1]
-        symmetry = get_operator_by_name(op_type).symmetry.value
-        if not with_dagger:
-            leaf.expr = ResponseVector(comp, rvecs[key], mtm_type, symmetry)
-        else:
-            leaf.expr = adjoint(ResponseVector(comp, rvecs[key], mtm_type, symmetry))
-        traverse_branches(leaf.parent, old_expr, leaf.expr)
-
-    if rvecs:
+                leaf.expr = adjoint(ResponseVector(comp, rvecs[key], key.mtm_type, symmetry))
+            replacements.setdefault(leaf.parent, []).append((old_expr, leaf.expr))
+        insert_response_vectors(root, replacements)
+
+        if not rvecs:
+            unresolved = [
+                term for term in root.expr.atoms(Pow)
+                if term.args[1] < 0 and (matrix in term.args[0].args or term.args[0] == matrix)
+            ]
+            if unresolved:
+                warnings.warn(
+                    "No invertable term found for the following inverse matrices, which remain "
+                    f"in the expression: {unresolved}."
+                )
+            return rvecs_list
         rvecs_list.append((root.expr, rvecs))
-        build_tree(root.expr, matrix, rvecs_list, no)
-    return rvecs_list
+        expr = root.expr
@@ -0,0 +1,184 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+from sympy import Add, Float, Integer, Mul, Pow, Rational, Symbol, pycode, srepr
+
+from responsefun.operators import Moment
+
+# must be increased whenever the generated code changes, so that old kernels are not loaded
+KERNEL_VERSION = 1
+
+
+def cache_dir() -> str:
+    """Return the directory in which the generated kernels are cached, i.e.,
+    $RESPONSEFUN_CACHE_DIR or responsefun/kernels in the user cache directory."""
+    if "RESPONSEFUN_CACHE_DIR" in os.environ:
+        return os.environ["RESPONSEFUN_CACHE_DIR"]
+    user_cache = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(user_cache, "responsefun", "kernels")
+
+
+def expression_hash(*parts) -> str:
+    """Return a hash of SymPy expressions (or lists and tuples of them) that does not depend on
+    the Python process, in contrast to the built-in hash."""
+    sha = hashlib.sha256(f"responsefun kernel {KERNEL_VERSION}".encode())
+    for part in parts:
+        sha.update(b"\0")
+        sha.update(srepr(part).encode())
+    return sha.hexdigest()
+
+
+def _moment_states(moment, summation_indices) -> str:
+    # indices of summation along the leading axes of the array of the moment
+    # (see MomentTable.operand)
+    return "".join(
+        str(s) for s in (moment.from_state, moment.to_state) if s in summation_indices
+    )
+
+
+def generate_sos_kernel(terms, summation_indices, transition_frequencies, key="") -> str:
+    """Generate the source code of a Python module that evaluates an SOS expression via
+    np.einsum, i.e., the code that is otherwise interpreted by evaluate_property_sos_fast.
+
+    The module defines the moments of the expression (MOMENTS), the frequencies on which it
+    depends (FREQUENCIES) and the function evaluate(moments, freqs, denominator, contract),
+    which is called with the operands of the moments, a dictionary of the values of the
+    frequencies and two callbacks: denominator(index, shift) returns the operand
+    1/(w_index + shift) (or 1/shift if index is empty) and contract(einsum_string, operands)
+    the contraction of the operands.
+
+    Parameters
+    ----------
+    terms: list of <class 'sympy.core.mul.Mul'>
+        Terms of the SOS expression, in which the transition moments have been replaced
+        by <class 'responsefun.operators.Moment'> (see replace_bra_op_ket).
+
+    summation_indices: list of <class 'sympy.core.symbol.Symbol'>
+        List of indices of summation.
+
+    transition_frequencies: list of <class 'responsefun.operators.TransitionFrequency'>
+        Transition frequencies of the indices of summation.
+
+    key: str, optional
+        Hash of the expression, which is written to the docstring of the module.
+
+    Returns
+    ----------
+    str
+    """
+    moments = {}
+    frequencies = {}
+
+    def shift_code(shift):
+        shift = shift.xreplace({
+            s: frequencies.setdefault(s, Symbol(f"f{len(frequencies)}"))
+            for s in sorted(shift.free_symbols, key=str)
+        })
+        return pycode(shift)
+
+    lines = []
+    for term in terms:
+        factor = 1.0
+        einsum_list = []
+        operands = []
+        for a in Mul.make_args(term):
+            if isinstance(a, Moment):
+                index = moments.setdefault(a, len(moments))
+                einsum_list.append(_moment_states(a, summation_indices) + a.comp)
+                operands.append(f"moments[{index}]")
+            elif isinstance(a, Pow) and isinstance(a.args[1], Integer) and a.args[1] < 0:
+                index = None
+                shift = []
+                for aa in Add.make_args(a.args[0]):
+                    if aa in transition_frequencies and index is None:
+                        index = aa.state
+                    else:
+                        shift.append(aa)
+                shift = Add(*shift)
+                if shift.free_symbols & set(transition_frequencies):
+                    raise ValueError(f"Unsupported denominator: {a.args[0]}.")
+                label = "" if index is None else str(index)
+                call = f"denominator('{label}', {shift_code(shift)})"
+                einsum_list.extend([label] * -a.args[1])
+                operands.extend([call] * -a.args[1])
+            elif isinstance(a, (Rational, Float)):
+                factor *= float(a)
+            else:
+                raise TypeError(f"The following type was not recognized: {type(a)}.")
+        einsum_right = "".join(sorted(set("".join(einsum_list)) - set(map(str, summation_indices))))
+        einsum_string = ",".join(einsum_list) + " -> " + einsum_right
+        lines.append(
+            f"    ret = ret + {factor!r} * contract(\n"
+            f"        '{einsum_string}',\n"
+            f"        [{', '.join(operands)}],\n"
+            "    )"
+        )
+
+    moments_code = "".join(
+        f"    ({m.op_type!r}, {m.comp!r}, {str(m.from_state)!r}, {str(m.to_state)!r}),\n"
+        for m in moments
+    )
+    frequencies_code = "".join(f"    {str(s)!r},\n" for s in frequencies)
+    freqs_code = "".join(f"    {f} = freqs[{str(s)!r}]\n" for s, f in frequencies.items())
+    return (
+        f'"""SOS kernel generated by responsefun.codegen.\n\nkey: {key}\n"""\n\n'
+        f"SUMMATION_INDICES = {tuple(str(s) for s in summation_indices)!r}\n\n"
+        "# (operator type, components, from_state, to_state)\n"
+        f"MOMENTS = (\n{moments_code})\n\n"
+        f"FREQUENCIES = (\n{frequencies_code})\n\n\n"
+        "def evaluate(moments, freqs, denominator, contract):\n"
+        f"{freqs_code}"
+        "    ret = 0\n"
+        + "\n".join(lines) + "\n"
+        "    return ret\n"
+    )
+
+
+def kernel_path(key: str, directory: str) -> str:
+    return os.path.join(directory, f"sos_{key}.py")
+
+
+def load_kernel(key: str, directory: str):
+    """Import a kernel from the cache directory; returns None if it has not been generated yet."""
+    path = kernel_path(key, directory)
+    if not os.path.isfile(path):
+        return None
+    spec = importlib.util.spec_from_file_location(f"responsefun_kernel_{key}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_kernel(source: str, key: str, directory=None):
+    """Write the source code of a generated kernel to the cache directory and import it;
+    without a directory, a temporary one is used, i.e., the kernel is not cached."""
+    if directory is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            return build_kernel(source, key, tmp_dir)
+    os.makedirs(directory, exist_ok=True)
+    # written to a temporary file first, so that other processes never import a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as tmp:
+        tmp.write(source)
+    os.replace(tmp_path, kernel_path(key, directory))
+    return load_kernel(key, directory)
@@ -16,26 +16,22 @@
 #  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
 #
 
+import logging
 import string
 import warnings
 from collections import namedtuple
-from itertools import combinations_with_replacement, permutations, product
+from dataclasses import replace
+from functools import partial
+from itertools import product
 
 import numpy as np
-from adcc import AmplitudeVector
 from adcc.workflow import construct_adcmatrix
 from respondo.cpp_algebra import ResponseVector as RV
 from respondo.solve_response import solve_response
 from sympy import (
     Add,
-    Float,
-    I,
-    Integer,
     Mul,
     Number,
-    Pow,
-    Symbol,
-    adjoint,
     im,
     sympify,
     zoo,
@@ -45,22 +41,33 @@ from tqdm import tqdm
 
 from responsefun.AdccProperties import (
     Symmetry,
-    build_adcc_properties,
+    build_adcc_properties_dict,
     get_operator_by_name,
 )
 from responsefun.build_tree import build_tree
+from responsefun.codegen import (
+    build_kernel,
+    cache_dir,
+    expression_hash,
+    generate_sos_kernel,
+    load_kernel,
+)
 from responsefun.IsrFormulation import IsrFormulation, compute_extra_terms
-from responsefun.operators import (
-    MTM,
-    S2S_MTM,
-    Moment,
-    OneParticleOperator,
-    ResponseVector,
-    TransitionFrequency,
+from responsefun.MomentTable import MomentTable
+from responsefun.operators import Moment, ResponseVector, TransitionFrequency
+from responsefun.reduced_basis import ReducedBasisSolver
+from responsefun.rvec_algebra import (
+    StateProjector,
+    bmatrix_vector_product,
+    conjugate,
+    scalar_product,
 )
-from responsefun.rvec_algebra import bmatrix_vector_product, scalar_product
+from responsefun.scheduler import DagTask, run_dag
 from responsefun.SumOverStates import SumOverStates
 from responsefun.symbols_and_labels import O, gamma
+from responsefun.terms import FactorKind, Term
+
+logger = logging.getLogger(__name__)
 
 ABC = list(string.ascii_uppercase)
 
@@ -80,21 +87,25 @@ def replace_bra_op_ket(expr):
     """Replace Bra(to_state)*op*Ket(from_state) sequence in a SymPy term by an instance of <class
     'responsefun.operators.Moment'>."""
     assert isinstance(expr, Mul)
-    subs_dict = {}
-    for ia, a in enumerate(expr.args):
-        if isinstance(a, OneParticleOperator):
-            from_state = expr.args[ia + 1]
-            to_state = expr.args[ia - 1]
-            key = to_state * a * from_state
-            subs_dict[key] = Moment(a.comp, from_state.label[0], to_state.label[0], a.op_type)
-    return expr.subs(subs_dict)
+    term = Term.from_expr(expr)
+    factors = term.factors
+    moments = []
+    for ia, a in enumerate(factors):
+        if a.kind == FactorKind.OPERATOR:
+            from_state = factors[ia + 1]
+            to_state = factors[ia - 1]
+            moments.append(
+                Moment(a.obj.comp, from_state.obj.label[0], to_state.obj.label[0], a.obj.op_type)
+            )
+            term = term.replace((to_state, a, from_state), ())
+    return Term(Mul(term.scalar, *moments), term.factors).to_expr()
 
 
 def sign_change(no, rvecs_dict, sign=1):
     # TODO: handle this differently, maybe include this already earlier?
-    rvec_tup = rvecs_dict[no]
-    symmetry = get_operator_by_name(rvec_tup[1]).symmetry
-    assert rvec_tup[0] in ["MTM", "S2S_MTM"]
+    equation = rvecs_dict[no]
+    symmetry = get_operator_by_name(equation.op_type).symmetry
+    assert equation.mtm_type in ["MTM", "S2S_MTM"]
     if symmetry == Symmetry.HERMITIAN:
         pass
     elif symmetry == Symmetry.ANTIHERMITIAN:
@@ -103,12 +114,29 @@ def sign_change(no, rvecs_dict, sign=1):
         raise NotImplementedError(
             "Only Hermitian and anti-Hermitian operators are implemented."
         )
-    if rvec_tup[0] == "S2S_MTM" and rvec_tup[4] == "ResponseVector":
-        return sign_change(rvec_tup[5], rvecs_dict, sign)
+    if equation.mtm_type == "S2S_MTM" and equation.no is not None:
+        return sign_change(equation.no, rvecs_dict, sign)
     assert sign in [1, -1]
     return sign
 
 
+def conjugate_key(key, conjugate_of):
+    """Return the key of the response equation whose solution is the complex conjugate of the
+    solution of the given one, or None if it cannot be determined.
+
+    For a real ADC matrix, (M + w + i*gamma)^-1 * rhs is the complex conjugate of
+    (M + w - i*gamma)^-1 * conj(rhs). The right-hand side is real unless it depends on a complex
+    response vector from a previous iteration, whose conjugate partner is looked up via
+    'conjugate_of'.
+    """
+    if key.no is None:
+        return replace(key, gamma=-key.gamma)
+    conj_no = conjugate_of(key.no)
+    if conj_no is None:
+        return None
+    return replace(key, gamma=-key.gamma, no=conj_no)
+
+
 def _initialize_arguments(
     freqs_in,
     freqs_out,
@@ -150,7 +178,7 @@ def _initialize_arguments(
         assert isinstance(final_state, tuple) and len(final_state) == 2
         excited_state = final_state[1]
     if extra_terms is not True:
-        print("Please note that the extra_terms keyword is only intended for testing.")
+        warnings.warn("Please note that the extra_terms keyword is only intended for testing.")
 
     if freqs_in is None:
         freqs_in = []
@@ -220,10 +248,8 @@ def _initialize_sos(
         symmetric=symmetric,
         correlation_btw_freq=correlation_btw_freq,
     )
-    print(
-        "The following SOS expression was entered/generated. "
-        f"It consists of {sos.number_of_terms} term(s):\n{sos}\n"
-    )
+    logger.info("The SOS expression consists of %d term(s).", sos.number_of_terms)
+    logger.debug("The following SOS expression was entered/generated:\n%s", sos)
     # check whether the definitions match if frequencies are defined twice
     for freq in external_freqs:
         if sos.correlation_btw_freq:
@@ -234,6 +260,18 @@ def _initialize_sos(
             same_freq = [f[1] for f in external_freqs if f[0] == freq[0]]
         assert len(set(same_freq)) == 1
 
+    if excited_state is not None:
+        for ies, exstate in enumerate(sos.excluded_states):
+            if isinstance(exstate, int) and exstate == excited_state:
+                sos.excluded_states[ies] = sos.excited_state
+    else:
+        assert sos.excited_state is None
+
+    input_subs = _input_subs(sos, external_freqs, damping, excited_state, state, omegas is None)
+    return sos, input_subs
+
+
+def _input_subs(sos, external_freqs, damping, excited_state, state, check_energy=True):
     all_freqs = external_freqs.copy()
     if excited_state is not None:
         all_freqs.append(
@@ -242,11 +280,6 @@ def _initialize_sos(
                 state.excitation_energy_uncorrected[excited_state],
             )
         )
-        for ies, exstate in enumerate(sos.excluded_states):
-            if isinstance(exstate, int) and exstate == excited_state:
-                sos.excluded_states[ies] = sos.excited_state
-    else:
-        assert sos.excited_state is None
 
     all_freqs_mod = []
     for freq in all_freqs:
@@ -257,209 +290,474 @@ def _initialize_sos(
 
     all_freqs = all_freqs_mod
 
-    if omegas is None:
+    if check_energy:
         if not sos.check_energy_conservation(all_freqs):
-            raise ValueError("Energy conservation check was not passed. See above.")
+            energy_balance = sos.energy_balance
+            raise ValueError(
+                "Energy conservation check was not passed. The energy balance of the process "
+                f"is {energy_balance}, which gives {energy_balance.subs(all_freqs)} for the "
+                "given frequencies."
+            )
 
-    input_subs = InputSubs(all_freqs, (gamma, damping), (sos.excited_state, excited_state))
-    return sos, input_subs
+    return InputSubs(all_freqs, (gamma, damping), (sos.excited_state, excited_state))
+
+
+def unique_components(sos, input_subs):
+    """Group the components of the tensor into sets of components that are equal due to the
+    symmetry of the tensor (see SumOverStates.component_symmetries).
+
+    Returns
+    ----------
+    dict
+        For each set, the component that is evaluated as key and the list of all components
+        of the set as value.
+    """
+    subs_dict = dict(input_subs.all_freqs)
+    subs_dict[input_subs.damping[0]] = input_subs.damping[1]
+    perms = sos.component_symmetries(subs_dict)
+    components = {}
+    for c in product([0, 1, 2], repeat=sos.order):
+        unique = min(tuple(c[i] for i in perm) for perm in perms)
+        components.setdefault(unique, []).append(c)
+    if len(components) < 3**sos.order:
+        logger.info(
+            "Due to the symmetry of the tensor, only %d of its %d components are evaluated.",
+            len(components), 3**sos.order,
+        )
+    return components
 
 
-def determine_rvecs(rvecs_dict_list, input_subs, adcc_prop,
-                    state, projection=None, **solver_args):
-    matrix = construct_adcmatrix(state.matrix)
+def required_rvec_components(root_expr, components):
+    """Return for each response vector in the root expression the components that are needed
+    to evaluate the given components of the tensor."""
+    required = {}
+    for rvec in root_expr.atoms(ResponseVector):
+        required.setdefault(rvec.no, set()).update(
+            tuple(c[ABC.index(char)] for char in rvec.comp) for c in components
+        )
+    return required
+
+
+def _response_solver(isr_backend=None, response_solver=None):
+    """Return the solver of the response equations: the one passed, else the one of the
+    ISR backend, else respondo's solve_response."""
+    if response_solver is not None:
+        return response_solver
+    if isr_backend is not None:
+        return isr_backend.solve_response
+    return solve_response
+
+
+def determine_rvecs(rvecs_dict_list, input_subs, adcc_prop, state, projection=None,
+                    n_workers=None, response_solver=None, required=None,
+                    isr_backend=None, equation_solver=None, **solver_args):
+    # equation_solver(key, comp) may return a different solver for each component of a
+    # response equation, e.g., to solve them in separate subspaces
+    if isr_backend is not None:
+        matrix = isr_backend.matrix
+    else:
+        matrix = construct_adcmatrix(state.matrix)
+    response_solver = _response_solver(isr_backend, response_solver)
+    if equation_solver is None:
+        def equation_solver(key, comp):
+            return response_solver
+    equations = []
     rvecs_dict_tot = {}
     rvecs_solution = {}
     rvecs_mapping = {}
     number_of_unique_rvecs = 0
-    print("Solving response equations ...")
+    # response vectors with a real solution are their own complex conjugates
+    rvecs_real = set()
+    # pairs of response vectors whose solutions are complex conjugates of each other
+    rvecs_conjugates = {}
+    # response vectors obtained by conjugating an already determined response vector
+    rvecs_conjugated = {}
+    rvecs_keys_tot = {}
+
+    def conjugate_of(no):
+        if no in rvecs_real:
+            return no
+        return rvecs_conjugates.get(no)
+
+    logger.info("Solving response equations ...")
     for tup in rvecs_dict_list:
         rvecs_dict = tup[1]
         # check if response equations become equal
         # after inserting values for external_freqs and gamma
         rvecs_dict_mod = {}
         for key, value in rvecs_dict.items():
-            om = float(key[2].subs(input_subs.all_freqs))
-            gam = float(im(key[3].subs(*input_subs.damping)))
+            om = float(key.w.subs(input_subs.all_freqs))
+            gam = float(im(key.gamma.subs(*input_subs.damping)))
             if gam == 0 and input_subs.damping[1] != 0:
                 raise ValueError(
                     "Although the entered SOS expression is real, a value for gamma was specified."
                 )
-            if key[5] is None:
-                new_key = (*key[:2], om, gam, *key[4:])
+            if key.no is None:
+                new_key = replace(key, w=om, gamma=gam)
             else:
                 # in case response vectors from the previous iteration have become equal
-                new_no = rvecs_mapping[key[5]]
-                new_key = (*key[:2], om, gam, key[4], new_no)
+                new_key = replace(key, w=om, gamma=gam, no=rvecs_mapping[key.no])
             if new_key not in rvecs_dict_mod.keys():
                 rvecs_mapping[value] = value
                 rvecs_dict_mod[new_key] = value
+                conj_key = conjugate_key(new_key, conjugate_of)
+                if conj_key == new_key:
+                    rvecs_real.add(value)
+                elif conj_key in rvecs_keys_tot:
+                    partner = rvecs_keys_tot[conj_key]
+                    rvecs_conjugates[value] = partner
+                    rvecs_conjugates[partner] = value
+                    rvecs_conjugated[value] = partner
+                rvecs_keys_tot[new_key] = value
             else:
                 rvecs_mapping[value] = rvecs_dict_mod[new_key]
         number_of_unique_rvecs += len(rvecs_dict_mod)
-        # solve response equations
-        for key, value in rvecs_dict_mod.items():
-            op_type = key[1]
-            adcop = adcc_prop[op_type]
-            if key[0] == "MTM":
-                rhss_shape = np.shape(adcop.integrals)
-                response = np.empty(rhss_shape, dtype=object)
-                iterables = [list(range(shape)) for shape in rhss_shape]
-                components = list(product(*iterables))
-                rhs = adcop.modified_transition_moments()
-                if key[3] == 0.0:
-                    for c in components:
-                        # list indices must be integers (1-D operators)
-                        c = c[0] if len(c) == 1 else c
-                        response[c] = solve_response(
-                            matrix, rhs[c], -key[2], gamma=0.0, projection=projection, **solver_args
-                        )
-                else:
-                    for c in components:
-                        # list indices must be integers (1-D operators)
-                        c = c[0] if len(c) == 1 else c
-                        response[c] = solve_response(
-                            matrix,
-                            RV(rhs[c]),
-                            -key[2],
-                            gamma=-key[3],
-                            projection=projection,
-                            **solver_args,
-                        )
-                rvecs_solution[value] = response
-            elif key[0] == "S2S_MTM":
-                op_dim = adcop.op_dim
-                if key[4] == "ResponseVector":
-                    no = key[5]
-                    rvecs = rvecs_solution[rvecs_mapping[no]]
-                    rhss_shape = (3,) * op_dim + rvecs.shape
-                    iterables = [list(range(shape)) for shape in rhss_shape]
-                    components = list(product(*iterables))
-                    response = np.empty(rhss_shape, dtype=object)
-                    for c in components:
-                        rvec = rvecs[c[op_dim:]]
-                        if isinstance(rvec, AmplitudeVector):
-                            bmatrix = adcop.isr_matrix(c[:op_dim])
-                            rhs = bmatrix @ rvec
-                            if projection is not None:
-                                rhs -= projection(rhs)
-                            if key[3] == 0.0:
-                                response[c] = solve_response(
-                                    matrix,
-                                    rhs,
-                                    -key[2],
-                                    gamma=0.0,
-                                    projection=projection,
-                                    **solver_args,
-                                )
-                            else:
-                                response[c] = solve_response(
-                                    matrix,
-                                    RV(rhs),
-                                    -key[2],
-                                    gamma=-key[3],
-                                    projection=projection,
-                                    **solver_args,
-                                )
-                        elif isinstance(rvec, RV):
-                            bmatrix = adcop.isr_matrix(c[:op_dim])
-                            rhs = bmatrix_vector_product(bmatrix, rvec)
-                            if projection is not None:
-                                raise NotImplementedError(
-                                    "Projecting out states from a response equation with a complex "
-                                    "right-hand side has not yet been implemented."
-                                )
-                                # rhs.real -= projection(rhs.real)
-                                # rhs.imag -= projection(rhs.imag)
-                            if ("solver", "cpp") in list(solver_args.items()):
-                                raise NotImplementedError(
-                                    "CPP solver only works correctly for purely real rhs."
-                                )
-                            # TODO: temporary hack --> modify solve_response accordingly
-                            rhs = RV(real=rhs.real, imag=-1.0 * rhs.imag)
-                            response[c] = solve_response(
-                                matrix,
-                                rhs,
-                                -key[2],
-                                gamma=-key[3],
-                                projection=projection,
-                                **solver_args,
-                            )
-                        else:
-                            raise ValueError()
-                    rvecs_solution[value] = response
-                elif key[4] == input_subs.excited_state[0]:
-                    rhss_shape = (3,) * op_dim
-                    iterables = [list(range(shape)) for shape in rhss_shape]
-                    components = list(product(*iterables))
-                    response = np.empty(rhss_shape, dtype=object)
-                    if key[3] == 0.0:
-                        for c in components:
-                            bmatrix = adcop.isr_matrix(c)
-                            rhs = bmatrix @ state.excitation_vector[input_subs.excited_state[1]]
-                            if projection is not None:
-                                rhs -= projection(rhs)
-                            response[c] = solve_response(
-                                matrix,
-                                rhs,
-                                -key[2],
-                                gamma=0.0,
-                                projection=projection,
-                                **solver_args,
-                            )
-                    else:
-                        for c in components:
-                            bmatrix = adcop.isr_matrix(c)
-                            rhs = bmatrix @ state.excitation_vector[input_subs.excited_state[1]]
-                            if projection is not None:
-                                rhs -= projection(rhs)
-                            response[c] = solve_response(
-                                matrix,
-                                RV(rhs),
-                                -key[2],
-                                gamma=-key[3],
-                                projection=projection,
-                                **solver_args,
-                            )
-                    rvecs_solution[value] = response
-                else:
-                    raise ValueError("Unkown response equation.")
-            else:
-                raise ValueError("Unkown response equation.")
+        equations.extend(rvecs_dict_mod.items())
         rvecs_dict_tot.update(dict((value, key) for key, value in rvecs_dict.items()))
 
-    print(
-        f"In total, {len(rvecs_dict_tot)} response vectors (with multiple components each) "
-        "were defined:"
+    def solve(rhs, key, c):
+        solver = equation_solver(key, c)
+        if key.gamma == 0.0:
+            return solver(matrix, rhs, -key.w, gamma=0.0, projection=projection, **solver_args)
+        return solver(
+            matrix, RV(rhs), -key.w, gamma=-key.gamma, projection=projection, **solver_args
+        )
+
+    def solve_s2s(adcop, comp, key, c, rvec):
+        bmatrix = adcop.isr_matrix(comp)
+        if not isinstance(rvec, RV):
+            rhs = bmatrix @ rvec
+            if projection is not None:
+                rhs -= projection(rhs)
+            return solve(rhs, key, c)
+        elif isinstance(rvec, RV):
+            rhs = bmatrix_vector_product(bmatrix, rvec)
+            if projection is not None:
+                rhs = RV(
+                    real=rhs.real - projection(rhs.real), imag=rhs.imag - projection(rhs.imag)
+                )
+            if ("solver", "cpp") in list(solver_args.items()):
+                raise NotImplementedError(
+                    "CPP solver only works correctly for purely real rhs."
+                )
+            # TODO: temporary hack --> modify solve_response accordingly
+            rhs = RV(real=rhs.real, imag=-1.0 * rhs.imag)
+            return equation_solver(key, c)(
+                matrix, rhs, -key.w, gamma=-key.gamma, projection=projection, **solver_args
+            )
+        else:
+            raise ValueError()
+
+    # each component of a response vector is a task that can be started as soon as
+    # the response vector on its right-hand side (if any) has been determined
+    tasks = {}
+    shapes = {}
+    is_complex = {}
+    for key, value in equations:
+        if value in rvecs_conjugated:
+            partner = rvecs_conjugated[value]
+            shapes[value] = shapes[partner]
+            is_complex[value] = is_complex[partner]
+            for c in np.ndindex(shapes[value]):
+                tasks[(value, c)] = DagTask(conjugate, [(partner, c)], cost=0)
+            continue
+        adcop = adcc_prop[key.op_type]
+        if key.mtm_type == "MTM":
+            shapes[value] = (3,) * adcop.op_dim
+            is_complex[value] = key.gamma != 0.0
+            rhs = adcop.modified_transition_moments()
+            for c in np.ndindex(shapes[value]):
+                # list indices must be integers (1-D operators)
+                rhs_c = rhs[c[0]] if len(c) == 1 else rhs[c]
+                tasks[(value, c)] = DagTask(
+                    partial(solve, rhs_c, key, c), cost=2.0 if is_complex[value] else 1.0
+                )
+        elif key.mtm_type == "S2S_MTM":
+            op_dim = adcop.op_dim
+            if key.no is not None:
+                dep = rvecs_mapping[key.no]
+                shapes[value] = (3,) * op_dim + shapes[dep]
+                is_complex[value] = key.gamma != 0.0 or is_complex[dep]
+                for c in np.ndindex(shapes[value]):
+                    tasks[(value, c)] = DagTask(
+                        partial(solve_s2s, adcop, c[:op_dim], key, c),
+                        [(dep, c[op_dim:])],
+                        cost=2.0 if is_complex[value] else 1.0,
+                    )
+            elif key.state == input_subs.excited_state[0]:
+                shapes[value] = (3,) * op_dim
+                is_complex[value] = key.gamma != 0.0
+                excitation_vector = state.excitation_vector[input_subs.excited_state[1]]
+                for c in np.ndindex(shapes[value]):
+                    tasks[(value, c)] = DagTask(
+                        partial(solve_s2s, adcop, c, key, c, excitation_vector),
+                        cost=2.0 if is_complex[value] else 1.0,
+                    )
+            else:
+                raise ValueError("Unkown response equation.")
+        else:
+            raise ValueError("Unkown response equation.")
+
+    if required is not None:
+        # only the components that are needed for the contraction and their dependencies
+        needed = set()
+        stack = [(rvecs_mapping[no], c) for no, comps in required.items() for c in comps]
+        while stack:
+            task_key = stack.pop()
+            if task_key not in needed:
+                needed.add(task_key)
+                stack.extend(tasks[task_key].dependencies)
+        tasks = {task_key: task for task_key, task in tasks.items() if task_key in needed}
+
+    if n_workers is not None and n_workers > 1:
+        logger.info("Solving %d response equations with %d workers ...", len(tasks), n_workers)
+    # only threads are used, because forking a process that already runs the threads of the
+    # tensor backend is not safe and the response vectors are not necessarily picklable
+    results = run_dag(tasks, n_workers, "thread")
+    for key, value in equations:
+        response = np.empty(shapes[value], dtype=object)
+        for c in np.ndindex(shapes[value]):
+            response[c] = results.get((value, c))
+        rvecs_solution[value] = response
+
+    logger.info(
+        "In total, %d response vectors (with multiple components each) were defined.",
+        len(rvecs_dict_tot),
     )
-    for key, value in rvecs_dict_tot.items():
-        print(f"X_{{{key}}}: {value}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for key, value in rvecs_dict_tot.items():
+            logger.debug("X_{%s}: %s", key, value)
     if len(rvecs_dict_tot) > number_of_unique_rvecs:
-        print(
-            "However, inserting the specified frequency values caused response"
-            f" vectors to become equal, so that in the end only {number_of_unique_rvecs}"
-            " response vectors had to be determined."
+        logger.info(
+            "However, inserting the specified frequency values caused response vectors to "
+            "become equal, so that in the end only %d response vectors had to be determined.",
+            number_of_unique_rvecs,
         )
-        for lv, rv in rvecs_mapping.items():
-            print(f"X_{{{lv}}} = X_{{{rv}}}") if lv != rv else print(f"X_{{{lv}}}")
+        if logger.isEnabledFor(logging.DEBUG):
+            for lv, rv in rvecs_mapping.items():
+                if lv != rv:
+                    logger.debug("X_{%s} = X_{%s}", lv, rv)
+                else:
+                    logger.debug("X_{%s}", lv)
+    if rvecs_conjugated:
+        logger.info(
+            "Of the response vectors to be determined, %d were obtained as the complex "
+            "conjugate of an already determined response vector.", len(rvecs_conjugated),
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for lv, rv in rvecs_conjugated.items():
+                logger.debug("X_{%s} = X_{%s}^*", lv, rv)
 
     return rvecs_dict_tot, rvecs_solution, rvecs_mapping
 
 
 def process_complex_factor(sos, tensor):
     factor = sos.complex_factor
-    print("\nTaking into account imaginary operators:")
     if factor.imag == 0:
-        print("The real part of the property is returned.")
-        print(f"It was multiplied with a factor of {factor.real}.")
+        logger.info(
+            "Taking into account imaginary operators, the real part of the property is "
+            "returned. It was multiplied with a factor of %s.", factor.real,
+        )
         return factor.real * tensor
     else:
         assert factor.real == 0
-        print("The imaginary part of the property is returned.")
-        print(f"It was multiplied with a factor of {factor.imag}.")
+        logger.info(
+            "Taking into account imaginary operators, the imaginary part of the property is "
+            "returned. It was multiplied with a factor of %s.", factor.imag,
+        )
         return factor.imag * tensor
 
 
+def _isr_projection(sos, input_subs, state):
+    """Prepare the projection of the states excluded from the summation."""
+    to_be_projected_out = []
+    for exstate in sos.excluded_states:
+        if exstate == O:
+            continue  # the ADC quantities do not include the ground state anyway
+        elif isinstance(exstate, int):
+            to_be_projected_out.append(exstate)
+        else:
+            assert input_subs.excited_state[0] is not None
+            assert exstate == input_subs.excited_state[0]
+            to_be_projected_out.append(input_subs.excited_state[1])
+    if to_be_projected_out:
+        logger.info(
+            "The following states are projected out from the ADC matrices: %s",
+            to_be_projected_out,
+        )
+        projection = StateProjector(
+            [state.excitation_vector[exstate] for exstate in to_be_projected_out]
+        )
+    else:
+        projection = None
+
+    return projection
+
+
+def isr_contractions(factors):
+    """Split the noncommutative factors of a term of the root expression into the contractions
+    that are evaluated numerically, i.e., scalar products of two vectors (the modified transition
+    moments F, the response vectors X or excited states) and products of two vectors with the
+    matrix B of modified excited-states transition moments.
+
+    Returns
+    ----------
+    list of tuples of <class 'responsefun.terms.Factor'>
+    """
+    contractions = []
+    for i, a in enumerate(factors):
+        if a.kind != FactorKind.VECTOR:
+            continue
+        if not a.dagger:  # vec * X
+            lhs = factors[i - 1] if i >= 1 else None
+            if lhs is not None and lhs.kind == FactorKind.S2S_MTM and i >= 2:
+                lhs2 = factors[i - 2]
+                # Dagger(X) * B * X or <f| * B * X --> transition polarizability
+                if (lhs2.kind == FactorKind.VECTOR and lhs2.dagger) or \
+                        lhs2.kind == FactorKind.BRA:
+                    contractions.append((lhs2, lhs, a))
+                    continue
+            elif lhs is not None and lhs.kind in (FactorKind.MTM, FactorKind.VECTOR) and \
+                    lhs.dagger:  # Dagger(F) * X or Dagger(X) * X
+                contractions.append((lhs, a))
+                continue
+            raise ValueError("Expression cannot be evaluated.")
+        else:  # Dagger(X) * vec
+            rhs = factors[i + 1] if i + 1 < len(factors) else None
+            if rhs is not None and rhs.kind == FactorKind.S2S_MTM and i + 2 < len(factors):
+                rhs2 = factors[i + 2]
+                if rhs2.kind == FactorKind.VECTOR:  # Dagger(X) * B * X (taken care of above)
+                    continue
+                elif rhs2.kind == FactorKind.KET:  # Dagger(X) * B * |f>
+                    contractions.append((a, rhs, rhs2))
+                    continue
+            elif rhs is not None and rhs.kind == FactorKind.MTM:  # Dagger(X) * F
+                contractions.append((a, rhs))
+                continue
+            elif rhs is not None and rhs.kind == FactorKind.VECTOR:
+                # Dagger(X) * X (taken care of above)
+                continue
+            raise ValueError("Expression cannot be evaluated.")
+    if sum(len(contraction) for contraction in contractions) != len(factors):
+        raise ValueError("Expression cannot be evaluated.")
+    return contractions
+
+
+def _evaluate_isr_expression(
+    root_expr, sos, input_subs, adcc_prop, state, rvecs_dict_tot, rvecs_solution, rvecs_mapping,
+    components
+):
+    """Insert the response vectors into the root expression of the tree and contract them
+    to the unique components of the tensor of the requested property."""
+    dtype = float
+    if input_subs.damping[1] != 0.0:
+        dtype = complex
+    res_tens = np.zeros((3,) * sos.order, dtype=dtype)
+    moment_table = MomentTable(adcc_prop, input_subs.excited_state)
+
+    if isinstance(root_expr, Add):
+        term_list = [arg for arg in root_expr.args]
+    else:
+        term_list = [root_expr]
+
+    subs_dict = dict(input_subs.all_freqs)
+    subs_dict[input_subs.damping[0]] = input_subs.damping[1]
+    terms = [Term.from_expr(term) for term in term_list]
+    # the frequencies do not depend on the components of the tensor
+    scalars = [term.scalar.subs(subs_dict) for term in terms]
+    contractions = [isr_contractions(term.factors) for term in terms]
+    moments = [[a for a in scalar.atoms(Moment)] for scalar in scalars]
+
+    def vector(factor, comp_map):
+        if factor.kind in (FactorKind.BRA, FactorKind.KET):  # <f| or |f>
+            assert factor.obj.label[0] == input_subs.excited_state[0]
+            return state.excitation_vector[input_subs.excited_state[1]]
+        comps = tuple([comp_map[char] for char in list(factor.obj.comp)])
+        if factor.kind == FactorKind.MTM:
+            adcop = adcc_prop[factor.obj.op_type]
+            # list indices must be integers (1-D operators)
+            comps = comps[0] if len(comps) == 1 else comps
+            if factor.dagger:
+                return adcop.modified_transition_moments_reverse(comps)
+            return adcop.modified_transition_moments(comps)
+        vec = rvecs_solution[rvecs_mapping[factor.obj.no]][comps]
+        if factor.dagger:
+            return sign_change(factor.obj.no, rvecs_dict_tot) * vec
+        return vec
+
+    for c in components:
+        comp_map = {ABC[ic]: cc for ic, cc in enumerate(c)}
+
+        for scalar, term_contractions, term_moments in zip(scalars, contractions, moments):
+            value = 1
+            for contraction in term_contractions:
+                left_v = vector(contraction[0], comp_map)
+                right_v = vector(contraction[-1], comp_map)
+                if len(contraction) == 3:  # transition polarizability
+                    bmatrix = contraction[1].obj
+                    adcop = adcc_prop[bmatrix.op_type]
+                    comps_dip = tuple([comp_map[char] for char in list(bmatrix.comp)])
+                    value *= adcop.transition_polarizability(left_v, right_v, comps_dip)
+                else:
+                    value *= scalar_product(left_v, right_v)
+            moment_subs = {}
+            for a in term_moments:
+                operand = moment_table.operand(a, ())
+                moment_subs[a] = operand.array[tuple(c[pos] for pos in operand.positions)]
+            res = scalar.subs(moment_subs) * value
+            if res == zoo:
+                raise ZeroDivisionError()
+            res_tens[c] += res
+
+        for pe in components[c]:
+            res_tens[pe] = res_tens[c]
+    return res_tens
+
+
+IsrPlan = namedtuple("IsrPlan", ["rvecs_dict_list", "root_expr"])
+
+
+def isr_plan(sos, extra_terms=True, symbolic_workers=None, plans=None):
+    """Transform the SOS expression into its ADC/ISR formulation and build the tree of response
+    vectors, i.e., the symbolic processing that does not depend on the values of the frequencies.
+
+    If a dictionary is passed as plans, the plan is looked up there by a hash of the SOS
+    expression (and of everything that enters its processing) and stored after it was built.
+
+    Returns
+    ----------
+    <class 'responsefun.evaluate_property.IsrPlan'>
+    """
+    if plans is not None:
+        key = expression_hash(
+            sos.expr, sos.summation_indices, sos.excluded_states, sos.correlation_btw_freq,
+            extra_terms,
+        )
+        if key in plans:
+            logger.info("The ADC/ISR formulation of the SOS expression was taken from the cache.")
+            return plans[key]
+    isr = IsrFormulation(
+        sos, extra_terms, print_extra_term_dict=True, n_workers=symbolic_workers
+    )
+    logger.debug(
+        "The SOS expression was transformed into the following ADC/ISR formulation:\n%s", isr
+    )
+    logger.info(
+        "%d non-vanishing terms were identified that must be additionally considered due to "
+        "the definition of the ADC matrices.", isr.number_of_extra_terms,
+    )
+    logger.info("Building tree to determine suitable response vectors ...")
+    rvecs_dict_list = build_tree(isr.mod_expr)
+    if rvecs_dict_list:
+        root_expr = rvecs_dict_list[-1][0]
+    else:
+        root_expr = isr.mod_expr
+    plan = IsrPlan(rvecs_dict_list, root_expr)
+    if plans is not None:
+        plans[key] = plan
+    return plan
+
+
 def evaluate_property_isr(
     state,
     sos_expr,
@@ -476,6 +774,10 @@ def evaluate_property_isr(
     omegas=None,
     gamma_val=None,
     final_state=None,
+    n_workers=None,
+    symbolic_workers=None,
+    isr_backend=None,
+    plans=None,
     **solver_args,
 ):
     """Compute a molecular property with the ADC/ISR approach from its SOS expression.
@@ -521,8 +823,8 @@ def evaluate_property_isr(
     excited_state: int, optional
 
     symmetric: bool, optional
-        Resulting tensor is symmetric;
-        by default 'False'.
+        Resulting tensor is symmetric with respect to all permutations of its components;
+        by default 'False', in which case (partial) symmetries are detected automatically.
 
     extra_terms: bool, optional
         Compute the additional terms that arise when converting the SOS expression to its
@@ -540,6 +842,27 @@ def evaluate_property_isr(
     final_state: tuple, optional, deprecated
         (<class 'sympy.core.symbol.Symbol'>, int), e.g., (f, 0).
 
+    n_workers: int, optional
+        Number of threads in which response equations are solved concurrently;
+        by default, they are solved one after another. A response equation is started as soon
+        as the response vector on its right-hand side is available, with the longest chains of
+        dependent equations first.
+
+    symbolic_workers: int, optional
+        Number of processes among which the terms of the SOS expression are distributed
+        for their symbolic processing (see responsefun.IsrFormulation.map_terms); by default,
+        they are processed in the calling process.
+
+    isr_backend: <class 'responsefun.AdccProperties.IsrBackend'>, optional
+        Provider of the ADC matrix, the modified transition moments, the B matrices and the
+        solver of the response equations, which replaces adcc and respondo;
+        a solver passed as response_solver takes precedence over the one of the backend.
+
+    plans: dict, optional
+        Cache of the ADC/ISR formulations and trees of response vectors (see isr_plan),
+        with which repeated evaluations of the same SOS expression, e.g., for other
+        frequencies, skip the symbolic processing.
+
     Returns
     ----------
     <class 'numpy.ndarray'>
@@ -580,183 +903,176 @@ def evaluate_property_isr(
         correlation_btw_freq,
     )
 
-    isr = IsrFormulation(sos, extra_terms, print_extra_term_dict=True)
-    print(
-        f"The SOS expression was transformed into the following ADC/ISR formulation:\n{isr}\nThus, "
-        f"{isr.number_of_extra_terms} non-vanishing terms were identified that must be additionally"
-        " considered due to the definition of the ADC matrices.\n"
-    )
-    print("Building tree to determine suitable response vectors ...")
-    rvecs_dict_list = build_tree(isr.mod_expr)
-
-    # prepare the projection of the states excluded from the summation
-    to_be_projected_out = []
-    for exstate in sos.excluded_states:
-        if exstate == O:
-            continue  # the ADC quantities do not include the ground state anyway
-        elif isinstance(exstate, int):
-            to_be_projected_out.append(exstate)
-        else:
-            assert input_subs.excited_state[0] is not None
-            assert exstate == input_subs.excited_state[0]
-            to_be_projected_out.append(input_subs.excited_state[1])
-    if to_be_projected_out:
-        print(
-            f"The following states are projected out from the ADC matrices: {to_be_projected_out}"
-        )
-        if len(to_be_projected_out) != 1:
-            raise NotImplementedError("It is not yet possible to project out more than one state.")
-        exstate = to_be_projected_out[0]
-        v_f = state.excitation_vector[exstate]
-
-        def projection(X, bl=None):
-            if bl:
-                vb = getattr(v_f, bl)
-                return vb * (vb.dot(X)) / (vb.dot(vb))
-            else:
-                return v_f * (v_f @ X) / (v_f @ v_f)
+    rvecs_dict_list, root_expr = isr_plan(sos, extra_terms, symbolic_workers, plans)
 
-    else:
-        projection = None
+    projection = _isr_projection(sos, input_subs, state)
 
     # store adcc properties for the required operators in a dict
-    adcc_prop = {}
-    for op_type in sos.operator_types:
-        adcc_prop[op_type] = build_adcc_properties(state, op_type)
+    adcc_prop = build_adcc_properties_dict(state, sos.operator_types, isr_backend=isr_backend)
+
+    components = unique_components(sos, input_subs)
 
     rvecs_dict_tot, rvecs_solution, rvecs_mapping = determine_rvecs(
-        rvecs_dict_list, input_subs, adcc_prop, state, projection, **solver_args
+        rvecs_dict_list, input_subs, adcc_prop, state, projection, n_workers,
+        required=required_rvec_components(root_expr, components), isr_backend=isr_backend,
+        **solver_args
     )
-    if rvecs_dict_list:
-        root_expr = rvecs_dict_list[-1][0]
-    else:
-        root_expr = isr.mod_expr
+    res_tens = _evaluate_isr_expression(
+        root_expr, sos, input_subs, adcc_prop, state, rvecs_dict_tot, rvecs_solution,
+        rvecs_mapping, components
+    )
+    res_tens = process_complex_factor(sos, res_tens)
+    logger.info("========== The requested tensor was formed. ==========")
+    return res_tens
 
-    dtype = float
-    if input_subs.damping[1] != 0.0:
-        dtype = complex
-    res_tens = np.zeros((3,) * sos.order, dtype=dtype)
 
-    if isinstance(root_expr, Add):
-        term_list = [arg for arg in root_expr.args]
-    else:
-        term_list = [root_expr]
+def evaluate_property_isr_sweep(
+    state,
+    sos_expr,
+    summation_indices,
+    sweep,
+    *,
+    perm_pairs=None,
+    excluded_states=None,
+    freqs_in=None,
+    freqs_out=None,
+    damping=None,
+    excited_state=None,
+    symmetric=False,
+    extra_terms=True,
+    n_anchors=3,
+    tol=1e-5,
+    symbolic_workers=None,
+    isr_backend=None,
+    plans=None,
+    **solver_args,
+):
+    """Compute a molecular property with the ADC/ISR approach for a grid of values of one
+    frequency, e.g., to obtain a spectrum.
 
-    if sos.symmetric:
-        components = list(
-            combinations_with_replacement([0, 1, 2], sos.order)
-        )  # if tensor is symmetric
-    else:
-        components = list(product([0, 1, 2], repeat=sos.order))
-    for c in components:
-        comp_map = {ABC[ic]: cc for ic, cc in enumerate(c)}
+    The response equations are solved exactly only at a small number of anchor frequencies;
+    for all other grid points, they are solved in the subspace spanned by the solutions
+    determined so far. If the residual of a subspace solution is too large, the response
+    equation is solved exactly and the subspace is extended by the solution.
 
-        for term in term_list:
-            subs_dict = dict(input_subs.all_freqs)
-            subs_dict[input_subs.damping[0]] = input_subs.damping[1]
-            for i, a in enumerate(term.args):
-                oper_a = a
-                if isinstance(a, adjoint):
-                    oper_a = a.args[0]
-                if isinstance(oper_a, ResponseVector) and oper_a == a:  # vec * X
-                    comps_right_v = tuple([comp_map[char] for char in list(oper_a.comp)])
-                    right_v = rvecs_solution[rvecs_mapping[oper_a.no]][comps_right_v]
-
-                    lhs = term.args[i - 1]
-                    if isinstance(lhs, S2S_MTM):  # vec * B * X --> transition polarizability
-                        adcop = adcc_prop[lhs.op_type]
-                        lhs2 = term.args[i - 2]
-                        key = lhs2 * lhs * a
-                        if isinstance(lhs2, adjoint) and \
-                            isinstance(lhs2.args[0], ResponseVector):  # Dagger(X) * B * X
-                            comps_left_v = tuple(
-                                [comp_map[char] for char in list(lhs2.args[0].comp)]
-                            )
-                            sign = sign_change(lhs2.args[0].no, rvecs_dict_tot)
-                            left_v = (
-                                sign * rvecs_solution[rvecs_mapping[lhs2.args[0].no]][comps_left_v]
-                            )
-                        elif isinstance(lhs2, Bra):  # <f| * B * X
-                            assert lhs2.label[0] == input_subs.excited_state[0]
-                            left_v = state.excitation_vector[input_subs.excited_state[1]]
-                        else:
-                            raise ValueError("Expression cannot be evaluated.")
-                        comps_dip = tuple([comp_map[char] for char in list(lhs.comp)])
-                        subs_dict[key] = adcop.transition_polarizability(left_v, right_v, comps_dip)
-                    elif isinstance(lhs, adjoint) and isinstance(lhs.args[0], MTM):  # Dagger(F) * X
-                        adcop = adcc_prop[lhs.args[0].op_type]
-                        comps_left_v = tuple([comp_map[char] for char in list(lhs.args[0].comp)])
-                        # list indices must be integers (1-D operators)
-                        comps_left_v = comps_left_v[0] if len(comps_left_v) == 1 else comps_left_v
-                        left_v = adcop.modified_transition_moments_reverse(comps_left_v)
-                        subs_dict[lhs * a] = scalar_product(left_v, right_v)
-                    elif isinstance(lhs, adjoint) and \
-                        isinstance(lhs.args[0], ResponseVector):  # Dagger(X) * X
-                        comps_left_v = tuple([comp_map[char] for char in list(lhs.args[0].comp)])
-                        sign = sign_change(lhs.args[0].no, rvecs_dict_tot)
-                        left_v = sign * rvecs_solution[rvecs_mapping[lhs.args[0].no]][comps_left_v]
-                        subs_dict[lhs * a] = scalar_product(left_v, right_v)
-                    else:
-                        raise ValueError("Expression cannot be evaluated.")
-                elif isinstance(oper_a, ResponseVector) and oper_a != a:  # Dagger(X) * vec
-                    rhs = term.args[i + 1]
-                    comps_left_v = tuple([comp_map[char] for char in list(oper_a.comp)])
-                    sign = sign_change(oper_a.no, rvecs_dict_tot)
-                    left_v = sign * rvecs_solution[rvecs_mapping[oper_a.no]][comps_left_v]
-
-                    if isinstance(
-                        rhs, S2S_MTM
-                    ):  # Dagger(X) * B * vec --> transition polarizability
-                        adcop = adcc_prop[rhs.op_type]
-                        rhs2 = term.args[i + 2]
-                        key = a * rhs * rhs2
-                        if isinstance(
-                            rhs2, ResponseVector
-                        ):  # Dagger(X) * B * X (taken care of above)
-                            continue
-                        elif isinstance(rhs2, Ket):  # Dagger(X) * B * |f>
-                            assert rhs2.label[0] == input_subs.excited_state[0]
-                            right_v = state.excitation_vector[input_subs.excited_state[1]]
-                        else:
-                            raise ValueError("Expression cannot be evaluated.")
-                        comps_dip = tuple([comp_map[char] for char in list(rhs.comp)])
-                        subs_dict[key] = adcop.transition_polarizability(left_v, right_v, comps_dip)
-                    elif isinstance(rhs, MTM):  # Dagger(X) * F
-                        adcop = adcc_prop[rhs.op_type]
-                        comps_right_v = tuple([comp_map[char] for char in list(rhs.comp)])
-                        # list indices must be integers (1-D operators)
-                        comps_right_v = (
-                            comps_right_v[0] if len(comps_right_v) == 1 else comps_right_v
-                        )
-                        right_v = adcop.modified_transition_moments(comps_right_v)
-                        subs_dict[a * rhs] = scalar_product(left_v, right_v)
-                    elif isinstance(rhs, ResponseVector):  # Dagger(X) * X (taken care of above)
-                        continue
-                    else:
-                        raise ValueError("Expression cannot be evaluated.")
-
-                elif isinstance(a, Moment):
-                    adcop = adcc_prop[a.op_type]
-                    comps_dipmom = tuple([comp_map[char] for char in list(a.comp)])
-                    if a.from_state == O and a.to_state == O:
-                        gs_moment = adcop.gs_moment
-                        subs_dict[a] = gs_moment[comps_dipmom]
-                    elif a.from_state == O and a.to_state == input_subs.excited_state[0]:
-                        tdms = adcop.transition_moment
-                        subs_dict[a] = tdms[input_subs.excited_state[1]][comps_dipmom]
-                    else:
-                        raise ValueError("Unknown transition moment.")
-            res = term.subs(subs_dict)
-            if res == zoo:
-                raise ZeroDivisionError()
-            res_tens[c] += res
+    Parameters
+    ----------
+    state: <class 'adcc.ExcitedStates.ExcitedStates'>
+        ExcitedStates object returned by an ADC calculation.
 
-        if sos.symmetric:
-            perms = list(permutations(c))  # if tensor is symmetric
-            for pe in perms:
-                res_tens[pe] = res_tens[c]
-    res_tens = process_complex_factor(sos, res_tens)
-    print("========== The requested tensor was formed. ==========")
+    sos_expr: <class 'sympy.core.add.Add'> or <class 'sympy.core.mul.Mul'>
+        SymPy expression of the SOS;
+        it can be either the full expression or a single term from which the full expression
+        can be generated via permutation.
+
+    summation_indices: list of <class 'sympy.core.symbol.Symbol'>
+        List of indices of summation.
+
+    sweep: tuple
+        (symbol, values): (<class 'sympy.core.symbol.Symbol'>, iterable of float);
+        the symbol must be one of the frequencies given in freqs_in or freqs_out, whose value
+        given there is replaced by the values of the grid,
+        e.g., (w, np.linspace(0.0, 0.2, 500)) with freqs_in=(w, 0.0), freqs_out=(w, w).
+
+    perm_pairs, excluded_states, freqs_in, freqs_out, damping, excited_state, symmetric,
+    extra_terms, isr_backend, plans:
+        See evaluate_property_isr.
+
+    n_anchors: int, optional
+        Number of evenly spaced grid points at which the response equations are solved exactly;
+        by default 3.
+
+    tol: float, optional
+        Threshold for the residual norm (relative to the norm of the rhs) of a subspace solution
+        above which the response equation is solved exactly; by default 1e-5.
+        The exact solutions are obtained with the solver passed as response_solver, else with
+        the one of the ISR backend, else with respondo's solve_response; each component of a
+        response equation is solved in its own subspace.
+
+    symbolic_workers: int, optional
+        Number of processes among which the terms of the SOS expression are distributed
+        for their symbolic processing (see responsefun.IsrFormulation.map_terms); by default,
+        they are processed in the calling process.
+
+    Returns
+    ----------
+    <class 'numpy.ndarray'>
+        Resulting tensors with components ABC... for each value of the grid, i.e.,
+        the first axis of the array runs over the grid.
+    """
+    (
+        freqs_in,
+        freqs_out,
+        damping,
+        excited_state,
+        extra_terms,
+        external_freqs,
+        correlation_btw_freq,
+    ) = _initialize_arguments(
+        freqs_in, freqs_out, damping, excited_state, extra_terms, None, None, None
+    )
+    sweep_freq, sweep_values = sweep
+    sweep_values = [float(value) for value in sweep_values]
+    assert sweep_values
+    if sweep_freq not in [freq[0] for freq in external_freqs]:
+        raise ValueError(
+            f"The frequency {sweep_freq} must be specified in freqs_in or freqs_out."
+        )
+
+    def freqs_at(value):
+        return [(freq[0], value) if freq[0] == sweep_freq else freq for freq in external_freqs]
+
+    sos, input_subs = _initialize_sos(
+        sos_expr,
+        summation_indices,
+        freqs_in,
+        freqs_out,
+        perm_pairs,
+        excluded_states,
+        symmetric,
+        damping,
+        excited_state,
+        state,
+        None,
+        freqs_at(sweep_values[0]),
+        correlation_btw_freq,
+    )
+
+    rvecs_dict_list, root_expr = isr_plan(sos, extra_terms, symbolic_workers, plans)
+
+    projection = _isr_projection(sos, input_subs, state)
+
+    adcc_prop = build_adcc_properties_dict(state, sos.operator_types, isr_backend=isr_backend)
+
+    n_points = len(sweep_values)
+    anchors = np.linspace(0, n_points - 1, min(n_anchors, n_points)).round().astype(int)
+    anchors = sorted(set(anchors.tolist()))
+    order = anchors + [i for i in range(n_points) if i not in anchors]
+    solver = ReducedBasisSolver(
+        tol, _response_solver(isr_backend, solver_args.pop("response_solver", None))
+    )
+    res_tens = [None] * n_points
+    for i in order:
+        logger.info("========== %s = %s ==========", sweep_freq, sweep_values[i])
+        solver.exact = i in anchors
+        input_subs = _input_subs(sos, freqs_at(sweep_values[i]), damping, excited_state, state)
+        components = unique_components(sos, input_subs)
+        rvecs_dict_tot, rvecs_solution, rvecs_mapping = determine_rvecs(
+            rvecs_dict_list, input_subs, adcc_prop, state, projection,
+            required=required_rvec_components(root_expr, components), isr_backend=isr_backend,
+            equation_solver=solver.for_equation, **solver_args
+        )
+        res_tens[i] = _evaluate_isr_expression(
+            root_expr, sos, input_subs, adcc_prop, state, rvecs_dict_tot, rvecs_solution,
+            rvecs_mapping, components
+        )
+    logger.info(
+        "For %d grid points, %d response equations were solved exactly, "
+        "and %d in %d subspaces of total dimension %d.",
+        n_points, solver.n_exact, solver.n_reduced, len(solver.bases), solver.dimension,
+    )
+    res_tens = process_complex_factor(sos, np.array(res_tens))
+    logger.info("========== The requested tensors were formed. ==========")
     return res_tens
 
 
@@ -776,6 +1092,9 @@ def evaluate_property_sos(
     omegas=None,
     gamma_val=None,
     final_state=None,
+    n_workers=None,
+    memmap_dir=None,
+    symbolic_workers=None,
 ):
     """Compute a molecular property from its SOS expression.
 
@@ -820,8 +1139,8 @@ def evaluate_property_sos(
     excited_state: int, optional
 
     symmetric: bool, optional
-        Resulting tensor is symmetric;
-        by default 'False'.
+        Resulting tensor is symmetric with respect to all permutations of its components;
+        by default 'False', in which case (partial) symmetries are detected automatically.
 
     extra_terms: bool, optional
         Compute the additional terms that arise when converting the SOS expression to its
@@ -839,6 +1158,22 @@ def evaluate_property_sos(
     final_state: tuple, optional, deprecated
         (<class 'sympy.core.symbol.Symbol'>, int), e.g., (f, 0).
 
+    n_workers: int, optional
+        Number of threads used to compute the state-to-state transition moments
+        if they are not available from the state; by default, they are computed
+        in the calling thread.
+
+    memmap_dir: str, optional
+        Directory in which the state-to-state transition moments are stored as memory-mapped
+        files, which are filled blockwise and read without loading the whole table; intended
+        for large numbers of states. The files are written to a new subdirectory, which is
+        removed after the evaluation. By default, the table is kept in memory.
+
+    symbolic_workers: int, optional
+        Number of processes among which the terms of the SOS expression are distributed
+        for their symbolic processing (see responsefun.IsrFormulation.map_terms); by default,
+        they are processed in the calling process.
+
     Returns
     ----------
     <class 'numpy.ndarray'>
@@ -898,13 +1233,14 @@ def evaluate_property_sos(
             }
         ]
     if extra_terms:
-        print("Determining extra terms ...")
+        logger.info("Determining extra terms ...")
         ets = compute_extra_terms(
             sos.expr,
             sos.summation_indices,
             excluded_states=sos.excluded_states,
             correlation_btw_freq=sos.correlation_btw_freq,
             print_extra_term_dict=True,
+            n_workers=symbolic_workers,
         )
         if isinstance(ets, Add):
             et_list = list(ets.args)
@@ -912,9 +1248,9 @@ def evaluate_property_sos(
             et_list = [ets]
         else:
             et_list = []
-        print(
-            f"{len(et_list)} non-vanishing terms were identified that must be additionally "
-            "considered due to the definition of the adcc properties.\n"
+        logger.info(
+            "%d non-vanishing terms were identified that must be additionally considered due "
+            "to the definition of the adcc properties.", len(et_list),
         )
         for et in et_list:
             # the extra terms contain less indices of summation
@@ -934,19 +1270,15 @@ def evaluate_property_sos(
         dtype = complex
     res_tens = np.zeros((3,) * sos.order, dtype=dtype)
 
-    if sos.symmetric:
-        components = list(
-            combinations_with_replacement([0, 1, 2], sos.order)
-        )  # if tensor is symmetric
-    else:
-        components = list(product([0, 1, 2], repeat=sos.order))
+    components = unique_components(sos, input_subs)
 
     # store adcc properties for the required operators in a dict
-    adcc_prop = {}
-    for op_type in sos.operator_types:
-        adcc_prop[op_type] = build_adcc_properties(state, op_type)
+    adcc_prop = build_adcc_properties_dict(
+        state, sos.operator_types, n_workers=n_workers, memmap_dir=memmap_dir
+    )
+    moment_table = MomentTable(adcc_prop, input_subs.excited_state)
 
-    print(f"Summing over {len(state.excitation_energy_uncorrected)} excited states ...")
+    logger.info("Summing over %d excited states ...", len(state.excitation_energy_uncorrected))
     for term_dict in tqdm(term_list):
         mod_expr = replace_bra_op_ket(term_dict["expr"].subs(sos.correlation_btw_freq))
         sum_ind = term_dict["summation_indices"]
@@ -955,7 +1287,9 @@ def evaluate_property_sos(
         indices = list(
             product(range(len(state.excitation_energy_uncorrected)), repeat=len(sum_ind))
         )
-        dip_mom_list = [a for a in mod_expr.args if isinstance(a, Moment)]
+        operands = [
+            (a, moment_table.operand(a, sum_ind)) for a in mod_expr.args if isinstance(a, Moment)
+        ]
         for i in indices:
             state_map = {sum_ind[ii]: ind for ii, ind in enumerate(i)}
 
@@ -967,54 +1301,80 @@ def evaluate_property_sos(
             if input_subs.excited_state[0] is not None:
                 state_map[input_subs.excited_state[0]] = input_subs.excited_state[1]
             for c in components:
-                comp_map = {ABC[ic]: cc for ic, cc in enumerate(c)}
                 subs_dict = dict(input_subs.all_freqs)
                 subs_dict[input_subs.damping[0]] = input_subs.damping[1]
 
                 for si, tf in zip(sum_ind, term_dict["transition_frequencies"]):
                     subs_dict[tf] = state.excitation_energy_uncorrected[state_map[si]]
 
-                for a in dip_mom_list:
-                    adcop = adcc_prop[a.op_type]
-                    comps_dipmom = tuple([comp_map[char] for char in list(a.comp)])
-                    if a.from_state == O and a.to_state == O:
-                        gs_moment = adcop.gs_moment
-                        subs_dict[a] = gs_moment[comps_dipmom]
-                    elif a.from_state == O:
-                        index = state_map[a.to_state]
-                        tdms = adcop.transition_moment
-                        subs_dict[a] = tdms[index][comps_dipmom]
-                    elif a.to_state == O:
-                        index = state_map[a.from_state]
-                        tdms = adcop.transition_moment_reverse
-                        subs_dict[a] = tdms[index][comps_dipmom]
-                    else:
-                        index1 = state_map[a.from_state]
-                        index2 = state_map[a.to_state]
-                        if a.from_state in sum_ind and a.to_state in sum_ind:  # e.g., <n|op|m>
-                            s2s_tdms = adcop.state_to_state_transition_moment
-                            subs_dict[a] = s2s_tdms[index1, index2][comps_dipmom]
-                        elif a.from_state in sum_ind:  # e.g., <f|op|n>
-                            s2s_tdms_f = adcop.s2s_tm_view(final_state=index2)
-                            subs_dict[a] = s2s_tdms_f[index1][comps_dipmom]
-                        elif a.to_state in sum_ind:  # e.g., <n|op|f>
-                            s2s_tdms_f = adcop.s2s_tm_view(initial_state=index1)
-                            subs_dict[a] = s2s_tdms_f[index2][comps_dipmom]
-                        else:
-                            raise ValueError()
+                for a, operand in operands:
+                    index = tuple(state_map[si] for si in operand.states)
+                    index += tuple(c[pos] for pos in operand.positions)
+                    subs_dict[a] = operand.array[index]
                 res = mod_expr.xreplace(subs_dict)
                 if res == zoo:
                     raise ZeroDivisionError()
                 res_tens[c] += res
-                if sos.symmetric:
-                    perms = list(permutations(c))  # if tensor is symmetric
-                    for pe in perms:
-                        res_tens[pe] = res_tens[c]
+    for c, equal_components in components.items():
+        for pe in equal_components:
+            res_tens[pe] = res_tens[c]
     res_tens = process_complex_factor(sos, res_tens)
-    print("========== The requested tensor was formed. ==========")
+    logger.info("========== The requested tensor was formed. ==========")
     return res_tens
 
 
+def _in_memory(array):
+    return not hasattr(array, "shape") or (
+        isinstance(array, np.ndarray) and not isinstance(array, np.memmap)
+    )
+
+
+def _einsum_over_states(einsum_string, operands, keep=None, block_size=128):
+    """Evaluate np.einsum for operands given as (state_str, array) pairs, whose leading axes
+    run over the excited states labelled by state_str; only the states in keep are included.
+    Arrays that are not held in memory (e.g., memory-mapped files) are read in blocks of
+    states along the first state label of such an array, which is contracted blockwise.
+    """
+    out_of_core = [
+        (state_str, array) for state_str, array in operands
+        if state_str and not _in_memory(array)
+    ]
+    if not out_of_core:
+        arrays = []
+        for state_str, array in operands:
+            if keep is not None:
+                for axis in range(len(state_str)):
+                    array = np.take(array, keep, axis=axis)
+            arrays.append(array)
+        return np.einsum(einsum_string, *arrays)
+
+    label = out_of_core[0][0][0]
+    n_states = out_of_core[0][1].shape[0]
+    indices = np.arange(n_states) if keep is None else np.asarray(keep)
+    result = 0
+    for start in range(0, len(indices), block_size):
+        block = indices[start:start + block_size]
+        # contiguous range of states read from the arrays that are not held in memory
+        lower, upper = block[0], block[-1] + 1
+        arrays = []
+        for state_str, array in operands:
+            block_indices = block
+            if state_str and not _in_memory(array):
+                ranges = tuple(
+                    slice(lower, upper) if s == label else slice(None) for s in state_str
+                )
+                array = np.asarray(array[ranges])
+                block_indices = block - lower
+            for axis, s in enumerate(state_str):
+                if s == label:
+                    array = np.take(array, block_indices, axis=axis)
+                elif keep is not None:
+                    array = np.take(array, keep, axis=axis)
+            arrays.append(array)
+        result = result + np.einsum(einsum_string, *arrays)
+    return result
+
+
 def evaluate_property_sos_fast(
     state,
     sos_expr,
@@ -1030,6 +1390,10 @@ def evaluate_property_sos_fast(
     omegas=None,
     gamma_val=None,
     final_state=None,
+    n_workers=None,
+    memmap_dir=None,
+    kernel_cache=None,
+    symbolic_workers=None,
 ):
     """Compute a molecular property from its SOS expression using the Einstein summation convention.
 
@@ -1089,6 +1453,28 @@ def evaluate_property_sos_fast(
     final_state: tuple, optional, deprecated
         (<class 'sympy.core.symbol.Symbol'>, int), e.g., (f, 0).
 
+    n_workers: int, optional
+        Number of threads used to compute the state-to-state transition moments
+        if they are not available from the state; by default, they are computed
+        in the calling thread.
+
+    memmap_dir: str, optional
+        Directory in which the state-to-state transition moments are stored as memory-mapped
+        files, which are filled blockwise and read without loading the whole table; intended
+        for large numbers of states. The files are written to a new subdirectory, which is
+        removed after the evaluation. By default, the table is kept in memory.
+
+    kernel_cache: bool or str, optional
+        Directory in which the code generated for the SOS expression is cached as a Python
+        module, which is imported instead of processing the expression again on later runs;
+        if 'True', the user cache directory is used (see responsefun.codegen.cache_dir).
+        By default, the code is generated in every run and not cached.
+
+    symbolic_workers: int, optional
+        Number of processes among which the terms of the SOS expression are distributed
+        for their symbolic processing (see responsefun.IsrFormulation.map_terms); by default,
+        they are processed in the calling process.
+
     Returns
     ----------
     <class 'numpy.ndarray'>
@@ -1132,188 +1518,121 @@ def evaluate_property_sos_fast(
     subs_dict = dict(input_subs.all_freqs)
     subs_dict[input_subs.damping[0]] = input_subs.damping[1]
 
-    if extra_terms:
-        print("Determining extra terms ...")
-        computed_terms = compute_extra_terms(
-            sos.expr,
-            sos.summation_indices,
-            excluded_states=sos.excluded_states,
-            correlation_btw_freq=sos.correlation_btw_freq,
-            print_extra_term_dict=True,
-        )
-        if computed_terms == 0:
-            number_of_extra_terms = 0
-        elif isinstance(computed_terms, Add):
-            number_of_extra_terms = len(computed_terms.args)
+    # the kernel depends on the permuted SOS expression and on everything that enters its
+    # processing below, but not on the values of the frequencies
+    key = expression_hash(
+        sos.expr, sos.summation_indices, sos.excluded_states, sos.correlation_btw_freq,
+        extra_terms,
+    )
+    kernel_dir = cache_dir() if kernel_cache is True else kernel_cache or None
+    kernel = load_kernel(key, kernel_dir) if kernel_dir else None
+    if kernel is not None:
+        logger.info("The kernel of the SOS expression was loaded from %s.", kernel.__file__)
+    else:
+        if extra_terms:
+            logger.info("Determining extra terms ...")
+            computed_terms = compute_extra_terms(
+                sos.expr,
+                sos.summation_indices,
+                excluded_states=sos.excluded_states,
+                correlation_btw_freq=sos.correlation_btw_freq,
+                print_extra_term_dict=True,
+                n_workers=symbolic_workers,
+            )
+            if computed_terms == 0:
+                number_of_extra_terms = 0
+            elif isinstance(computed_terms, Add):
+                number_of_extra_terms = len(computed_terms.args)
+            else:
+                number_of_extra_terms = 1
+            logger.info(
+                "%d non-vanishing terms were identified that must be additionally considered "
+                "due to the definition of the adcc properties.", number_of_extra_terms,
+            )
+            sos_with_et = sos.expr + computed_terms
+            sos_expr_mod = sos_with_et.subs(sos.correlation_btw_freq)
         else:
-            number_of_extra_terms = 1
-        print(
-            f"{number_of_extra_terms} non-vanishing terms were identified that must be "
-            "additionally considered due to the definition of the adcc properties.\n"
+            sos_expr_mod = sos.expr.subs(sos.correlation_btw_freq)
+
+        term_list = [replace_bra_op_ket(arg) for arg in Add.make_args(sos_expr_mod)]
+        source = generate_sos_kernel(
+            term_list, sos.summation_indices, sos.transition_frequencies, key
         )
-        sos_with_et = sos.expr + computed_terms
-        sos_expr_mod = sos_with_et.subs(sos.correlation_btw_freq)
-    else:
-        sos_expr_mod = sos.expr.subs(sos.correlation_btw_freq)
+        kernel = build_kernel(source, key, kernel_dir)
 
     dtype = float
     if input_subs.damping[1] != 0.0:
         dtype = complex
     res_tens = np.zeros((3,) * sos.order, dtype=dtype)
-
-    if isinstance(sos_expr_mod, Add):
-        term_list = [replace_bra_op_ket(arg) for arg in sos_expr_mod.args]
-    else:
-        term_list = [replace_bra_op_ket(sos_expr_mod)]
-    print(
-        f"Summing over {len(state.excitation_energy_uncorrected)} excited states "
-        "using the Einstein summation convention ..."
+    logger.info(
+        "Summing over %d excited states using the Einstein summation convention ...",
+        len(state.excitation_energy_uncorrected),
     )
 
     # store adcc properties for the required operators in a dict
-    adcc_prop = {}
-    for op_type in sos.operator_types:
-        adcc_prop[op_type] = build_adcc_properties(state, op_type)
-
-    for it, term in enumerate(term_list):
-        einsum_list = []
-        factor = 1
-        divergences = []
-        for a in term.args:
-            if isinstance(a, Moment):
-                adcop = adcc_prop[a.op_type]
-                if a.from_state == O and a.to_state == O:  # <0|op|0>
-                    gs_moment = adcop.gs_moment
-                    einsum_list.append(("", a.comp, gs_moment))
-                elif a.from_state == O:
-                    tdms = adcop.transition_moment  # TODO: correct sign?
-                    if a.to_state in sos.summation_indices:  # e.g., <n|op|0>
-                        einsum_list.append((str(a.to_state), a.comp, tdms))
-                    else:  # e.g., <f|op|0>
-                        einsum_list.append(("", a.comp, tdms[input_subs.excited_state[1]]))
-                elif a.to_state == O:
-                    tdms = adcop.transition_moment_reverse
-                    if a.from_state in sos.summation_indices:  # e.g., <0|op|n>
-                        einsum_list.append((str(a.from_state), a.comp, tdms))
-                    else:  # e.g., <0|op|f>
-                        einsum_list.append(("", a.comp, tdms[input_subs.excited_state[1]]))
-                else:
-                    if (
-                        a.from_state in sos.summation_indices
-                        and a.to_state in sos.summation_indices
-                    ):  # e.g., <n|op|m>
-                        s2s_tdms = adcop.state_to_state_transition_moment
-                        einsum_list.append((str(a.from_state) + str(a.to_state), a.comp, s2s_tdms))
-                    elif (
-                        a.from_state in sos.summation_indices and \
-                            a.to_state == input_subs.excited_state[0]
-                    ):  # e.g., <f|op|n>
-                        s2s_tdms_f = adcop.s2s_tm_view(final_state=input_subs.excited_state[1])
-                        einsum_list.append((str(a.from_state), a.comp, s2s_tdms_f))
-                    elif (
-                        a.to_state in sos.summation_indices and \
-                            a.from_state == input_subs.excited_state[0]
-                    ):  # e.g., <n|op|f>
-                        s2s_tdms_f = adcop.s2s_tm_view(initial_state=input_subs.excited_state[1])
-                        einsum_list.append((str(a.to_state), a.comp, s2s_tdms_f))
-                    else:
-                        raise ValueError()
-
-            elif isinstance(a, Pow):
-                pow_expr = a.args[0].subs(subs_dict)
-                if pow_expr == 0:
-                    raise ZeroDivisionError()
-                index = None
-                shift = 0
-                if isinstance(pow_expr, Add):
-                    pow_expr_list = [arg for arg in pow_expr.args]
-                else:
-                    pow_expr_list = [pow_expr]
-                for aa in pow_expr_list:
-                    if aa in sos.transition_frequencies:
-                        index = aa.state
-                    elif isinstance(aa, Float) or isinstance(aa, Integer):
-                        # convert SymPy object to float
-                        shift += float(aa)
-                    elif isinstance(aa, Mul) and aa.args[1] is I:
-                        shift += 1j * float(aa.args[0])
-                    else:
-                        raise ValueError()
-                if index is None:
-                    if shift:
-                        einsum_list.append(("", "", 1 / (shift)))
-                    else:
-                        raise ZeroDivisionError()
-                else:
-                    array = 1 / (state.excitation_energy_uncorrected + shift)
-                    if np.inf in array:
-                        index_with_inf = np.where(array == np.inf)
-                        assert len(index_with_inf) == 1
-                        assert len(index_with_inf[0]) == 1
-                        divergences.append((index, index_with_inf[0][0]))
-                    einsum_list.append((str(index), "", array))
-
-            elif isinstance(a, Integer) or isinstance(a, Float):
-                factor *= float(a)
+    adcc_prop = build_adcc_properties_dict(
+        state, sos.operator_types, n_workers=n_workers, memmap_dir=memmap_dir
+    )
+    moment_table = MomentTable(adcc_prop, input_subs.excited_state, blockwise=True)
 
-            else:
-                raise TypeError(f"The following type was not recognized: {type(a)}.")
+    # indices of the excited states that are excluded from the summation
+    excluded_indices = set()
+    for exstate in sos.excluded_states:
+        if exstate == O:
+            continue
+        if isinstance(exstate, int):
+            excluded_indices.add(exstate)
+        else:
+            assert input_subs.excited_state[0] is not None
+            assert exstate == input_subs.excited_state[0]
+            excluded_indices.add(input_subs.excited_state[1])
+    keep_indices = None
+    if excluded_indices:
+        keep_indices = np.setdiff1d(
+            np.arange(len(state.excitation_energy_uncorrected)), sorted(excluded_indices)
+        )
 
-        if len(divergences) != 0:
-            print(
-                "The following divergences have been found (explaining the RuntimeWarning): ",
-                divergences,
+    states = {
+        str(s): s for s in [O, *sos.summation_indices, input_subs.excited_state[0]]
+        if s is not None
+    }
+    moments = []
+    for op_type, comp, from_state, to_state in kernel.MOMENTS:
+        moment = Moment(comp, states[from_state], states[to_state], op_type)
+        operand = moment_table.operand(moment, sos.summation_indices)
+        moments.append(("".join(str(si) for si in operand.states), operand.array))
+
+    freqs = {str(freq): value for freq, value in subs_dict.items()}
+    missing = [freq for freq in kernel.FREQUENCIES if freq not in freqs]
+    if missing:
+        raise ValueError(f"The values of the following frequencies are missing: {missing}.")
+    freqs = {freq: float(freqs[freq]) for freq in kernel.FREQUENCIES}
+
+    def denominator(index, shift):
+        if shift.imag == 0:
+            shift = shift.real
+        if not index:
+            if shift == 0:
+                raise ZeroDivisionError()
+            return ("", 1 / shift)
+        array = 1 / (state.excitation_energy_uncorrected + shift)
+        if np.inf in array:
+            divergences = [(index, i) for i in np.where(array == np.inf)[0]]
+            warnings.warn(
+                "The following divergences have been found "
+                f"(explaining the RuntimeWarning): {divergences}."
             )
-        einsum_left = ""
-        einsum_right = ""
-        array_list = []
-        removed_divergences = []
-        # create string of subscript labels and list of np.arrays for np.einsum
-        for tup in einsum_list:
-            state_str, comp_str, array = tup
-            einsum_left += state_str + comp_str + ","
-            einsum_right += comp_str
-            # remove excluded states from corresponding arrays
-            if state_str:
-                for exstate in sos.excluded_states:
-                    if exstate == O:
-                        continue
-                    if isinstance(exstate, int):
-                        index_to_delete = exstate
-                    else:
-                        assert input_subs.excited_state[0] is not None
-                        assert exstate == input_subs.excited_state[0]
-                        index_to_delete = input_subs.excited_state[1]
-                    for axis in range(len(state_str)):
-                        array = np.delete(array, index_to_delete, axis=axis)
-                        removed_divergences.append(
-                            (Symbol(state_str[axis], real=True), index_to_delete)
-                        )
-            array_list.append(array)
-        removed_divergences = list(set(removed_divergences))
-        divergences_copied = divergences.copy()
-        for rd in removed_divergences:
-            if rd in divergences:
-                divergences_copied.remove(rd)
-        if len(divergences) != 0:
-            if len(divergences_copied) != 0:
+            if any(i not in excluded_indices for _, i in divergences):
                 raise ZeroDivisionError(
                     "Not all divergences that occured could be eliminated."
                     f"The following divergences remain: {divergences}."
                 )
-            else:
-                print("However, all of these divergences have been successfully removed.")
-        einsum_left_mod = einsum_left[:-1]
-        einsum_right_list = list(set(einsum_right))
-        einsum_right_list.sort()
-        einsum_right_mod = "".join(einsum_right_list)
-        einsum_string = einsum_left_mod + " -> " + einsum_right_mod
-        print(
-            f"Created string of subscript labels that is used by np.einsum for term {it+1}:\n",
-            einsum_string,
-        )
-        res_tens += factor * np.einsum(einsum_string, *array_list)
+            logger.info("However, all of these divergences have been successfully removed.")
+        return (index, array)
+
+    contract = partial(_einsum_over_states, keep=keep_indices)
+    res_tens += kernel.evaluate(moments, freqs, denominator, contract)
 
     res_tens = process_complex_factor(sos, res_tens)
-    print("========== The requested tensor was formed. ==========")
+    logger.info("========== The requested tensor was formed. ==========")
     return res_tens
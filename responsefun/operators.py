@@ -175,6 +175,10 @@ class Moment(Symbol):
             )
         return obj
 
+    def __getnewargs_ex__(self):
+        # instances are pickled, e.g., for process pools, via the arguments of __new__
+        return (self.comp, self.from_state, self.to_state, self.op_type), {}
+
     @property
     def comp(self):
         return self._comp
@@ -223,6 +227,9 @@ class TransitionFrequency(Symbol):
         obj._state = state
         return obj
 
+    def __getnewargs_ex__(self):
+        return (self.state,), self.assumptions0
+
     @property
     def state(self):
         return self._state
@@ -0,0 +1,288 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+"""Catalogue of standard molecular properties, whose SOS expressions are defined once
+(as in the examples), so that they do not have to be written out by hand.
+
+The ADC/ISR formulation and the tree of response vectors of an entry are derived on its first
+evaluation with the ISR engine and reused afterwards (see isr_plans)."""
+
+from collections import namedtuple
+
+import numpy as np
+
+from responsefun.evaluate_property import (
+    evaluate_property_isr,
+    evaluate_property_sos,
+    evaluate_property_sos_fast,
+)
+from responsefun.misc import epsilon
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    f,
+    gamma,
+    j,
+    k,
+    m,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    op_d,
+    opm_c,
+    p,
+    w,
+    w_1,
+    w_2,
+    w_3,
+    w_f,
+    w_j,
+    w_k,
+    w_m,
+    w_n,
+    w_o,
+    w_p,
+    w_prime,
+)
+
+# symmetric: the tensor is symmetric with respect to the permutation of all its components,
+# which is passed on to the engines that support it (see SumOverStates.component_symmetries)
+CatalogueEntry = namedtuple(
+    "CatalogueEntry",
+    ["sos_expr", "summation_indices", "perm_pairs", "excluded_states", "symmetric"],
+    defaults=[None, None, False],
+)
+
+catalogue = {
+    # Eq. (5.110) in 10.1002/9781118794821
+    "polarizability": CatalogueEntry(
+        TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w - 1j * gamma)
+        + TransitionMoment(O, op_b, n) * TransitionMoment(n, op_a, O) / (w_n + w + 1j * gamma),
+        [n],
+        symmetric=True,
+    ),
+    # Eq. (5.200) in 10.1002/9781118794821
+    "first_hyperpolarizability": CatalogueEntry(
+        TransitionMoment(O, op_a, n)
+        * TransitionMoment(n, op_b, k, shifted=True)
+        * TransitionMoment(k, op_c, O)
+        / ((w_n - w_o - 1j * gamma) * (w_k - w_2 - 1j * gamma)),
+        [n, k],
+        [(op_a, -w_o - 1j * gamma), (op_b, w_1 + 1j * gamma), (op_c, w_2 + 1j * gamma)],
+        O,
+    ),
+    # Eq. (5.201) in 10.1002/9781118794821
+    "second_hyperpolarizability_I": CatalogueEntry(
+        TransitionMoment(O, op_a, n)
+        * TransitionMoment(n, op_b, m, shifted=True)
+        * TransitionMoment(m, op_c, p, shifted=True)
+        * TransitionMoment(p, op_d, O)
+        / ((w_n - w_o) * (w_m - w_2 - w_3) * (w_p - w_3)),
+        [n, m, p],
+        [(op_a, -w_o), (op_b, w_1), (op_c, w_2), (op_d, w_3)],
+        O,
+    ),
+    "second_hyperpolarizability_II": CatalogueEntry(
+        TransitionMoment(O, op_a, n)
+        * TransitionMoment(n, op_b, O)
+        * TransitionMoment(O, op_c, m)
+        * TransitionMoment(m, op_d, O)
+        / ((w_n - w_o) * (w_m - w_3) * (w_m + w_2)),
+        [n, m],
+        [(op_a, -w_o), (op_b, w_1), (op_c, w_2), (op_d, w_3)],
+        O,
+    ),
+    # Eq. (5.250) in 10.1002/9781118794821
+    "two_photon_absorption": CatalogueEntry(
+        TransitionMoment(f, op_b, n) * TransitionMoment(n, op_a, O) / (w_n - w_1),
+        [n],
+        [(op_a, w_1), (op_b, w_2)],
+    ),
+    # Eq. (5.252) in 10.1002/9781118794821
+    "three_photon_absorption": CatalogueEntry(
+        TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, m) * TransitionMoment(m, op_c, f)
+        / ((w_n - w_1) * (w_m - w_1 - w_2)),
+        [n, m],
+        [(op_a, w_1), (op_b, w_2), (op_c, w_3)],
+    ),
+    # Eq. (1) in 10.1021/acs.jctc.7b00636
+    "rixs": CatalogueEntry(
+        TransitionMoment(f, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w - 1j * gamma),
+        [n],
+        [(op_a, w + 1j * gamma), (op_b, -w_prime - 1j * gamma)],
+    ),
+    "rixs_rotating_wave": CatalogueEntry(
+        TransitionMoment(f, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w - 1j * gamma),
+        [n],
+    ),
+    # Eq. (6) in 10.1063/5.0012120
+    "excited_state_polarizability": CatalogueEntry(
+        TransitionMoment(f, op_a, n) * TransitionMoment(n, op_b, f) / (w_n - w_f - w - 1j * gamma)
+        + TransitionMoment(f, op_b, n) * TransitionMoment(n, op_a, f)
+        / (w_n - w_f + w + 1j * gamma),
+        [n],
+        excluded_states=f,
+    ),
+    # Eq. (4) in 10.1063/5.0013398
+    "mcd_bterm_I": CatalogueEntry(
+        TransitionMoment(O, opm_c, k) * TransitionMoment(k, op_b, j, shifted=True)
+        * TransitionMoment(j, op_a, O) / w_k,
+        [k],
+        excluded_states=O,
+    ),
+    "mcd_bterm_II": CatalogueEntry(
+        TransitionMoment(O, op_b, k) * TransitionMoment(k, opm_c, j) * TransitionMoment(j, op_a, O)
+        / (w_k - w_j),
+        [k],
+        excluded_states=[O, j],
+    ),
+}
+
+# cache of the symbolic processing of the entries for evaluate_property_isr
+# (see responsefun.evaluate_property.isr_plan)
+isr_plans = {}
+
+engines = {
+    "isr": evaluate_property_isr,
+    "sos": evaluate_property_sos,
+    "sos_fast": evaluate_property_sos_fast,
+}
+
+
+def evaluate_catalogue_entry(state, name, engine="isr", **kwargs):
+    """Evaluate a property of the catalogue with one of the engines.
+
+    Parameters
+    ----------
+    state: <class 'adcc.ExcitedStates.ExcitedStates'>
+        ExcitedStates object returned by an ADC calculation.
+
+    name: str
+        Key of the property in the catalogue.
+
+    engine: str, optional
+        'isr' (evaluate_property_isr), 'sos' (evaluate_property_sos) or
+        'sos_fast' (evaluate_property_sos_fast); by default 'isr'.
+
+    **kwargs
+        Frequencies, damping, excited state and further keyword arguments of the engine.
+
+    Returns
+    ----------
+    <class 'numpy.ndarray'>
+    """
+    if engine not in engines:
+        raise ValueError(f"Unknown engine '{engine}', choose from {list(engines)}.")
+    entry = catalogue[name]
+    if entry.symmetric and engine != "sos_fast":
+        kwargs.setdefault("symmetric", True)
+    if engine == "isr":
+        kwargs.setdefault("plans", isr_plans)
+    return engines[engine](
+        state,
+        entry.sos_expr,
+        entry.summation_indices,
+        perm_pairs=entry.perm_pairs,
+        excluded_states=entry.excluded_states,
+        **kwargs,
+    )
+
+
+def polarizability(state, omega=0.0, damping=0.0, engine="isr", **kwargs):
+    """Compute the static, dynamic or complex polarizability alpha_AB(-omega; omega)."""
+    return evaluate_catalogue_entry(
+        state, "polarizability", engine, freqs_in=(w, omega), freqs_out=(w, omega),
+        damping=damping, **kwargs
+    )
+
+
+def first_hyperpolarizability(state, omega_1, omega_2, damping=0.0, engine="isr", **kwargs):
+    """Compute the first hyperpolarizability beta_ABC(-omega_1-omega_2; omega_1, omega_2),
+    without the negative charge of the electron in the operators (as in the examples)."""
+    return evaluate_catalogue_entry(
+        state, "first_hyperpolarizability", engine,
+        freqs_in=[(w_1, omega_1), (w_2, omega_2)], freqs_out=(w_o, w_1 + w_2),
+        damping=damping, **kwargs
+    )
+
+
+def second_hyperpolarizability(state, omega_1, omega_2, omega_3, engine="isr", **kwargs):
+    """Compute the second hyperpolarizability
+    gamma_ABCD(-omega_1-omega_2-omega_3; omega_1, omega_2, omega_3)."""
+    freqs = {
+        "freqs_in": [(w_1, omega_1), (w_2, omega_2), (w_3, omega_3)],
+        "freqs_out": (w_o, w_1 + w_2 + w_3),
+    }
+    gamma_tens_I = evaluate_catalogue_entry(
+        state, "second_hyperpolarizability_I", engine, **freqs, **kwargs
+    )
+    gamma_tens_II = evaluate_catalogue_entry(
+        state, "second_hyperpolarizability_II", engine, **freqs, **kwargs
+    )
+    return gamma_tens_I - gamma_tens_II
+
+
+def two_photon_absorption(state, excited_state, engine="isr", **kwargs):
+    """Compute the two-photon absorption matrix elements of an excited state for two photons
+    of the same frequency."""
+    return evaluate_catalogue_entry(
+        state, "two_photon_absorption", engine,
+        freqs_in=[(w_1, w_f / 2), (w_2, w_f / 2)], excited_state=excited_state, **kwargs
+    )
+
+
+def three_photon_absorption(state, excited_state, engine="isr", **kwargs):
+    """Compute the three-photon absorption matrix elements of an excited state for three
+    photons of the same frequency."""
+    return evaluate_catalogue_entry(
+        state, "three_photon_absorption", engine,
+        freqs_in=[(w_1, w_f / 3), (w_2, w_f / 3), (w_3, w_f / 3)],
+        excited_state=excited_state, **kwargs
+    )
+
+
+def rixs(state, excited_state, omega, damping, rotating_wave=False, engine="isr", **kwargs):
+    """Compute the RIXS amplitudes of an excited state for the incident frequency omega,
+    optionally within the rotating-wave approximation."""
+    name = "rixs_rotating_wave" if rotating_wave else "rixs"
+    return evaluate_catalogue_entry(
+        state, name, engine, freqs_in=(w, omega), freqs_out=(w_prime, w - w_f),
+        damping=damping, excited_state=excited_state, **kwargs
+    )
+
+
+def excited_state_polarizability(state, excited_state, omega=0.0, damping=0.0, engine="isr",
+                                 **kwargs):
+    """Compute the (complex) polarizability of an excited state."""
+    return evaluate_catalogue_entry(
+        state, "excited_state_polarizability", engine, freqs_in=(w, omega),
+        freqs_out=(w, omega), damping=damping, excited_state=excited_state, **kwargs
+    )
+
+
+def mcd_bterm(state, excited_state, engine="isr", **kwargs):
+    """Compute the Faraday MCD B term of an excited state (taking into account the
+    different definition of the transition moments in 10.1063/5.0013398)."""
+    mcd_tens_I = evaluate_catalogue_entry(
+        state, "mcd_bterm_I", engine, excited_state=excited_state, **kwargs
+    )
+    mcd_tens_II = evaluate_catalogue_entry(
+        state, "mcd_bterm_II", engine, excited_state=excited_state, **kwargs
+    )
+    return -1.0 * np.einsum("abc,abc->", epsilon, mcd_tens_I + mcd_tens_II)
@@ -0,0 +1,190 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+import threading
+from dataclasses import replace
+from functools import partial
+
+import numpy as np
+from respondo.cpp_algebra import ResponseVector as RV
+from respondo.solve_response import solve_response
+
+from responsefun.rvec_algebra import linear_combination
+
+
+class ReducedBasis:
+    """Orthonormal basis of a subspace of the excitation space together with the products of
+    the ADC matrix with the basis vectors and the ADC matrix projected onto the subspace."""
+
+    def __init__(self):
+        self.basis = []
+        self.matrix_basis = []
+        self.reduced_matrix = np.zeros((0, 0))
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.basis)
+
+    def extend(self, matrix, vector):
+        """Add a vector to the basis after orthonormalizing it against the previous ones."""
+        norm = np.sqrt(vector @ vector)
+        if norm == 0.0:
+            return
+        v = vector * (1.0 / norm)
+        # Gram-Schmidt twice for numerical stability
+        for _ in range(2):
+            for b in self.basis:
+                v = v - (b @ v) * b
+        norm_v = np.sqrt(v @ v)
+        if norm_v < 1e-8:
+            return  # linearly dependent
+        v = v * (1.0 / norm_v)
+        mv = matrix @ v
+        column = np.array([b @ mv for b in self.basis] + [v @ mv])
+        n = len(self.basis)
+        reduced_matrix = np.zeros((n + 1, n + 1))
+        reduced_matrix[:n, :n] = self.reduced_matrix
+        # the ADC matrix is symmetric
+        reduced_matrix[:, n] = column
+        reduced_matrix[n, :] = column
+        self.reduced_matrix = reduced_matrix
+        self.basis.append(v)
+        self.matrix_basis.append(mv)
+
+    def solve(self, rhs_real, rhs_imag, omega, gamma, projection, tol):
+        """Return the real and imaginary part of the solution of the response equation
+        projected onto the subspace, or None if its relative residual norm exceeds tol."""
+        if not self.basis:
+            return None
+        if projection is not None:
+            rhs_real = rhs_real - projection(rhs_real)
+            if rhs_imag is not None:
+                rhs_imag = rhs_imag - projection(rhs_imag)
+        reduced_rhs = np.array([b @ rhs_real for b in self.basis], dtype=complex)
+        norm_rhs = rhs_real @ rhs_real
+        if rhs_imag is not None:
+            reduced_rhs += 1j * np.array([b @ rhs_imag for b in self.basis])
+            norm_rhs += rhs_imag @ rhs_imag
+        if norm_rhs == 0.0:
+            return None
+        shifted = self.reduced_matrix - (omega + 1j * gamma) * np.eye(len(self.basis))
+        try:
+            y = np.linalg.solve(shifted, reduced_rhs)
+        except np.linalg.LinAlgError:
+            return None
+
+        real = linear_combination(y.real, self.basis)
+        imag = linear_combination(y.imag, self.basis)
+        # residual r = rhs - (M - omega - i*gamma) x, with M x from the stored products
+        res_real = rhs_real - linear_combination(y.real, self.matrix_basis)
+        res_real = res_real + omega * real - gamma * imag
+        res_imag = -1.0 * linear_combination(y.imag, self.matrix_basis)
+        res_imag = res_imag + omega * imag + gamma * real
+        if rhs_imag is not None:
+            res_imag = res_imag + rhs_imag
+        if projection is not None:
+            res_real = res_real - projection(res_real)
+            res_imag = res_imag - projection(res_imag)
+        norm_res = res_real @ res_real + res_imag @ res_imag
+        if np.sqrt(norm_res / norm_rhs) > tol:
+            return None
+        return real, imag
+
+
+class ReducedBasisSolver:
+    """Solve response equations in subspaces spanned by previously determined solutions.
+
+    The instance can be used in place of respondo's solve_response, i.e., it is called with
+    (matrix, rhs, omega, gamma, projection, **solver_args) and solves
+    (M - omega - i*gamma) x = rhs, where for a complex rhs the imaginary part enters with a
+    negative sign (as in respondo). The response equation is first projected onto the subspace
+    (Galerkin projection); only if the residual of the resulting solution exceeds the tolerance,
+    the equation is solved exactly and the subspace is extended by the solution.
+
+    Response equations with right-hand sides of different operators (or components) have
+    solutions of different symmetry, so that each of them gets its own subspace, which is
+    selected by the keyword basis_key; for_equation returns the solver for a response equation.
+    """
+
+    def __init__(self, tol=1e-5, solver=solve_response):
+        """
+        Parameters
+        ----------
+        tol: float, optional
+            Threshold for the norm of the residual relative to the norm of the rhs
+            above which the response equation is solved exactly; by default 1e-5.
+
+        solver: callable, optional
+            Function used for the exact solution of the response equations;
+            by default respondo's solve_response.
+        """
+        self.tol = tol
+        self.solver = solver
+        # force exact solutions, e.g., at the anchor frequencies of a frequency sweep
+        self.exact = False
+        self.bases = {}
+        self.n_exact = 0
+        self.n_reduced = 0
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self):
+        """Total dimension of all subspaces."""
+        return sum(len(basis) for basis in self.bases.values())
+
+    def for_equation(self, equation, comp):
+        """Return the solver for a component of a response equation
+        (<class 'responsefun.build_tree.ResponseEquation'>); the frequency and the damping
+        do not affect the choice of the subspace."""
+        return partial(self, basis_key=(replace(equation, w=None, gamma=None), comp))
+
+    def __call__(
+        self, matrix, rhs, omega, gamma=0.0, projection=None, basis_key=None, **solver_args
+    ):
+        with self._lock:
+            basis = self.bases.setdefault(basis_key, ReducedBasis())
+        if isinstance(rhs, RV):
+            # real and imaginary part of b in (M - omega - i*gamma) x = b
+            rhs_real, rhs_imag = rhs.real, -1.0 * rhs.imag
+        else:
+            rhs_real, rhs_imag = rhs, None
+        complex_solution = isinstance(rhs, RV) or gamma != 0.0
+
+        if not self.exact:
+            with basis.lock:
+                solution = basis.solve(rhs_real, rhs_imag, omega, gamma, projection, self.tol)
+            if solution is not None:
+                with self._lock:
+                    self.n_reduced += 1
+                real, imag = solution
+                if complex_solution:
+                    return RV(real, imag)
+                return real
+
+        solution = self.solver(
+            matrix, rhs, omega, gamma=gamma, projection=projection, **solver_args
+        )
+        with self._lock:
+            self.n_exact += 1
+        with basis.lock:
+            if isinstance(solution, RV):
+                basis.extend(matrix, solution.real)
+                basis.extend(matrix, solution.imag)
+            else:
+                basis.extend(matrix, solution)
+        return solution
@@ -1,16 +1,15 @@
-from adcc import AmplitudeVector
-from adcc.IsrMatrix import IsrMatrix
+import numpy as np
 from respondo.cpp_algebra import ResponseVector as RV
 
 
 def scalar_product(left_v, right_v):
     """Evaluate the scalar product between two instances of ResponseVector and/or
-    AmplitudeVector."""
-    if isinstance(left_v, AmplitudeVector):
+    AmplitudeVector (or real vectors of the dense backend)."""
+    if not isinstance(left_v, RV):
         lv = RV(left_v)
     else:
         lv = left_v.copy()
-    if isinstance(right_v, AmplitudeVector):
+    if not isinstance(right_v, RV):
         rv = RV(right_v)
     else:
         rv = right_v.copy()
@@ -23,9 +22,98 @@ def scalar_product(left_v, right_v):
         return real + 1j * imag
 
 
+def conjugate(rvec):
+    """Return the complex conjugate of an instance of ResponseVector; instances of AmplitudeVector
+    are real and returned unchanged."""
+    if not isinstance(rvec, RV):
+        return rvec
+    return RV(real=rvec.real.copy(), imag=-1.0 * rvec.imag)
+
+
+def linear_combination(coefficients, vectors):
+    """Return the linear combination of the vectors (or blocks) with the given real
+    coefficients."""
+    assert len(coefficients) == len(vectors) and len(vectors) > 0
+    ret = float(coefficients[0]) * vectors[0]
+    for c, v in zip(coefficients[1:], vectors[1:]):
+        ret = ret + float(c) * v
+    return ret
+
+
+def _flat_blocks(vector):
+    """Return the blocks of a vector as flat arrays, keyed by the block name (None for a
+    vector that is an array or a single block)."""
+    if isinstance(vector, np.ndarray):
+        return {None: np.asarray(vector).ravel()}
+    if hasattr(vector, "items"):  # adcc.AmplitudeVector
+        return {block: tensor.to_ndarray().ravel() for block, tensor in vector.items()}
+    return {None: vector.to_ndarray().ravel()}
+
+
+def _from_flat_blocks(template, blocks):
+    """Return a vector like template whose blocks are set from flat arrays (see _flat_blocks)."""
+    if isinstance(template, np.ndarray):
+        return blocks[None].reshape(template.shape).view(type(template))
+    ret = template.zeros_like()
+    if hasattr(ret, "items"):
+        for block, tensor in ret.items():
+            tensor.set_from_ndarray(blocks[block].reshape(tensor.shape), 1e-12)
+    else:
+        ret.set_from_ndarray(blocks[None].reshape(ret.shape), 1e-12)
+    return ret
+
+
+class StateProjector:
+    """Projector onto the space spanned by a set of excitation vectors, e.g., of the states
+    excluded from the summation.
+
+    The vectors are orthonormalized once (for the full vector and lazily for each block that is
+    requested) and the orthonormal vectors are stacked as the columns of a matrix B per block,
+    so that applying the projector only requires the two matrix products B (B^T X).
+    """
+
+    def __init__(self, vectors):
+        """
+        Parameters
+        ----------
+        vectors: list of <class 'adcc.AmplitudeVector'>
+            Excitation vectors spanning the space to be projected on.
+        """
+        self.vectors = list(vectors)
+        assert self.vectors
+        self._orthonormal = {}
+
+    def orthonormal_vectors(self, bl=None):
+        """Return an orthonormal basis of the space spanned by the vectors (or by their
+        blocks bl) as a dictionary of matrices, whose columns are the blocks of the basis
+        vectors (see _flat_blocks)."""
+        if bl not in self._orthonormal:
+            if bl:
+                vectors = [_flat_blocks(v[bl]) for v in self.vectors]
+            else:
+                vectors = [_flat_blocks(v) for v in self.vectors]
+            stacked = {
+                block: np.column_stack([v[block] for v in vectors]) for block in vectors[0]
+            }
+            gram = sum(matrix.T @ matrix for matrix in stacked.values())
+            # canonical orthonormalization, linear dependencies are removed
+            eigvals, eigvecs = np.linalg.eigh(gram)
+            keep = eigvals > 1e-12 * eigvals.max()
+            trafo = eigvecs[:, keep] / np.sqrt(eigvals[keep])
+            self._orthonormal[bl] = {block: matrix @ trafo for block, matrix in stacked.items()}
+        return self._orthonormal[bl]
+
+    def __call__(self, X, bl=None):
+        if isinstance(X, RV):
+            return RV(self(X.real, bl), self(X.imag, bl))
+        basis = self.orthonormal_vectors(bl)
+        blocks = _flat_blocks(X)
+        coefficients = sum(basis[block].T @ values for block, values in blocks.items())
+        return _from_flat_blocks(X, {block: basis[block] @ coefficients for block in blocks})
+
+
 # TODO: testing
 def bmatrix_vector_product(bmatrix, rvec):
-    assert isinstance(bmatrix, IsrMatrix)
     assert isinstance(rvec, RV)
     product_real = bmatrix @ rvec.real
     product_imag = bmatrix @ rvec.imag
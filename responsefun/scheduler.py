@@ -0,0 +1,187 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+import heapq
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Union
+
+
+@dataclass
+class DagTask:
+    """Node of a directed acyclic graph of tasks.
+
+    The function is called with the results of the dependencies as positional arguments
+    (in the order in which the dependencies are listed).
+    """
+
+    function: Callable[..., Any]
+    dependencies: list = field(default_factory=list)
+    cost: float = 1.0
+
+
+def topological_order(tasks: dict[Hashable, DagTask]) -> list:
+    """Return the keys of the tasks sorted such that each task comes after its dependencies;
+    among independent tasks, the order of insertion is kept."""
+    n_deps = {key: len(task.dependencies) for key, task in tasks.items()}
+    dependents = {key: [] for key in tasks}
+    for key, task in tasks.items():
+        for dep in task.dependencies:
+            if dep not in tasks:
+                raise KeyError(f"Task {key} depends on the unknown task {dep}.")
+            dependents[dep].append(key)
+    order = [key for key, n in n_deps.items() if n == 0]
+    for key in order:
+        for dependent in dependents[key]:
+            n_deps[dependent] -= 1
+            if n_deps[dependent] == 0:
+                order.append(dependent)
+    if len(order) != len(tasks):
+        raise ValueError("The dependencies of the tasks contain a cycle.")
+    return order
+
+
+def critical_path_priorities(tasks: dict[Hashable, DagTask]) -> dict:
+    """Return for each task the accumulated cost of the most expensive path from the task
+    to the end of the graph; tasks on the critical path are started first."""
+    dependents = {key: [] for key in tasks}
+    for key, task in tasks.items():
+        for dep in task.dependencies:
+            dependents[dep].append(key)
+    priorities = {}
+    for key in reversed(topological_order(tasks)):
+        priorities[key] = tasks[key].cost + max(
+            (priorities[dependent] for dependent in dependents[key]), default=0.0
+        )
+    return priorities
+
+
+# tasks inherited by forked worker processes, see _run_forked_task
+_forked_tasks = {}
+
+
+def _run_forked_task(key, *args):
+    return _forked_tasks[key].function(*args)
+
+
+def run_dag(
+    tasks: dict[Hashable, DagTask],
+    n_workers: Union[int, None] = None,
+    executor: Union[str, Executor] = "thread",
+) -> dict:
+    """Run a directed acyclic graph of tasks.
+
+    Each task is started as soon as all of its dependencies are finished; among the tasks that
+    are ready, those with the most expensive remaining path are started first, so that the total
+    run time approaches the cost of the critical path.
+
+    Parameters
+    ----------
+    tasks: dict
+        Dictionary of <class 'responsefun.scheduler.DagTask'> with hashable keys;
+        the dependencies of a task are given as keys of this dictionary.
+
+    n_workers: int, optional
+        Number of tasks that are run concurrently; by default, all tasks are run one after another
+        in the calling thread.
+
+    executor: str or <class 'concurrent.futures.Executor'>, optional
+        "thread" or "process" to create a pool with n_workers workers, or an existing executor;
+        by default "thread". With "process", the workers are forked so that the task functions
+        need not be picklable; however, the results and the results passed on to dependent tasks
+        must be.
+
+    Returns
+    ----------
+    dict
+        Results of the tasks with the same keys as the tasks dictionary.
+    """
+    global _forked_tasks
+    priorities = critical_path_priorities(tasks)
+    index = {key: i for i, key in enumerate(tasks)}
+    n_deps = {key: len(task.dependencies) for key, task in tasks.items()}
+    dependents = {key: [] for key in tasks}
+    for key, task in tasks.items():
+        for dep in task.dependencies:
+            dependents[dep].append(key)
+    ready = [(-priorities[key], index[key], key) for key, n in n_deps.items() if n == 0]
+    heapq.heapify(ready)
+    results = {}
+
+    def finish(key, result):
+        results[key] = result
+        for dependent in dependents[key]:
+            n_deps[dependent] -= 1
+            if n_deps[dependent] == 0:
+                heapq.heappush(ready, (-priorities[dependent], index[dependent], dependent))
+
+    def arguments(key):
+        return [results[dep] for dep in tasks[key].dependencies]
+
+    if isinstance(executor, Executor):
+        pool = executor
+        n_workers = n_workers or getattr(executor, "_max_workers", 1)
+    elif n_workers is None or n_workers <= 1:
+        while ready:
+            _, _, key = heapq.heappop(ready)
+            finish(key, tasks[key].function(*arguments(key)))
+        return results
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=n_workers)
+    elif executor == "process":
+        _forked_tasks = tasks
+        pool = ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context("fork")
+        )
+    else:
+        raise ValueError(f"Unknown executor: {executor}.")
+
+    running = {}
+    try:
+        while ready or running:
+            while ready and len(running) < n_workers:
+                _, _, key = heapq.heappop(ready)
+                if tasks[key].cost == 0:
+                    # cheap tasks are not worth the overhead of the pool
+                    finish(key, tasks[key].function(*arguments(key)))
+                    continue
+                if executor == "process":
+                    future = pool.submit(_run_forked_task, key, *arguments(key))
+                else:
+                    future = pool.submit(tasks[key].function, *arguments(key))
+                running[future] = key
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result())
+    finally:
+        for future in running:
+            future.cancel()
+        if pool is not executor:
+            pool.shutdown(wait=True)
+        if executor == "process":
+            _forked_tasks = {}
+    return results
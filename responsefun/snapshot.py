@@ -0,0 +1,144 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+from types import SimpleNamespace
+
+import adcc
+import numpy as np
+from adcc.workflow import construct_adcmatrix
+
+from responsefun.AdccProperties import build_adcc_properties_dict
+from responsefun.zarr_states import ZarrExcitedStates
+
+# names under which the moments of an operator are stored, as read by the adcc properties
+# for ZarrExcitedStates: (transition moments, state-to-state transition moments,
+# ground-state moments)
+snapshot_keys = {
+    "electric_dipole": (
+        "transition_dipole_moment", "transition_dipole_moment_s2s", "dipole_moment"
+    ),
+    "magnetic_dipole": (
+        "transition_magnetic_dipole_moment", "transition_magnetic_moment_s2s",
+        "magnetic_dipole_moment"
+    ),
+}
+
+
+def write_snapshot(state, path, op_types=None, n_workers=None, chunk_size=64):
+    """Write the data of an ADC calculation that is used by responsefun to a zarr store.
+
+    The snapshot contains the excitation energies and vectors, the ground-state, transition and
+    state-to-state transition moments of the requested operators, and the ADC method;
+    it uses the same layout as the reference data of the tests.
+
+    Parameters
+    ----------
+    state: <class 'adcc.ExcitedStates.ExcitedStates'>
+        ExcitedStates object returned by an ADC calculation.
+
+    path: str
+        Path of the zarr store, which is overwritten if it exists.
+
+    op_types: list of str, optional
+        Operators whose moments are stored; by default, electric and magnetic dipole operators.
+
+    n_workers: int, optional
+        Number of threads used to compute the state-to-state transition moments.
+
+    chunk_size: int, optional
+        Number of states per chunk of the stored arrays; by default 64.
+    """
+    import zarr
+
+    if op_types is None:
+        op_types = list(snapshot_keys)
+    for op_type in op_types:
+        if op_type not in snapshot_keys:
+            raise NotImplementedError(f"Snapshots of {op_type} moments are not implemented.")
+
+    z = zarr.open(path, mode="w")
+    exci = z.create_group("excitation")
+    exci.attrs["kind"] = state.kind
+    exci.attrs["spin_change"] = getattr(state, "spin_change", None)
+    exci.attrs["method"] = state.method.name
+    exci.attrs["property_method"] = state.property_method.name
+    exci["excitation_energy"] = state.excitation_energy
+    exci["excitation_energy_uncorrected"] = state.excitation_energy_uncorrected
+
+    n_states = len(state.excitation_energy_uncorrected)
+    vectors = z.create_group("excitation_vector")
+    for block, tensor in state.excitation_vector[0].items():
+        shape = tensor.to_ndarray().shape
+        array = vectors.zeros(block, shape=(n_states, *shape), chunks=(1, *shape))
+        for i, vector in enumerate(state.excitation_vector):
+            array[i] = vector[block].to_ndarray()
+
+    adcc_prop = build_adcc_properties_dict(state, op_types, n_workers=n_workers)
+    level = state.property_method.level
+    for op_type, adcop in adcc_prop.items():
+        tm_key, s2s_key, gs_key = snapshot_keys[op_type]
+        z[f"ground_state/{gs_key}/{level}"] = adcop.gs_moment
+        exci[tm_key] = adcop.transition_moment
+        s2s_tm = adcop.state_to_state_transition_moment
+        exci.array(s2s_key, s2s_tm, chunks=(min(n_states, chunk_size), *s2s_tm.shape[1:]))
+    return z
+
+
+def load_snapshot(path, refstate=None):
+    """Load a snapshot written by write_snapshot.
+
+    Parameters
+    ----------
+    path: str
+        Path of the zarr store.
+
+    refstate: <class 'adcc.ReferenceState'> or SCF result, optional
+        Reference state of the calculation; the ADC matrix is then rebuilt (without solving
+        the eigenvalue problem again), as needed for the ADC/ISR formulation.
+
+    Returns
+    ----------
+    <class 'responsefun.zarr_states.ZarrExcitedStates'> or <class 'adcc.ExcitedStates'>
+        Without reference state, the stored moments are read lazily from the store,
+        which suffices for evaluate_property_sos and evaluate_property_sos_fast;
+        otherwise, excited states with the stored excitation vectors that can also be passed to
+        evaluate_property_isr.
+    """
+    import zarr
+
+    z = zarr.open(path, mode="r")
+    if refstate is None:
+        return ZarrExcitedStates(z)
+
+    exci = z["excitation"]
+    matrix = construct_adcmatrix(refstate, method=exci.attrs["method"])
+    vectors = []
+    for i in range(len(exci["excitation_energy_uncorrected"])):
+        vector = adcc.guess_zero(matrix)
+        for block, array in z["excitation_vector"].arrays():
+            vector[block].set_from_ndarray(array[i], 1e-12)
+        vectors.append(vector)
+    data = SimpleNamespace(
+        matrix=matrix,
+        kind=exci.attrs["kind"],
+        spin_change=exci.attrs["spin_change"],
+        eigenvalues=np.asarray(exci["excitation_energy_uncorrected"]),
+        eigenvectors=vectors,
+        converged=True,
+    )
+    return adcc.ExcitedStates(data, property_method=exci.attrs["property_method"])
@@ -35,4 +35,8 @@ opm_a = OneParticleOperator("A", "magnetic_dipole", False)
 opm_b = OneParticleOperator("B", "magnetic_dipole", False)
 opm_c = OneParticleOperator("C", "magnetic_dipole", False)
 opm_d = OneParticleOperator("D", "magnetic_dipole", False)
-opm_e = OneParticleOperator("E", "magnetic_dipole", False)
\ No newline at end of file
+opm_e = OneParticleOperator("E", "magnetic_dipole", False)
+
+# diamagnetic magnetizability operators
+xi_ab = OneParticleOperator("AB", "diamagnetic_magnetizability", False)
+xi_cd = OneParticleOperator("CD", "diamagnetic_magnetizability", False)
@@ -0,0 +1,213 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+from enum import IntEnum
+
+from sympy import Mul, Pow, adjoint
+from sympy.physics.quantum.operator import Operator
+from sympy.physics.quantum.state import Bra, Ket
+
+from responsefun.operators import MTM, S2S_MTM, OneParticleOperator, ResponseVector
+
+
+class FactorKind(IntEnum):
+    BRA = 0
+    KET = 1
+    OPERATOR = 2
+    MTM = 3
+    S2S_MTM = 4
+    VECTOR = 5
+    MATRIX = 6
+    OTHER = 7
+
+
+def factor_kind(obj) -> FactorKind:
+    if isinstance(obj, Bra):
+        return FactorKind.BRA
+    elif isinstance(obj, Ket):
+        return FactorKind.KET
+    elif isinstance(obj, OneParticleOperator):
+        return FactorKind.OPERATOR
+    elif isinstance(obj, MTM):
+        return FactorKind.MTM
+    elif isinstance(obj, S2S_MTM):
+        return FactorKind.S2S_MTM
+    elif isinstance(obj, ResponseVector):
+        return FactorKind.VECTOR
+    elif isinstance(obj, Operator) or not obj.is_commutative:
+        # (shifted) ADC matrix
+        return FactorKind.MATRIX
+    return FactorKind.OTHER
+
+
+class Factor:
+    """Noncommutative factor of a term, e.g., a bra, an operator or the inverse shifted ADC
+    matrix, which is compared via the underlying SymPy object, its exponent and whether it is
+    adjoint; the (cached) hash of the SymPy object is compared first, so that the objects
+    themselves are only compared if the hashes agree."""
+
+    __slots__ = ("dagger", "id", "kind", "obj", "power")
+
+    def __init__(self, obj, power=1, dagger=False):
+        """
+        Parameters
+        ----------
+        obj: <class 'sympy.core.expr.Expr'>
+            Underlying SymPy object, i.e., the factor without exponent and adjoint.
+
+        power: int, optional
+            Exponent of the factor, by default 1.
+
+        dagger: bool, optional
+            Whether the factor is adjoint, by default 'False'.
+        """
+        self.kind = factor_kind(obj)
+        self.id = hash(obj)
+        self.power = power
+        self.dagger = dagger
+        self.obj = obj
+
+    @classmethod
+    def from_expr(cls, expr):
+        power = 1
+        if isinstance(expr, Pow):
+            expr, power = expr.args
+            power = int(power)
+        if isinstance(expr, adjoint):
+            return cls(expr.args[0], power, dagger=True)
+        return cls(expr, power)
+
+    def to_expr(self):
+        ret = adjoint(self.obj) if self.dagger else self.obj
+        if self.power != 1:
+            return Pow(ret, self.power)
+        return ret
+
+    def with_power(self, power):
+        return Factor(self.obj, power, self.dagger)
+
+    def adjoint(self):
+        return Factor(self.obj, self.power, not self.dagger)
+
+    def same_base(self, other) -> bool:
+        return self.id == other.id and self.dagger == other.dagger and self.obj == other.obj
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Factor) and self.id == other.id and self.power == other.power
+            and self.dagger == other.dagger and self.obj == other.obj
+        )
+
+    def __hash__(self):
+        return hash((self.id, self.power, self.dagger))
+
+    def __repr__(self):
+        return str(self.to_expr())
+
+
+def factors_of(expr) -> tuple:
+    """Return the noncommutative factors of a SymPy product as a tuple of
+    <class 'responsefun.terms.Factor'>."""
+    return tuple(Factor.from_expr(f) for f in Mul.make_args(expr) if not f.is_commutative)
+
+
+class Term:
+    """Term of an SOS or ADC/ISR expression, i.e., a commutative SymPy expression
+    (containing, e.g., transition moments and denominators) times a tuple of noncommutative
+    factors, whose order matters.
+
+    The substitutions in the symbolic stage replace subsequences of the factors, which is
+    much cheaper than substituting products in SymPy expressions; SymPy expressions are
+    only built again by to_expr.
+    """
+
+    __slots__ = ("factors", "scalar")
+
+    def __init__(self, scalar, factors):
+        self.scalar = scalar
+        self.factors = tuple(factors)
+
+    @classmethod
+    def from_expr(cls, expr):
+        scalar = []
+        factors = []
+        for f in Mul.make_args(expr):
+            if f.is_commutative:
+                scalar.append(f)
+            else:
+                factors.append(Factor.from_expr(f))
+        return cls(Mul(*scalar), factors)
+
+    def to_expr(self):
+        return Mul(self.scalar, *[f.to_expr() for f in self.factors])
+
+    def _match(self, pattern, i):
+        """Return the remaining exponents of the first and last matched factor if pattern
+        matches the factors at position i, otherwise None; as for products of SymPy
+        expressions, the first and the last factor of the pattern also match a higher power
+        of the same factor."""
+        n = len(pattern)
+        if i + n > len(self.factors):
+            return None
+        rest = [0, 0]
+        for j, (p, f) in enumerate(zip(pattern, self.factors[i:i + n])):
+            if p == f:
+                continue
+            at_edge = j == 0 or j == n - 1
+            if (
+                n == 1 or not at_edge or not p.same_base(f) or p.power * f.power <= 0
+                or abs(f.power) <= abs(p.power)
+            ):
+                return None
+            rest[0 if j == 0 else 1] = f.power - p.power
+        return rest
+
+    def replace(self, pattern, replacement):
+        """Replace all (non-overlapping) occurrences of a sequence of factors.
+
+        Parameters
+        ----------
+        pattern: tuple of <class 'responsefun.terms.Factor'>
+            Sequence of factors to be replaced.
+
+        replacement: tuple of <class 'responsefun.terms.Factor'>
+            Sequence of factors inserted instead.
+
+        Returns
+        ----------
+        <class 'responsefun.terms.Term'>
+        """
+        pattern = tuple(pattern)
+        factors = []
+        i = 0
+        while i < len(self.factors):
+            rest = self._match(pattern, i)
+            if rest is None:
+                factors.append(self.factors[i])
+                i += 1
+                continue
+            if rest[0]:
+                factors.append(pattern[0].with_power(rest[0]))
+            factors.extend(replacement)
+            if rest[1]:
+                factors.append(pattern[-1].with_power(rest[1]))
+            i += len(pattern)
+        return Term(self.scalar, factors)
+
+    def __repr__(self):
+        return str(self.to_expr())
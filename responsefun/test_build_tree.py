@@ -0,0 +1,60 @@
+import warnings
+
+import pytest
+from sympy import adjoint
+from sympy.physics.quantum.state import Ket
+
+from responsefun.build_tree import ResponseEquation, build_tree
+from responsefun.operators import MTM, S2S_MTM, M
+from responsefun.symbols_and_labels import f, w, w_1, w_2, w_3
+
+
+class TestBuildTree:
+    def test_shared_response_vector(self):
+        # <f|B(M-w)^-1 is needed in both terms, whereas (M-w)^-1 F would require
+        # one response vector per operator
+        mtm_el = MTM("A", "electric_dipole")
+        mtm_mag = MTM("A", "magnetic_dipole")
+        s2s = S2S_MTM("B", "electric_dipole")
+        expr = (
+            adjoint(mtm_el) * (M - w) ** -1 * s2s * Ket(f)
+            + adjoint(mtm_mag) * (M - w) ** -1 * s2s * Ket(f)
+        )
+        rvecs_list = build_tree(expr)
+        assert len(rvecs_list) == 1
+        rvecs = rvecs_list[0][1]
+        assert list(rvecs) == [ResponseEquation("S2S_MTM", "electric_dipole", -w, 0, state=f)]
+
+    def test_first_order_preferred(self):
+        # in case of a tie, the response vector with the MTM on the rhs is chosen
+        mtm = MTM("A", "electric_dipole")
+        expr = adjoint(mtm) * (M - w) ** -1 * mtm
+        rvecs_list = build_tree(expr)
+        assert list(rvecs_list[0][1]) == [ResponseEquation("MTM", "electric_dipole", -w, 0)]
+
+    def test_second_level(self):
+        # the response vector of the middle inverse matrix depends on one of the first level
+        mtm_a = MTM("A", "electric_dipole")
+        mtm_d = MTM("D", "electric_dipole")
+        s2s_b = S2S_MTM("B", "electric_dipole")
+        s2s_c = S2S_MTM("C", "electric_dipole")
+        expr = (
+            adjoint(mtm_a) * (M - w_1) ** -1 * s2s_b * (M - w_2) ** -1 * s2s_c
+            * (M - w_3) ** -1 * mtm_d
+        )
+        with warnings.catch_warnings():
+            # the middle inverse matrix is only resolved on the second level
+            warnings.simplefilter("error")
+            rvecs_list = build_tree(expr)
+        assert len(rvecs_list) == 2
+        assert rvecs_list[0][1][ResponseEquation("MTM", "electric_dipole", -w_3, 0)] == 2
+        assert list(rvecs_list[1][1].items()) == [
+            (ResponseEquation("S2S_MTM", "electric_dipole", -w_2, 0, no=2), 3)
+        ]
+        assert not rvecs_list[1][0].has(M)
+
+    def test_unresolved_inverse(self):
+        s2s = S2S_MTM("A", "electric_dipole")
+        expr = s2s * (M - w) ** -1 * s2s
+        with pytest.warns(UserWarning, match="No invertable term found"):
+            build_tree(expr)
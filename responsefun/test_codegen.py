@@ -0,0 +1,58 @@
+import logging
+
+import numpy as np
+import pytest
+
+from responsefun.codegen import expression_hash
+from responsefun.evaluate_property import evaluate_property_sos_fast
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    k,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    w_1,
+    w_2,
+    w_k,
+    w_n,
+    w_o,
+)
+from responsefun.testdata.dense import write_dense_states
+
+pytest.importorskip("zarr")
+
+
+beta_expr = (
+    TransitionMoment(O, op_a, n)
+    * TransitionMoment(n, op_b, k)
+    * TransitionMoment(k, op_c, O)
+    / ((w_n - w_o) * (w_k - w_2))
+)
+beta_perm_pairs = [(op_a, -w_o), (op_b, w_1), (op_c, w_2)]
+
+
+class TestCodegen:
+    def test_expression_hash(self):
+        assert expression_hash(beta_expr, [n, k]) == expression_hash(beta_expr, [n, k])
+        assert expression_hash(beta_expr, [n, k]) != expression_hash(beta_expr, [k, n])
+
+    def test_kernel_cache(self, tmp_path, caplog):
+        caplog.set_level(logging.INFO, logger="responsefun")
+        state = write_dense_states(str(tmp_path / "dense.zarr"), 8)
+        cache = str(tmp_path / "kernels")
+        for w_val in [0.04, 0.05]:
+            freqs = {"freqs_in": [(w_1, w_val), (w_2, 0.06)], "freqs_out": (w_o, w_1 + w_2)}
+            beta_ref = evaluate_property_sos_fast(
+                state, beta_expr, [n, k], perm_pairs=beta_perm_pairs, **freqs
+            )
+            caplog.clear()
+            beta_cached = evaluate_property_sos_fast(
+                state, beta_expr, [n, k], perm_pairs=beta_perm_pairs, kernel_cache=cache,
+                **freqs
+            )
+            np.testing.assert_allclose(beta_cached, beta_ref, atol=1e-12)
+        # the kernel does not depend on the values of the frequencies
+        assert "kernel of the SOS expression was loaded" in caplog.text
+        assert len(list((tmp_path / "kernels").glob("sos_*.py"))) == 1
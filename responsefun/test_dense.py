@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from responsefun.evaluate_property import (
+    evaluate_property_isr,
+    evaluate_property_isr_sweep,
+    evaluate_property_sos_fast,
+)
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    gamma,
+    k,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    opm_b,
+    w,
+    w_1,
+    w_2,
+    w_k,
+    w_n,
+    w_o,
+)
+from responsefun.testdata.dense import solve_dense_response, write_dense_states
+
+pytest.importorskip("zarr")
+
+
+alpha_expr = (
+    TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w - 1j * gamma)
+    + TransitionMoment(O, op_b, n) * TransitionMoment(n, op_a, O) / (w_n + w + 1j * gamma)
+)
+beta_expr = (
+    TransitionMoment(O, op_a, n)
+    * TransitionMoment(n, op_b, k)
+    * TransitionMoment(k, op_c, O)
+    / ((w_n - w_o) * (w_k - w_2))
+)
+beta_perm_pairs = [(op_a, -w_o), (op_b, w_1), (op_c, w_2)]
+beta_freqs = {"freqs_in": [(w_1, 0.04), (w_2, 0.06)], "freqs_out": (w_o, w_1 + w_2)}
+
+
+class TestDenseBackend:
+    @pytest.fixture
+    def state(self, tmp_path):
+        return write_dense_states(str(tmp_path / "dense.zarr"), 10)
+
+    @pytest.mark.parametrize("damping", [0.0, 0.01])
+    def test_alpha(self, state, damping):
+        kwargs = {"freqs_in": (w, 0.05), "freqs_out": (w, 0.05), "damping": damping}
+        alpha_isr = evaluate_property_isr(state, alpha_expr, [n], isr_backend=state, **kwargs)
+        alpha_sos = evaluate_property_sos_fast(state, alpha_expr, [n], **kwargs)
+        np.testing.assert_allclose(alpha_isr, alpha_sos, atol=1e-10)
+
+    @pytest.mark.parametrize("op_b_symbol", [op_b, opm_b])
+    def test_beta(self, state, op_b_symbol):
+        expr = (
+            TransitionMoment(O, op_a, n)
+            * TransitionMoment(n, op_b_symbol, k)
+            * TransitionMoment(k, op_c, O)
+            / ((w_n - w_o) * (w_k - w_2))
+        )
+        perm_pairs = [(op_a, -w_o), (op_b_symbol, w_1), (op_c, w_2)]
+        beta_isr = evaluate_property_isr(
+            state, expr, [n, k], perm_pairs=perm_pairs, isr_backend=state, **beta_freqs
+        )
+        beta_sos = evaluate_property_sos_fast(
+            state, expr, [n, k], perm_pairs=perm_pairs, **beta_freqs
+        )
+        np.testing.assert_allclose(beta_isr, beta_sos, atol=1e-10)
+
+    @pytest.mark.parametrize("freq, n_solves", [(0.0, 3), (0.05, 6)])
+    def test_conjugate_response_equations(self, state, freq, n_solves):
+        # for w = 0, the response equations with opposite damping are complex conjugates of
+        # each other, so only one of them is solved per component
+        solves = []
+
+        def response_solver(*args, **kwargs):
+            solves.append(args[2:])
+            return solve_dense_response(*args, **kwargs)
+
+        kwargs = {"freqs_in": (w, freq), "freqs_out": (w, freq), "damping": 0.01}
+        alpha_isr = evaluate_property_isr(
+            state, alpha_expr, [n], isr_backend=state, response_solver=response_solver, **kwargs
+        )
+        alpha_sos = evaluate_property_sos_fast(state, alpha_expr, [n], **kwargs)
+        assert len(solves) == n_solves
+        np.testing.assert_allclose(alpha_isr, alpha_sos, atol=1e-10)
+
+    def test_sweep(self, state):
+        # the exact solutions of the sweep are obtained with the solver of the backend
+        values = np.linspace(0.0, 0.2, 7)
+        kwargs = {"freqs_in": (w, 0.0), "freqs_out": (w, w), "damping": 0.01}
+        alphas = evaluate_property_isr_sweep(
+            state, alpha_expr, [n], (w, values), isr_backend=state, tol=1e-8, **kwargs
+        )
+        for value, alpha in zip(values, alphas):
+            kwargs = {"freqs_in": (w, value), "freqs_out": (w, value), "damping": 0.01}
+            alpha_sos = evaluate_property_sos_fast(state, alpha_expr, [n], **kwargs)
+            np.testing.assert_allclose(alpha, alpha_sos, atol=1e-6)
+
+    def test_n_workers(self, state):
+        # the response equations are solved concurrently in threads
+        kwargs = {"perm_pairs": beta_perm_pairs, **beta_freqs}
+        beta_ref = evaluate_property_isr(state, beta_expr, [n, k], isr_backend=state, **kwargs)
+        beta = evaluate_property_isr(
+            state, beta_expr, [n, k], isr_backend=state, n_workers=3, **kwargs
+        )
+        np.testing.assert_allclose(beta, beta_ref, atol=1e-12)
+
+    def test_excluded_states(self, state):
+        kwargs = {"perm_pairs": beta_perm_pairs, "excluded_states": [O, 2], **beta_freqs}
+        beta_isr = evaluate_property_isr(state, beta_expr, [n, k], isr_backend=state, **kwargs)
+        beta_sos = evaluate_property_sos_fast(state, beta_expr, [n, k], **kwargs)
+        np.testing.assert_allclose(beta_isr, beta_sos, atol=1e-10)
+
+    def test_excluded_resonant_state(self, state):
+        # the frequency is equal to the excitation energy of the excluded state, i.e.,
+        # the shifted ADC matrix is only regular in the complement of that state
+        omega = state.excitation_energy_uncorrected[2]
+        kwargs = {"freqs_in": (w, omega), "freqs_out": (w, omega), "excluded_states": [2]}
+        alpha_isr = evaluate_property_isr(state, alpha_expr, [n], isr_backend=state, **kwargs)
+        alpha_sos = evaluate_property_sos_fast(state, alpha_expr, [n], **kwargs)
+        np.testing.assert_allclose(alpha_isr, alpha_sos, atol=1e-10)
@@ -1,21 +1,30 @@
+import pickle
+
 import adcc
 import numpy as np
 import pytest
+from sympy import I, Rational, Symbol
 
 from responsefun.evaluate_property import evaluate_property_isr
-from responsefun.SumOverStates import TransitionMoment
+from responsefun.IsrFormulation import IsrFormulation, compute_remaining_terms
+from responsefun.operators import Moment
+from responsefun.SumOverStates import SumOverStates, TransitionMoment
 from responsefun.symbols_and_labels import (
     O,
+    f,
+    gamma,
     k,
     n,
     op_a,
     op_b,
     op_c,
+    w,
     w_1,
     w_2,
     w_k,
     w_n,
     w_o,
+    w_prime,
 )
 from responsefun.testdata import cache
 from responsefun.testdata.static_data import xyz
@@ -72,4 +81,41 @@ class TestExtraTerms:
             state, beta2_expr, [n, k], perm_pairs=perm_pairs, excluded_states=O,
             freqs_in=freqs_in, freqs_out=freqs_out,
         )
-        np.testing.assert_allclose(beta1_tens, beta2_tens, atol=1e-7)
\ No newline at end of file
+        np.testing.assert_allclose(beta1_tens, beta2_tens, atol=1e-7)
+
+
+class TestRemainingTerms:
+    def test_cancellation(self):
+        mu = Symbol("mu", real=True)
+        terms = [
+            mu / (w_1 * (w_1 - w_2)), mu / (w_2 * (w_2 - w_1)), mu / (w_1 * w_2)
+        ]
+        assert compute_remaining_terms(terms) == 0
+        # w_o is replaced by w_1 + w_2 before the terms are compared
+        terms = [mu / (w_o - w_1), -mu / w_2]
+        assert compute_remaining_terms(terms, [(w_o, w_1 + w_2)]) == 0
+        # Floats are compared exactly
+        terms = [mu / (w_1 + 0.5 * I * gamma), -mu / (w_1 + Rational(1, 2) * I * gamma)]
+        assert compute_remaining_terms(terms) == 0
+
+    def test_remaining(self):
+        mu = Symbol("mu", real=True)
+        terms = [mu / w_1, mu / w_2]
+        assert compute_remaining_terms(terms) == mu / w_1 + mu / w_2
+        terms = [mu / (w_1 + 0.5 * I * gamma), -mu / (w_1 + 0.5000001 * I * gamma)]
+        assert compute_remaining_terms(terms) != 0
+
+
+class TestParallelProcessing:
+    def test_pickle(self):
+        moment = Moment("A", O, n, "electric_dipole")
+        assert pickle.loads(pickle.dumps(moment)) == moment
+        assert pickle.loads(pickle.dumps(w_n)).state == n
+
+    def test_isr_formulation(self):
+        rixs_expr = TransitionMoment(f, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w)
+        sos = SumOverStates(rixs_expr, [n], freqs_in=[w], freqs_out=[w_prime])
+        isr = IsrFormulation(sos)
+        isr_parallel = IsrFormulation(sos, n_workers=2)
+        assert isr.number_of_extra_terms > 0
+        assert isr_parallel.expr == isr.expr
@@ -1,9 +1,17 @@
+import gc
+import os
+
 import adcc
 import numpy as np
 import pytest
 
+from responsefun.AdccProperties import (
+    build_adcc_properties_dict,
+    compute_state_to_state_transition_moments,
+)
 from responsefun.evaluate_property import (
     evaluate_property_isr,
+    evaluate_property_sos,
     evaluate_property_sos_fast,
 )
 from responsefun.SumOverStates import SumOverStates, TransitionMoment
@@ -33,6 +41,7 @@ from responsefun.symbols_and_labels import (
     w_n,
     w_o,
     w_p,
+    xi_ab,
 )
 from responsefun.testdata import cache
 from responsefun.testdata.static_data import xyz
@@ -335,4 +344,150 @@ class TestCottonMoutonPara:
             )
             cm_para_isr = evaluate_property_isr(state, t, [n, m, p], freqs_in=freqs_in,
                                                 freqs_out=freqs_out, extra_terms=False)
-            np.testing.assert_allclose(cm_para_isr, cm_para_sos, atol=1e-8, err_msg=f"{t}")
\ No newline at end of file
+            np.testing.assert_allclose(cm_para_isr, cm_para_sos, atol=1e-8, err_msg=f"{t}")
+
+class TestMomentEngine:
+    def test_h2o_sto3g_adc2(self):
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        state = adcc.run_adc(refstate, method=method, n_singlets=3)
+
+        adcc_prop = build_adcc_properties_dict(state, ["electric_dipole", "magnetic_dipole"])
+        for prop in adcc_prop.values():
+            ref = compute_state_to_state_transition_moments(state, prop.integrals)
+            np.testing.assert_allclose(prop.state_to_state_transition_moment, ref, atol=1e-12)
+            np.testing.assert_allclose(prop.s2s_tm_view(initial_state=1), ref[1], atol=1e-12)
+            np.testing.assert_allclose(prop.s2s_tm_view(final_state=2), ref[:, 2], atol=1e-12)
+
+    def test_h2o_sto3g_adc2_parallel(self):
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        state = adcc.run_adc(refstate, method=method, n_singlets=3)
+
+        op_types = ["electric_dipole", "magnetic_dipole"]
+        adcc_prop = build_adcc_properties_dict(state, op_types)
+        adcc_prop_parallel = build_adcc_properties_dict(state, op_types, n_workers=2)
+        for op_type in op_types:
+            np.testing.assert_allclose(
+                adcc_prop_parallel[op_type].state_to_state_transition_moment,
+                adcc_prop[op_type].state_to_state_transition_moment,
+                atol=1e-12,
+            )
+
+    def test_h2o_sto3g_adc2_threads(self):
+        # the rows of initial states are computed concurrently in threads
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        state = adcc.run_adc(refstate, method=method, n_singlets=5)
+
+        integrals = refstate.operators.electric_dipole
+        ref = compute_state_to_state_transition_moments(state, integrals)
+        s2s_tm = compute_state_to_state_transition_moments(state, integrals, n_workers=3)
+        np.testing.assert_allclose(s2s_tm, ref, atol=1e-12)
+        s2s_tm = compute_state_to_state_transition_moments(
+            state, integrals, final_state=2, n_workers=3
+        )
+        np.testing.assert_allclose(s2s_tm, ref[:, 2], atol=1e-12)
+
+    def test_h2o_sto3g_adc2_memmap(self, tmp_path):
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        state = adcc.run_adc(refstate, method=method, n_singlets=3)
+
+        op_types = ["electric_dipole", "magnetic_dipole"]
+        adcc_prop = build_adcc_properties_dict(state, op_types)
+        adcc_prop_memmap = build_adcc_properties_dict(state, op_types, memmap_dir=str(tmp_path))
+        for op_type in op_types:
+            s2s_tm = adcc_prop_memmap[op_type].state_to_state_transition_moment
+            assert isinstance(s2s_tm, np.memmap)
+            np.testing.assert_allclose(
+                s2s_tm, adcc_prop[op_type].state_to_state_transition_moment, atol=1e-12
+            )
+
+        # a second engine with the same directory does not touch the tables of the first one
+        adcc_prop_other = build_adcc_properties_dict(
+            state, ["electric_dipole"], memmap_dir=str(tmp_path), keep_memmaps=True
+        )
+        other_tm = adcc_prop_other["electric_dipole"].state_to_state_transition_moment
+        other_path = adcc_prop_other["electric_dipole"]._moment_engine.memmap_path
+        path = adcc_prop_memmap["electric_dipole"]._moment_engine.memmap_path
+        assert path != other_path
+        for op_type in op_types:
+            np.testing.assert_allclose(
+                adcc_prop_memmap[op_type].state_to_state_transition_moment,
+                adcc_prop[op_type].state_to_state_transition_moment,
+                atol=1e-12,
+            )
+
+        # the files are removed with the engine, unless they are kept
+        del adcc_prop_memmap, s2s_tm, adcc_prop_other, other_tm
+        gc.collect()
+        assert not os.path.exists(path)
+        assert os.path.exists(os.path.join(other_path, "s2s_tm_electric_dipole.npy"))
+
+
+class TestDiamagneticMagnetizability:
+    def test_h2o_sto3g_adc2(self):
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        if not hasattr(refstate.operators, "diamagnetic_magnetizability"):
+            pytest.skip("The adcc version does not provide diamagnetic magnetizability integrals.")
+        state = adcc.run_adc(refstate, method=method, n_singlets=5)
+
+        xi = build_adcc_properties_dict(state, ["diamagnetic_magnetizability"])[
+            "diamagnetic_magnetizability"
+        ]
+        ref = compute_state_to_state_transition_moments(state, xi.integrals)
+        np.testing.assert_allclose(xi.state_to_state_transition_moment, ref, atol=1e-12)
+        np.testing.assert_allclose(
+            xi.transition_moment, np.transpose(xi.transition_moment, (0, 2, 1)), atol=1e-12
+        )
+
+        sos_expr = (
+            TransitionMoment(O, xi_ab, n) * TransitionMoment(n, op_c, O) / (w_n - w)
+            + TransitionMoment(O, op_c, n) * TransitionMoment(n, xi_ab, O) / (w_n + w)
+        )
+        tens_sos = evaluate_property_sos_fast(
+            state, sos_expr, [n], freqs_in=(w, 0.5), freqs_out=(w, 0.5), extra_terms=False
+        )
+        tens_sos_slow = evaluate_property_sos(
+            state, sos_expr, [n], freqs_in=(w, 0.5), freqs_out=(w, 0.5), extra_terms=False
+        )
+        np.testing.assert_allclose(tens_sos_slow, tens_sos, atol=1e-10)
+
+    @pytest.mark.parametrize("method", ["adc1", "adc2"])
+    def test_h2o_sto3g_gs_moment(self, method):
+        # the ground-state moment must be the expectation value of
+        # -1/4 * sum_i (r_i^2 delta_ab - r_ia r_ib) with the SCF or MP2 density
+        scfres = run_scf("h2o", "sto3g")
+        refstate = adcc.ReferenceState(scfres)
+        if not hasattr(refstate.operators, "diamagnetic_magnetizability"):
+            pytest.skip("The adcc version does not provide diamagnetic magnetizability integrals.")
+        state = adcc.run_adc(refstate, method=method, n_singlets=3)
+        xi = build_adcc_properties_dict(state, ["diamagnetic_magnetizability"])[
+            "diamagnetic_magnetizability"
+        ]
+
+        if method == "adc1":
+            density_ao = scfres.make_rdm1()
+        else:
+            dm_a, dm_b = state.ground_state.density(2).to_ao_basis()
+            density_ao = dm_a.to_ndarray() + dm_b.to_ndarray()
+        nao = scfres.mol.nao
+        with scfres.mol.with_common_orig([0.0, 0.0, 0.0]):
+            r_r = scfres.mol.intor_symmetric("int1e_rr", comp=9).reshape(3, 3, nao, nao)
+        r_r = np.einsum("abij,ij->ab", r_r, density_ao)
+        ref = -0.25 * (np.trace(r_r) * np.eye(3) - r_r)
+        np.testing.assert_allclose(xi.gs_moment, ref, atol=1e-8)
+        # the diamagnetic contribution lowers the magnetizability
+        assert np.all(np.diag(xi.gs_moment) < 0)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from responsefun import evaluate_property, properties
+from responsefun.evaluate_property import evaluate_property_isr
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import O, gamma, n, op_a, op_b, w, w_n
+from responsefun.testdata.dense import write_dense_states
+
+pytest.importorskip("zarr")
+
+
+property_calls = {
+    "polarizability_static": (properties.polarizability, {}),
+    "polarizability_complex": (properties.polarizability, {"omega": 0.05, "damping": 0.01}),
+    "first_hyperpolarizability": (
+        properties.first_hyperpolarizability, {"omega_1": 0.04, "omega_2": 0.06}
+    ),
+    "first_hyperpolarizability_complex": (
+        properties.first_hyperpolarizability,
+        {"omega_1": 0.04, "omega_2": 0.06, "damping": 0.01},
+    ),
+    "second_hyperpolarizability": (
+        properties.second_hyperpolarizability, {"omega_1": 0.04, "omega_2": 0.05, "omega_3": 0.06}
+    ),
+    "two_photon_absorption": (properties.two_photon_absorption, {"excited_state": 2}),
+    "three_photon_absorption": (properties.three_photon_absorption, {"excited_state": 2}),
+    "rixs": (properties.rixs, {"excited_state": 2, "omega": 0.05, "damping": 0.01}),
+    "rixs_rotating_wave": (
+        properties.rixs,
+        {"excited_state": 2, "omega": 0.05, "damping": 0.01, "rotating_wave": True},
+    ),
+    "excited_state_polarizability": (
+        properties.excited_state_polarizability,
+        {"excited_state": 1, "omega": 0.05, "damping": 0.01},
+    ),
+}
+
+
+class TestCatalogue:
+    @pytest.fixture
+    def state(self, tmp_path):
+        return write_dense_states(str(tmp_path / "dense.zarr"), 8)
+
+    @pytest.mark.parametrize("name", list(property_calls))
+    def test_isr_against_sos(self, state, name):
+        func, kwargs = property_calls[name]
+        tens_isr = func(state, engine="isr", isr_backend=state, **kwargs)
+        tens_sos = func(state, engine="sos_fast", **kwargs)
+        np.testing.assert_allclose(tens_isr, tens_sos, atol=1e-10)
+
+    def test_generic_path(self, state):
+        # the catalogue gives the same result as the expression written out by hand
+        alpha_expr = (
+            TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w - 1j * gamma)
+            + TransitionMoment(O, op_b, n) * TransitionMoment(n, op_a, O)
+            / (w_n + w + 1j * gamma)
+        )
+        alpha_ref = evaluate_property_isr(
+            state, alpha_expr, [n], freqs_in=(w, 0.05), freqs_out=(w, 0.05), damping=0.01,
+            isr_backend=state,
+        )
+        alpha = properties.polarizability(state, omega=0.05, damping=0.01, isr_backend=state)
+        np.testing.assert_allclose(alpha, alpha_ref, atol=1e-12)
+
+    @pytest.mark.parametrize("name", ["mcd_bterm_I", "mcd_bterm_II"])
+    def test_mcd_bterm(self, state, name):
+        # in the second term, the excluded state j enters the denominator as shift
+        tens_isr = properties.evaluate_catalogue_entry(
+            state, name, excited_state=0, isr_backend=state
+        )
+        tens_sos = properties.evaluate_catalogue_entry(state, name, "sos_fast", excited_state=0)
+        np.testing.assert_allclose(tens_isr, tens_sos, atol=1e-10)
+
+    def test_mcd_bterm_full(self, state):
+        bterm_isr = properties.mcd_bterm(state, 0, isr_backend=state)
+        bterm_sos = properties.mcd_bterm(state, 0, engine="sos_fast")
+        assert np.isscalar(bterm_isr)
+        np.testing.assert_allclose(bterm_isr, bterm_sos, atol=1e-10)
+
+    def test_isr_plans(self, state, monkeypatch):
+        alpha_ref = evaluate_property_isr(
+            state, properties.catalogue["polarizability"].sos_expr, [n],
+            freqs_in=(w, 0.06), freqs_out=(w, 0.06), symmetric=True, isr_backend=state,
+        )
+        properties.polarizability(state, omega=0.05, isr_backend=state)
+        # the second evaluation of the entry does not transform the SOS expression again
+        monkeypatch.setattr(evaluate_property, "IsrFormulation", None)
+        alpha = properties.polarizability(state, omega=0.06, isr_backend=state)
+        np.testing.assert_allclose(alpha, alpha_ref, atol=1e-12)
+
+    def test_unknown_engine(self, state):
+        with pytest.raises(ValueError):
+            properties.polarizability(state, engine="fast")
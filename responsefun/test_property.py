@@ -13,6 +13,7 @@ from respondo.tpa import tpa_resonant
 
 from responsefun.evaluate_property import (
     evaluate_property_isr,
+    evaluate_property_isr_sweep,
     evaluate_property_sos,
     evaluate_property_sos_fast,
 )
@@ -186,6 +187,26 @@ class TestIsrAgainstRespondo:
                                       damping=gamma_val, symmetric=True)
         np.testing.assert_allclose(alpha, alpha_ref, atol=1e-7)
 
+    def test_complex_polarizability_sweep(self, case):
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        omegas = np.linspace(0.0, 0.1, 11)
+        gamma_val = ev2au(0.124)
+
+        state = adcc.run_adc(refstate, method=method, n_singlets=5)
+        alpha_expr = SOS_expressions["alpha_complex"][0]
+        alphas = evaluate_property_isr_sweep(
+            state, alpha_expr, [n], (w, omegas), freqs_in=(w, 0.0), freqs_out=(w, 0.0),
+            damping=gamma_val, symmetric=True, tol=1e-8
+        )
+        assert alphas.shape == (len(omegas), 3, 3)
+        for omega, alpha in zip(omegas, alphas):
+            alpha_ref = complex_polarizability(
+                refstate, method=method, omega=omega, gamma=gamma_val
+            )
+            np.testing.assert_allclose(alpha, alpha_ref, atol=1e-6)
+
     def test_rixs_short(self, case):
         molecule, basis, method = case.split("_")
         scfres = run_scf(molecule, basis)
@@ -262,8 +283,11 @@ class TestIsrAgainstSos:
         refstate = adcc.ReferenceState(scfres)
         alpha_expr = SOS_expressions["alpha_complex"][0]
         gamma_val = ev2au(0.124)
-        # static, real and complex polarizability
-        value_list = [((w, 0.0), 0.0), ((w, 0.05), 0.0), ((w, 0.03), gamma_val)]
+        # static, real and complex polarizability;
+        # for w = 0, the two response equations are complex conjugates of each other
+        value_list = [
+            ((w, 0.0), 0.0), ((w, 0.05), 0.0), ((w, 0.03), gamma_val), ((w, 0.0), gamma_val)
+        ]
         mock_state = cache.data_fulldiag[case]
         state = adcc.run_adc(refstate, method=method, n_singlets=5)
 
@@ -283,6 +307,27 @@ class TestIsrAgainstSos:
                 err_msg="w = {}, gamma = {}".format(tup[0][1], tup[1]),
             )
 
+    def test_polarizability_excluded_states(self, case):
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        alpha_expr = SOS_expressions["alpha_complex"][0]
+        gamma_val = ev2au(0.124)
+        freq = (w, 0.05)
+        mock_state = cache.data_fulldiag[case]
+        state = adcc.run_adc(refstate, method=method, n_singlets=5)
+
+        # several states are projected out from the ADC matrix at once
+        alpha_sos = evaluate_property_sos(
+            mock_state, alpha_expr, [n], freqs_in=freq, freqs_out=freq,
+            damping=gamma_val, excluded_states=[O, 0, 2]
+        )
+        alpha_isr = evaluate_property_isr(
+            state, alpha_expr, [n], freqs_in=freq, freqs_out=freq,
+            damping=gamma_val, excluded_states=[O, 0, 2]
+        )
+        np.testing.assert_allclose(alpha_isr, alpha_sos, atol=1e-7)
+
     def test_rixs_short(self, case):
         molecule, basis, method = case.split("_")
         scfres = run_scf(molecule, basis)
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from responsefun import scheduler
+from responsefun.scheduler import (
+    DagTask,
+    critical_path_priorities,
+    run_dag,
+    topological_order,
+)
+
+
+def add(*args):
+    return sum(args) + 1
+
+
+def fail(*args):
+    raise RuntimeError("failed task")
+
+
+def build_tasks():
+    # a -> c, b -> c, c -> e, d -> e (dependencies point from left to right)
+    return {
+        "a": DagTask(add),
+        "b": DagTask(add, cost=3.0),
+        "c": DagTask(add, ["a", "b"]),
+        "d": DagTask(add),
+        "e": DagTask(add, ["c", "d"]),
+    }
+
+
+class TestScheduler:
+    def test_topological_order(self):
+        order = topological_order(build_tasks())
+        assert order.index("a") < order.index("c")
+        assert order.index("b") < order.index("c")
+        assert order.index("c") < order.index("e")
+        assert order.index("d") < order.index("e")
+
+    def test_cycle(self):
+        tasks = {"a": DagTask(add, ["b"]), "b": DagTask(add, ["a"])}
+        with pytest.raises(ValueError):
+            topological_order(tasks)
+
+    def test_critical_path_priorities(self):
+        priorities = critical_path_priorities(build_tasks())
+        assert priorities == {"a": 3.0, "b": 5.0, "c": 2.0, "d": 2.0, "e": 1.0}
+
+    @pytest.mark.parametrize("executor", ["thread", "process"])
+    def test_run_dag(self, executor):
+        ref = {"a": 1, "b": 1, "c": 3, "d": 1, "e": 5}
+        assert run_dag(build_tasks()) == ref
+        assert run_dag(build_tasks(), n_workers=3, executor=executor) == ref
+
+    def test_critical_path_first(self):
+        started = []
+
+        def record(key):
+            def function(*args):
+                started.append(key)
+                time.sleep(0.01)
+            return function
+
+        tasks = {
+            "short": DagTask(record("short")),
+            "long": DagTask(record("long"), cost=1.0),
+            "long2": DagTask(record("long2"), ["long"], cost=5.0),
+        }
+        run_dag(tasks, n_workers=1)
+        assert started[0] == "long"
+
+    def test_failed_process_task(self):
+        tasks = {"a": DagTask(add), "b": DagTask(fail, ["a"])}
+        with pytest.raises(RuntimeError, match="failed task"):
+            run_dag(tasks, n_workers=2, executor="process")
+        # the tasks are not kept alive by the module
+        assert scheduler._forked_tasks == {}
@@ -0,0 +1,83 @@
+import adcc
+import numpy as np
+import pytest
+
+from responsefun.evaluate_property import (
+    evaluate_property_isr,
+    evaluate_property_sos_fast,
+)
+from responsefun.snapshot import load_snapshot, write_snapshot
+from responsefun.SumOverStates import TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    k,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    w,
+    w_1,
+    w_2,
+    w_k,
+    w_n,
+    w_o,
+)
+from responsefun.testdata.static_data import xyz
+
+pytest.importorskip("zarr")
+
+
+def run_scf(molecule, basis, backend="pyscf"):
+    scfres = adcc.backends.run_hf(
+        backend,
+        xyz=xyz[molecule],
+        basis=basis,
+    )
+    return scfres
+
+
+alpha_expr = (
+    TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w)
+    + TransitionMoment(O, op_b, n) * TransitionMoment(n, op_a, O) / (w_n + w)
+)
+beta_expr = (
+    TransitionMoment(O, op_a, n)
+    * TransitionMoment(n, op_b, k)
+    * TransitionMoment(k, op_c, O)
+    / ((w_n - w_o) * (w_k - w_2))
+)
+beta_perm_pairs = [(op_a, -w_o), (op_b, w_1), (op_c, w_2)]
+
+
+class TestSnapshot:
+    def test_h2o_sto3g_adc2(self, tmp_path):
+        case = "h2o_sto3g_adc2"
+        molecule, basis, method = case.split("_")
+        scfres = run_scf(molecule, basis)
+        refstate = adcc.ReferenceState(scfres)
+        state = adcc.run_adc(refstate, method=method, n_singlets=5)
+        path = str(tmp_path / f"{case}.zarr")
+        write_snapshot(state, path)
+
+        # the stored moments suffice for the SOS expression
+        freqs = {"freqs_in": [(w_1, 0.05), (w_2, 0.05)], "freqs_out": (w_o, w_1 + w_2)}
+        beta_ref = evaluate_property_sos_fast(
+            state, beta_expr, [n, k], perm_pairs=beta_perm_pairs, **freqs
+        )
+        beta_snapshot = evaluate_property_sos_fast(
+            load_snapshot(path), beta_expr, [n, k], perm_pairs=beta_perm_pairs, **freqs
+        )
+        np.testing.assert_allclose(beta_snapshot, beta_ref, atol=1e-10)
+
+        # the ADC matrix is rebuilt from the reference state without solving for the states
+        restored = load_snapshot(path, refstate)
+        np.testing.assert_allclose(
+            restored.excitation_energy, state.excitation_energy, atol=1e-12
+        )
+        alpha_ref = evaluate_property_isr(
+            state, alpha_expr, [n], freqs_in=(w, 0.5), freqs_out=(w, 0.5)
+        )
+        alpha_restored = evaluate_property_isr(
+            restored, alpha_expr, [n], freqs_in=(w, 0.5), freqs_out=(w, 0.5)
+        )
+        np.testing.assert_allclose(alpha_restored, alpha_ref, atol=1e-8)
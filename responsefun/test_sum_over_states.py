@@ -0,0 +1,102 @@
+import pytest
+from sympy import Add
+
+from responsefun.SumOverStates import SumOverStates, TransitionMoment
+from responsefun.symbols_and_labels import (
+    O,
+    gamma,
+    k,
+    m,
+    n,
+    op_a,
+    op_b,
+    op_c,
+    op_d,
+    op_e,
+    p,
+    w_1,
+    w_2,
+    w_3,
+    w_4,
+    w_k,
+    w_m,
+    w_n,
+    w_o,
+    w_p,
+)
+
+alpha_term = TransitionMoment(O, op_a, n) * TransitionMoment(n, op_b, O) / (w_n - w_o)
+
+
+class TestPermutation:
+    def test_delta_terms(self):
+        term = (
+            TransitionMoment(O, op_a, n)
+            * TransitionMoment(n, op_b, m)
+            * TransitionMoment(m, op_c, p)
+            * TransitionMoment(p, op_d, k)
+            * TransitionMoment(k, op_e, O)
+            / ((w_n - w_o) * (w_m - w_2 - w_3 - w_4) * (w_p - w_3 - w_4) * (w_k - w_4))
+        )
+        perm_pairs = [(op_a, -w_o), (op_b, w_1), (op_c, w_2), (op_d, w_3), (op_e, w_4)]
+        sos = SumOverStates(term, [n, m, p, k], perm_pairs=perm_pairs)
+        assert sos.number_of_terms == 120
+        # swapping op_b and op_c also swaps their frequencies
+        swapped = (
+            TransitionMoment(O, op_a, n)
+            * TransitionMoment(n, op_c, m)
+            * TransitionMoment(m, op_b, p)
+            * TransitionMoment(p, op_d, k)
+            * TransitionMoment(k, op_e, O)
+            / ((w_n - w_o) * (w_m - w_1 - w_3 - w_4) * (w_p - w_3 - w_4) * (w_k - w_4))
+        )
+        assert swapped in Add.make_args(sos.expr)
+
+    def test_shared_damping(self):
+        # the damping term is part of all frequencies, of which w_o, w_1 and w_2 are permuted
+        term = (
+            TransitionMoment(O, op_a, n)
+            * TransitionMoment(n, op_b, k, shifted=True)
+            * TransitionMoment(k, op_c, O)
+            / ((w_n - w_o - 1j * gamma) * (w_k - w_2 - 1j * gamma))
+        )
+        perm_pairs = [(op_a, -w_o - 1j * gamma), (op_b, w_1 + 1j * gamma),
+                      (op_c, w_2 + 1j * gamma)]
+        sos = SumOverStates(term, [n, k], perm_pairs=perm_pairs)
+        assert sos.number_of_terms == 6
+        swapped = (
+            TransitionMoment(O, op_c, n)
+            * TransitionMoment(n, op_b, k, shifted=True)
+            * TransitionMoment(k, op_a, O)
+            / ((w_n + w_2 + 1j * gamma) * (w_k + w_o + 1j * gamma))
+        )
+        assert swapped in Add.make_args(sos.expr)
+
+
+class TestComponentSymmetries:
+    def test_first_hyperpolarizability(self):
+        term = (
+            TransitionMoment(O, op_a, n)
+            * TransitionMoment(n, op_b, k, shifted=True)
+            * TransitionMoment(k, op_c, O)
+            / ((w_n - w_o) * (w_k - w_2))
+        )
+        perm_pairs = [(op_a, -w_o), (op_b, w_1), (op_c, w_2)]
+        sos = SumOverStates(term, [n, k], perm_pairs=perm_pairs)
+        # second-harmonic generation: symmetric with respect to B and C
+        shg = sos.component_symmetries({w_1: 0.05, w_2: 0.05, w_o: 0.1})
+        assert shg == [(0, 1, 2), (0, 2, 1)]
+        assert sos.component_symmetries({w_1: 0.04, w_2: 0.06, w_o: 0.1}) == [(0, 1, 2)]
+        assert len(sos.component_symmetries({w_1: 0.0, w_2: 0.0, w_o: 0.0})) == 6
+
+
+class TestEnergyConservation:
+    def test_failed_check_warns(self):
+        sos = SumOverStates(
+            alpha_term, [n], perm_pairs=[(op_a, -w_o), (op_b, w_1)], freqs_in=w_1,
+            freqs_out=w_o,
+        )
+        assert sos.check_energy_conservation([(w_1, 0.5), (w_o, 0.5)])
+        # the warning is shown even if logging is not configured
+        with pytest.warns(UserWarning, match="Failed energy conservation check"):
+            assert not sos.check_energy_conservation([(w_1, 0.5), (w_o, 0.4)])
@@ -0,0 +1,40 @@
+from sympy import adjoint
+from sympy.physics.quantum.state import Bra, Ket
+
+from responsefun.IsrFormulation import insert_isr_transition_moments
+from responsefun.operators import MTM, S2S_MTM, M, OneParticleOperator, ResponseVector
+from responsefun.symbols_and_labels import O, f, n, w, w_n
+from responsefun.terms import Factor, FactorKind, Term, factors_of
+
+
+class TestTerm:
+    def test_round_trip(self):
+        mtm = MTM("A", "electric_dipole")
+        expr = -2 * w * adjoint(mtm) * (M - w) ** -2 * mtm / w_n
+        term = Term.from_expr(expr)
+        assert [factor.kind for factor in term.factors] == [
+            FactorKind.MTM, FactorKind.MATRIX, FactorKind.MTM
+        ]
+        assert term.factors[0].dagger and not term.factors[2].dagger
+        assert term.factors[1].power == -2
+        assert term.to_expr() == expr
+
+    def test_replace_power(self):
+        # as for SymPy, a single inverse matrix is replaced in an inverse matrix squared
+        mtm = MTM("A", "electric_dipole")
+        vec = ResponseVector("A", 1, "MTM", 1)
+        expr = adjoint(mtm) * (M - w) ** -2 * mtm
+        old = (M - w) ** -1 * mtm
+        term = Term.from_expr(expr).replace(factors_of(old), (Factor(vec),))
+        assert term.to_expr() == expr.subs(old, vec)
+        assert term.to_expr() == adjoint(mtm) * (M - w) ** -1 * vec
+
+    def test_insert_isr_transition_moments(self):
+        op_a = OneParticleOperator("A", "electric_dipole", False)
+        op_b = OneParticleOperator("B", "electric_dipole", False)
+        expr = Bra(O) * op_a * Ket(n) * Bra(n) * op_b * Ket(f) / (w_n - w)
+        ret = insert_isr_transition_moments(expr, [op_a, op_b])
+        assert ret == (
+            adjoint(MTM("A", "electric_dipole")) * Ket(n) * Bra(n)
+            * S2S_MTM("B", "electric_dipole") * Ket(f) / (w_n - w)
+        )
@@ -1,6 +1,7 @@
 # taken from respondo
 
 import os
+from collections.abc import Mapping
 
 from responsefun.testdata.mock import MockExcitedStates
 
@@ -14,18 +15,47 @@ cases = {
 }
 
 
+def zarr_file(case):
+    thisdir = os.path.dirname(__file__)
+    return os.path.join(thisdir, f"{case}.zarr")
+
+
 def read_full_diagonalization():
     import zarr
 
     ret = {}
     for case in cases:
-        thisdir = os.path.dirname(__file__)
-        zarr_file = os.path.join(thisdir, f"{case}.zarr")
-        if not os.path.isdir(zarr_file):
+        if not os.path.isdir(zarr_file(case)):
             continue
-        z = zarr.open(zarr_file, mode="r")
+        z = zarr.open(zarr_file(case), mode="r")
         ret[case] = MockExcitedStates(z)
     return ret
 
 
-data_fulldiag = read_full_diagonalization()
+class FullDiagonalizationData(Mapping):
+    """Full diagonalization results of the available cases,
+    whose zarr files are opened on first access"""
+
+    def __init__(self):
+        self._states = {}
+
+    def __contains__(self, case):
+        return case in cases and os.path.isdir(zarr_file(case))
+
+    def __getitem__(self, case):
+        if case not in self:
+            raise KeyError(case)
+        if case not in self._states:
+            import zarr
+
+            self._states[case] = MockExcitedStates(zarr.open(zarr_file(case), mode="r"))
+        return self._states[case]
+
+    def __iter__(self):
+        return (case for case in cases if case in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+data_fulldiag = FullDiagonalizationData()
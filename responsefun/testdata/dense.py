@@ -0,0 +1,176 @@
+from functools import cached_property
+
+import numpy as np
+from respondo.cpp_algebra import ResponseVector as RV
+
+from responsefun.AdccProperties import IsrBackend
+from responsefun.testdata.mock import MockExcitedStates
+from responsefun.testdata.synthetic import synthetic_operators
+
+
+class DenseVector(np.ndarray):
+    """Excitation or response vector of the dense ADC backend, which provides the parts of the
+    interface of adcc.AmplitudeVector that are used by responsefun and respondo."""
+
+    def __array_wrap__(self, obj, context=None, return_scalar=False):
+        # scalar products are returned as numbers, not as zero-dimensional vectors
+        if obj.ndim == 0:
+            return obj[()]
+        return super().__array_wrap__(obj, context)
+
+    def zeros_like(self):
+        return np.zeros_like(self)
+
+
+class DenseAdcMatrix:
+    """Dense symmetric stand-in for the ADC matrix."""
+
+    def __init__(self, matrix: np.ndarray):
+        self.dense = matrix
+        self.shape = matrix.shape
+
+    def __matmul__(self, other):
+        return (self.dense @ np.asarray(other)).view(DenseVector)
+
+    def diagonal(self):
+        return np.diag(self.dense).view(DenseVector)
+
+
+class DenseIsrMatrix:
+    """Dense B matrix (or matrices) of an operator in the basis of the excitation vectors."""
+
+    def __init__(self, bmatrix: np.ndarray):
+        self.dense = bmatrix
+
+    def __matmul__(self, other):
+        if self.dense.ndim == 2:
+            return (self.dense @ np.asarray(other)).view(DenseVector)
+        return [
+            (b @ np.asarray(other)).view(DenseVector) for b in self.dense.reshape(-1, *self.shape)
+        ]
+
+    @property
+    def shape(self):
+        return self.dense.shape[-2:]
+
+
+def _as_complex(vec):
+    if isinstance(vec, RV):
+        return np.asarray(vec.real) + 1j * np.asarray(vec.imag)
+    return np.asarray(vec)
+
+
+def solve_dense_response(matrix, rhs, omega, gamma=0.0, projection=None, **solver_args):
+    """Direct solver of the response equation (M - omega - i*gamma) x = rhs with the dense
+    ADC matrix; it follows the conventions of respondo's solve_response and can thus be used
+    as its replacement, e.g., as the response_solver of evaluate_property_isr.
+    """
+    if isinstance(rhs, RV):
+        # the same convention for the imaginary part of the right-hand side as in respondo
+        rhs_dense = np.asarray(rhs.real) - 1j * np.asarray(rhs.imag)
+    else:
+        rhs_dense = np.asarray(rhs)
+    identity = np.eye(matrix.shape[0])
+    shifted = matrix.dense - (omega + 1j * gamma) * identity
+    if projection is not None:
+        # (Q (M - omega - i*gamma) Q + P) x = Q rhs with the projector P onto the excluded
+        # states and Q = 1 - P, which is not singular even if the shift is equal to the
+        # excitation energy of an excluded state
+        proj = np.column_stack([projection(e.view(DenseVector)) for e in identity])
+        compl = identity - proj
+        shifted = compl @ shifted @ compl + proj
+        rhs_dense = compl @ rhs_dense
+    solution = np.linalg.solve(shifted, rhs_dense)
+    real = solution.real.view(DenseVector)
+    imag = solution.imag.view(DenseVector)
+    if gamma == 0.0 and not isinstance(rhs, RV):
+        return real
+    return RV(real, imag)
+
+
+def write_dense_states(path, n_states, seed=0, property_method="adc2"):
+    """Write a dense stand-in for an ADC calculation to a zarr store, which can be read by
+    DenseExcitedStates.
+
+    The ADC matrix is a random symmetric matrix of dimension n_states whose eigenvectors are
+    the excitation vectors; random modified transition moments and B matrices
+    (symmetric or antisymmetric for Hermitian and anti-Hermitian operators) define the
+    transition moments and the state-to-state transition moments in the same way as in adcc,
+    so that the results of the SOS and ISR engines agree exactly.
+    """
+    import zarr
+
+    rng = np.random.default_rng(seed)
+    level = property_method.replace("adc", "")
+    z = zarr.open(path, mode="w")
+    exci = z.create_group("excitation")
+    exci.attrs["kind"] = "singlet"
+    exci.attrs["method"] = property_method
+    exci.attrs["property_method"] = property_method
+
+    vectors, _ = np.linalg.qr(rng.normal(size=(n_states, n_states)))
+    energies = np.sort(rng.uniform(0.25, 2.0, size=n_states))
+    exci["excitation_energy"] = energies
+    exci["excitation_energy_uncorrected"] = energies
+    dense = z.create_group("dense")
+    dense["adc_matrix"] = vectors @ np.diag(energies) @ vectors.T
+    dense["excitation_vector"] = vectors.T
+
+    for op_type, (tm_key, s2s_key, gs_key, sign) in synthetic_operators.items():
+        mtms = rng.normal(scale=0.5, size=(3, n_states))
+        bmatrices = rng.normal(scale=0.5, size=(3, n_states, n_states))
+        bmatrices = 0.5 * (bmatrices + sign * np.transpose(bmatrices, (0, 2, 1)))
+        gs_moment = rng.normal(scale=0.5, size=3) if sign == 1 else np.zeros(3)
+        dense[f"{op_type}/modified_transition_moments"] = mtms
+        dense[f"{op_type}/isr_matrix"] = bmatrices
+        z[f"ground_state/{gs_key}/{level}"] = gs_moment
+        exci[tm_key] = vectors.T @ mtms.T
+        # <n|op|m> is the product of the vector of m, the B matrix and the vector of n
+        exci[s2s_key] = np.einsum("ai,cab,bj->jic", vectors, bmatrices, vectors)
+    return DenseExcitedStates(zarr.open(path, mode="r"))
+
+
+class DenseExcitedStates(MockExcitedStates, IsrBackend):
+    """Mock excited states with a dense ADC matrix, modified transition moments and B matrices,
+    such that they can also be passed to evaluate_property_isr, as state and as isr_backend."""
+
+    def __init__(self, zr):
+        super().__init__(zr)
+        self._dense_arrays = {}
+
+    def _dense_array(self, op_type: str, name: str) -> np.ndarray:
+        key = f"dense/{op_type}/{name}"
+        if key not in self._dense_arrays:
+            self._dense_arrays[key] = np.asarray(self.zr[key])
+        return self._dense_arrays[key]
+
+    @cached_property
+    def matrix(self) -> DenseAdcMatrix:
+        return DenseAdcMatrix(np.asarray(self.zr["dense/adc_matrix"]))
+
+    @cached_property
+    def excitation_vector(self) -> list:
+        return [v.view(DenseVector) for v in np.asarray(self.zr["dense/excitation_vector"])]
+
+    def solve_response(self, matrix, rhs, omega, gamma=0.0, projection=None, **solver_args):
+        return solve_dense_response(matrix, rhs, omega, gamma, projection, **solver_args)
+
+    def modified_transition_moments(self, op_type: str) -> np.ndarray:
+        mtms = self._dense_array(op_type, "modified_transition_moments")
+        ret = np.empty(len(mtms), dtype=object)
+        for c, mtm in enumerate(mtms):
+            ret[c] = mtm.view(DenseVector)
+        return ret
+
+    def isr_matrix(self, op_type: str, comp=None) -> DenseIsrMatrix:
+        bmatrices = self._dense_array(op_type, "isr_matrix")
+        return DenseIsrMatrix(bmatrices if comp is None else bmatrices[comp])
+
+    def transition_polarizability(self, op_type, to_vec, from_vec, comp=None):
+        """<to_vec|B|from_vec>, which is complex if one of the vectors is a response vector
+        with an imaginary part."""
+        bmatrix = self.isr_matrix(op_type, comp).dense
+        ret = np.einsum("i,...ij,j->...", _as_complex(to_vec), bmatrix, _as_complex(from_vec))
+        if not isinstance(to_vec, RV) and not isinstance(from_vec, RV):
+            return ret.real
+        return ret
@@ -1,5 +1,8 @@
 # taken from respondo
 
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import adcc
 import numpy as np
 import zarr
@@ -9,71 +12,153 @@ from cache import cases
 from static_data import xyz
 from tqdm import tqdm
 
+# zarr arrays of the state-to-state transition moments and the corresponding operators
+s2s_operators = {
+    "transition_dipole_moment_s2s": "electric_dipole",
+    "transition_magnetic_moment_s2s": "magnetic_dipole",
+}
+
+
+def phase(vector):
+    """Sign of the largest element of the singles part of an excitation vector;
+    used to detect eigenvectors whose sign changed between two runs."""
+    ph = vector.ph.to_ndarray()
+    return float(np.sign(ph.flat[np.argmax(np.abs(ph))]))
+
+
+def compute_rows(state, operators, rows):
+    s2s_tdms = {key: np.zeros((len(rows), state.size, 3)) for key in operators}
+    for ii, i in enumerate(rows):
+        ee1 = state.excitations[i]
+        for ee2 in state.excitations:
+            tdm = state2state_transition_dm(
+                state.property_method,
+                state.ground_state,
+                ee1.excitation_vector,
+                ee2.excitation_vector,
+                state.matrix.intermediates,
+            )
+            for key, ops in operators.items():
+                s2s_tdms[key][ii, ee2.index] = [product_trace(tdm, op) for op in ops]
+    return rows, s2s_tdms
+
+
+def write_properties(z, state):
+    exci = z["excitation"]
+    propkeys = state.excitation_property_keys
+    propkeys.extend([k.name for k in state._excitation_energy_corrections])
+    for key in propkeys:
+        try:
+            d = getattr(state, key)
+        except NotImplementedError:
+            continue
+        if not isinstance(d, np.ndarray):
+            continue
+        if not np.issubdtype(d.dtype, np.number):
+            continue
+        exci[key] = d
+
+    exci.attrs["kind"] = state.kind
+    exci.attrs["method"] = state.method.name
+    exci.attrs["property_method"] = state.property_method.name
+    mp = state.ground_state
+    hf = state.reference_state
+    z["ground_state/dipole_moment/1"] = mp.dipole_moment(1)
+    z["ground_state/dipole_moment/2"] = mp.dipole_moment(2)
+    z["ground_state/energy/2"] = mp.energy(2)
+    z["ground_state/energy/3"] = mp.energy(3)
+    z["reference_state/energy_scf"] = hf.energy_scf
+    z["reference_state/dipole_moment"] = hf.dipole_moment
 
-def main():
-    for case in cases:
-        n_singlets = cases[case]
-        molecule, basis, method = case.split("_")
-        scfres = adcc.backends.run_hf(
-            "pyscf",
-            xyz=xyz[molecule],
-            basis=basis,
-            # conv_tol=conv_tol,
-            # multiplicity=multiplicity,
-            # conv_tol_grad=conv_tol_grad,
-        )
-        state = adcc.run_adc(method=method, data_or_matrix=scfres, n_singlets=n_singlets)
-        dips = state.reference_state.operators.electric_dipole
-        mdips = state.reference_state.operators.magnetic_dipole
-
-        # state to state transition moments
-        s2s_tdms = np.zeros((state.size, state.size, 3))
-        s2s_tdms_mag = np.zeros((state.size, state.size, 3))
-        for ee1 in tqdm(state.excitations):
-            i = ee1.index
-            for ee2 in state.excitations:
-                j = ee2.index
-                tdm = state2state_transition_dm(
-                    state.property_method,
-                    state.ground_state,
-                    ee1.excitation_vector,
-                    ee2.excitation_vector,
-                    state.matrix.intermediates,
-                )
-                tdm_fn = np.array([product_trace(tdm, dip) for dip in dips])
-                tdm_mag = np.array([product_trace(tdm, mdip) for mdip in mdips])
-                s2s_tdms[i, j] = tdm_fn
-                s2s_tdms_mag[i, j] = tdm_mag
 
+def dump_case(case, n_workers=1, block_size=16):
+    """Compute the full diagonalization data of a case and write it to {case}.zarr.
+
+    The state-to-state transition moments are computed in blocks of rows (in n_workers
+    threads if n_workers > 1), each of which is written to the chunked zarr arrays as soon
+    as it is finished. The completed blocks are recorded in the attributes of the excitation group,
+    such that an interrupted dump is resumed from there.
+    """
+    n_singlets = cases[case]
+    molecule, basis, method = case.split("_")
+    scfres = adcc.backends.run_hf(
+        "pyscf",
+        xyz=xyz[molecule],
+        basis=basis,
+        # conv_tol=conv_tol,
+        # multiplicity=multiplicity,
+        # conv_tol_grad=conv_tol_grad,
+    )
+    state = adcc.run_adc(method=method, data_or_matrix=scfres, n_singlets=n_singlets)
+    phases = np.array([phase(ee.excitation_vector) for ee in state.excitations])
+
+    z = zarr.open(f"{case}.zarr", mode="a")
+    exci = z.require_group("excitation")
+    if "s2s_completed_blocks" in exci.attrs and exci.attrs["s2s_block_size"] == block_size:
+        # resume the dump; moments of excitation vectors whose sign changed are corrected
+        assert np.allclose(exci["excitation_energy"][:], state.excitation_energy)
+        signs = phases * np.array(exci.attrs["phases"])
+        completed = set(exci.attrs["s2s_completed_blocks"])
+        print(f"Resuming {case} with {len(completed)} completed blocks.")
+    else:
         z = zarr.open(f"{case}.zarr", mode="w")
-        z.create_group("excitation")
-        exci = z["excitation"]
-        propkeys = state.excitation_property_keys
-        propkeys.extend([k.name for k in state._excitation_energy_corrections])
-        for key in propkeys:
-            try:
-                d = getattr(state, key)
-            except NotImplementedError:
-                continue
-            if not isinstance(d, np.ndarray):
-                continue
-            if not np.issubdtype(d.dtype, np.number):
-                continue
-            exci[key] = d
-
-        exci["transition_dipole_moment_s2s"] = s2s_tdms
-        exci["transition_magnetic_moment_s2s"] = s2s_tdms_mag
-        exci.attrs["kind"] = state.kind
-        exci.attrs["method"] = state.method.name
-        exci.attrs["property_method"] = state.property_method.name
-        mp = state.ground_state
-        hf = state.reference_state
-        z["ground_state/dipole_moment/1"] = mp.dipole_moment(1)
-        z["ground_state/dipole_moment/2"] = mp.dipole_moment(2)
-        z["ground_state/energy/2"] = mp.energy(2)
-        z["ground_state/energy/3"] = mp.energy(3)
-        z["reference_state/energy_scf"] = hf.energy_scf
-        z["reference_state/dipole_moment"] = hf.dipole_moment
+        exci = z.create_group("excitation")
+        write_properties(z, state)
+        for key in s2s_operators:
+            exci.zeros(
+                key, shape=(state.size, state.size, 3), chunks=(block_size, state.size, 3)
+            )
+        exci.attrs["phases"] = phases.tolist()
+        exci.attrs["s2s_block_size"] = block_size
+        exci.attrs["s2s_completed_blocks"] = []
+        signs = np.ones(state.size)
+        completed = set()
+
+    blocks = [
+        list(range(start, min(start + block_size, state.size)))
+        for start in range(0, state.size, block_size)
+    ]
+    exci.attrs["s2s_n_blocks"] = len(blocks)
+    todo = [rows for ib, rows in enumerate(blocks) if ib not in completed]
+
+    def write_block(rows, s2s_tdms):
+        for key, tdms in s2s_tdms.items():
+            exci[key][rows[0]:rows[-1] + 1] = (
+                tdms * signs[rows][:, None, None] * signs[None, :, None]
+            )
+        completed.add(rows[0] // block_size)
+        exci.attrs["s2s_completed_blocks"] = sorted(completed)
+
+    operators = {
+        key: getattr(state.reference_state.operators, op)
+        for key, op in s2s_operators.items()
+    }
+    progress = tqdm(total=len(blocks), initial=len(completed))
+    try:
+        if n_workers <= 1:
+            for rows in todo:
+                write_block(*compute_rows(state, operators, rows))
+                progress.update(1)
+        else:
+            # threads instead of processes, because forking a process that already runs the
+            # threads of the tensor backend is not safe; the blocks are written by this thread
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                futures = [pool.submit(compute_rows, state, operators, rows) for rows in todo]
+                for future in as_completed(futures):
+                    write_block(*future.result())
+                    progress.update(1)
+    finally:
+        progress.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump full diagonalization data to zarr.")
+    parser.add_argument("cases", nargs="*", default=list(cases))
+    parser.add_argument("--n-workers", type=int, default=1)
+    parser.add_argument("--block-size", type=int, default=16)
+    args = parser.parse_args()
+    for case in args.cases:
+        dump_case(case, args.n_workers, args.block_size)
 
 
 if __name__ == "__main__":
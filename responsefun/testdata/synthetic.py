@@ -0,0 +1,67 @@
+import numpy as np
+
+from responsefun.testdata.mock import MockExcitedStates
+
+# names of the arrays of the operators in the zarr store and the symmetry of their
+# state-to-state transition moments (+1: Hermitian, -1: anti-Hermitian)
+synthetic_operators = {
+    "electric_dipole": (
+        "transition_dipole_moment", "transition_dipole_moment_s2s", "dipole_moment", 1
+    ),
+    "magnetic_dipole": (
+        "transition_magnetic_dipole_moment", "transition_magnetic_moment_s2s",
+        "magnetic_dipole_moment", -1
+    ),
+}
+
+
+def write_synthetic_states(path, n_states, seed=0, property_method="adc2", block_size=256):
+    """Write random but physically plausible excited-state data to a zarr store
+    that can be read by MockExcitedStates, e.g., for scaling benchmarks.
+
+    The excitation energies are sorted and positive, the transition moments decay
+    for higher states, and the state-to-state transition moments are Hermitian
+    (electric dipole) or anti-Hermitian (magnetic dipole). The state-to-state tables are
+    generated and written in blocks of rows, so that thousands of states fit into memory.
+    """
+    import zarr
+
+    rng = np.random.default_rng(seed)
+    level = property_method.replace("adc", "")
+    z = zarr.open(path, mode="w")
+    exci = z.create_group("excitation")
+    exci.attrs["kind"] = "singlet"
+    exci.attrs["method"] = property_method
+    exci.attrs["property_method"] = property_method
+
+    energies = np.sort(rng.uniform(0.25, 2.0, size=n_states))
+    exci["excitation_energy"] = energies
+    exci["excitation_energy_uncorrected"] = energies
+    # intensities decrease towards higher (more diffuse) states
+    decay = np.exp(-np.arange(n_states) / max(n_states / 4, 1))[:, None]
+
+    for tm_key, s2s_key, gs_key, sign in synthetic_operators.values():
+        gs_moment = rng.normal(scale=0.5, size=3) if sign == 1 else np.zeros(3)
+        z[f"ground_state/{gs_key}/{level}"] = gs_moment
+        exci[tm_key] = rng.normal(scale=0.5, size=(n_states, 3)) * decay
+        s2s = exci.zeros(
+            s2s_key, shape=(n_states, n_states, 3), chunks=(min(block_size, n_states), n_states, 3)
+        )
+        for start in range(0, n_states, block_size):
+            stop = min(start + block_size, n_states)
+            block = rng.normal(scale=0.5, size=(stop - start, n_states, 3))
+            # the lower triangle follows from the rows that have already been written
+            block[:, :start] = sign * np.transpose(s2s[:start, start:stop], (1, 0, 2))
+            diag = block[:, start:stop]
+            upper = np.triu(np.ones((stop - start, stop - start), dtype=bool), 1)
+            block[:, start:stop] = np.where(
+                upper[:, :, None], diag, sign * np.transpose(diag, (1, 0, 2))
+            )
+            for i in range(start, stop):
+                if sign == 1:
+                    # excited-state dipole moments scatter around the ground-state moment
+                    block[i - start, i] = gs_moment + rng.normal(scale=0.2, size=3)
+                else:
+                    block[i - start, i] = 0.0
+            s2s[start:stop] = block
+    return MockExcitedStates(zarr.open(path, mode="r"))
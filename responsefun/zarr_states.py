@@ -0,0 +1,47 @@
+#  Copyright (C) 2023 by the responsefun authors
+#
+#  This file is part of responsefun.
+#
+#  responsefun is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  responsefun is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with responsefun. If not, see <http:www.gnu.org/licenses/>.
+#
+
+import numpy as np
+
+
+class ZarrExcitedStates:
+    """Excited states whose energies and moments are read from a zarr group, e.g., a snapshot
+    (see responsefun.snapshot) or the reference data of the tests;
+    the arrays are only read from the zarr group when they are accessed"""
+
+    def __init__(self, zr):
+        self.zr = zr
+        exci = self.zr.excitation
+        for k in exci.attrs:
+            setattr(self, k, exci.attrs[k])
+        self.ground_state = self.zr.ground_state
+
+    def __getattr__(self, name):
+        # only called for attributes that have not been read yet
+        if name.startswith("_") or "zr" not in self.__dict__:
+            raise AttributeError(name)
+        exci = self.zr.excitation
+        if name not in exci:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        array = exci[name]
+        if array.ndim > 2:
+            # state-to-state tables stay zarr arrays, of which only the accessed chunks are read
+            return array
+        array = np.asarray(array)
+        setattr(self, name, array)
+        return array